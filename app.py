@@ -1,12 +1,60 @@
 from __future__ import annotations
 
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, Callable, Literal
+
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import HTMLResponse, JSONResponse
 from pydantic import BaseModel
 
-from src.recommend import parse_task_profile, recommend, _extract_budget_from_text
+from src.catalog import response_cache
+from src.recommend import (
+    dumps_payload,
+    parse_task_profile,
+    recommend_batch,
+    recommend_with_etag,
+    _extract_budget_from_text,
+    _refresh_due,
+)
+from src.refresh import background_refresher
+from src.schema import TaskProfile
+from src.warehouse import close_warehouse, open_warehouse
+
+
+READ_WORKERS = 8
+REQUEST_TIMEOUT_S = 10.0
+INGEST_TIMEOUT_S = 120.0
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One DuckDB instance for the process: per-thread read cursors, one writer for ingest.
+    open_warehouse()
+    # Warehouse reads and inline ingests run on separate bounded pools, so a slow ingest
+    # never occupies a read worker and the event loop never blocks on DuckDB or urllib.
+    app.state.read_executor = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="warehouse-read")
+    app.state.ingest_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warehouse-ingest")
+    try:
+        yield
+    finally:
+        # Let an in-flight background refresh finish its write before closing.
+        background_refresher().wait(timeout=60)
+        app.state.ingest_executor.shutdown(wait=True, cancel_futures=True)
+        app.state.read_executor.shutdown(wait=True, cancel_futures=True)
+        close_warehouse()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response for payloads that are already native Python types (no jsonable_encoder pass)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_payload(content)
+
 
-app = FastAPI(title="LLM Recommender")
+app = FastAPI(title="LLM Recommender", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 class RecommendRequest(BaseModel):
     task_text: str
@@ -15,8 +63,27 @@ class RecommendRequest(BaseModel):
     min_context: int | None = None
     provider_allowlist: str | None = None
     missing_policy: str = "penalize"  # "neutral" or "penalize"
+    normalization: Literal["candidates", "snapshot"] = "candidates"
     refresh: bool = False
     max_age_hours: float = 24.0
+    background_refresh: bool = True  # serve the current snapshot while an age-due ingest runs
+
+
+class BatchItem(BaseModel):
+    task_text: str
+    max_price_per_1m: float | None = None
+    min_context: int | None = None
+    provider_allowlist: str | None = None
+
+
+class BatchRecommendRequest(BaseModel):
+    items: list[BatchItem]
+    topk: int = 5
+    missing_policy: str = "penalize"
+    normalization: Literal["candidates", "snapshot"] = "candidates"
+    refresh: bool = False
+    max_age_hours: float = 24.0
+    background_refresh: bool = True
 
 @app.get("/", response_class=HTMLResponse)
 def home() -> str:
@@ -165,24 +232,87 @@ function escapeHtml(s){
 """
 
 
-@app.post("/api/recommend")
-def api_recommend(req: RecommendRequest) -> dict:
-    max_price = req.max_price_per_1m
+def _profile_from(item: RecommendRequest | BatchItem) -> TaskProfile:
+    max_price = item.max_price_per_1m
     if max_price is None:
-        max_price = _extract_budget_from_text(req.task_text)
+        max_price = _extract_budget_from_text(item.task_text)
 
-    profile = parse_task_profile(
-        task_text=req.task_text,
+    return parse_task_profile(
+        task_text=item.task_text,
         max_price_per_1m=max_price,
-        min_context=req.min_context,
-        provider_allowlist=req.provider_allowlist,
+        min_context=item.min_context,
+        provider_allowlist=item.provider_allowlist,
+    )
+
+
+async def _run_blocking(fn: Callable[[], Any], *, refresh: bool, max_age_hours: float, background_refresh: bool) -> Any:
+    """
+    Run a recommend call off the event loop. Calls that will ingest inline (refresh
+    forced, or due with background_refresh off) go to the ingest pool with INGEST_TIMEOUT_S; everything
+    else goes to the read pool with REQUEST_TIMEOUT_S. A timeout returns 504. If the
+    request is cancelled, work still queued in the pool is dropped; work already
+    running finishes in its thread and the result is discarded.
+    """
+    loop = asyncio.get_running_loop()
+    executor, timeout = app.state.read_executor, REQUEST_TIMEOUT_S
+    if refresh or not background_refresh:
+        due = partial(_refresh_due, refresh=refresh, max_age_hours=max_age_hours)
+        if await asyncio.wait_for(loop.run_in_executor(executor, due), REQUEST_TIMEOUT_S):
+            executor, timeout = app.state.ingest_executor, INGEST_TIMEOUT_S
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(executor, fn), timeout)
+    except asyncio.TimeoutError as exc:
+        raise HTTPException(status_code=504, detail=f"recommendation timed out after {timeout:.0f}s") from exc
+
+
+@app.post("/api/recommend")
+async def api_recommend(
+    req: RecommendRequest,
+    if_none_match: str | None = Header(default=None),
+) -> Response:
+    profile = _profile_from(req)
+
+    result, etag = await _run_blocking(
+        partial(
+            recommend_with_etag,
+            profile,
+            topk=req.topk,
+            missing_policy=req.missing_policy,
+            normalization=req.normalization,
+            refresh=req.refresh,
+            max_age_hours=req.max_age_hours,
+            background_refresh=req.background_refresh,
+        ),
+        refresh=req.refresh,
+        max_age_hours=req.max_age_hours,
+        background_refresh=req.background_refresh,
     )
+    if if_none_match is not None and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    # Returned as a Response so FastAPI skips jsonable_encoder over the payload.
+    return FastJSONResponse(result, headers={"ETag": etag})
+
+
+@app.get("/api/cache")
+def api_cache_stats() -> dict:
+    return response_cache().stats()
+
 
-    result = recommend(
-        profile,
-        topk=req.topk,
-        missing_policy=req.missing_policy,
+@app.post("/api/recommend/batch")
+async def api_recommend_batch(req: BatchRecommendRequest) -> Response:
+    results = await _run_blocking(
+        partial(
+            recommend_batch,
+            [_profile_from(item) for item in req.items],
+            topk=req.topk,
+            missing_policy=req.missing_policy,
+            normalization=req.normalization,
+            refresh=req.refresh,
+            max_age_hours=req.max_age_hours,
+            background_refresh=req.background_refresh,
+        ),
         refresh=req.refresh,
         max_age_hours=req.max_age_hours,
+        background_refresh=req.background_refresh,
     )
-    return result
+    return FastJSONResponse({"results": results})
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Hashable
+
+import numpy as np
+import pandas as pd
+
+METRIC_COLUMNS = [
+    "quality_index",
+    "coding_index",
+    "math_index",
+    "reasoning_index",
+    "output_tokens_per_s",
+    "ttft_s",
+    "price_input_per_1m",
+    "price_output_per_1m",
+    "context_window",
+]
+
+NULL_RATE_FIELDS = ["provider", "price_input_per_1m", "output_tokens_per_s", "context_window"]
+
+
+def _sorted_present(values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(row ids ordered by value, the ordered values, row ids whose value is missing)."""
+    missing = np.isnan(values)
+    present_rows = np.flatnonzero(~missing)
+    order = present_rows[np.argsort(values[present_rows], kind="stable")]
+    return order, values[order], np.flatnonzero(missing)
+
+
+@dataclass(slots=True)
+class ConstraintIndex:
+    """
+    Per-snapshot index for the hard constraints: row ids sorted by price and by
+    context window (binary-search cutoffs) and a row-id list per lowercased provider.
+    Models with a missing price/context pass those constraints, as in scoring.
+    """
+
+    n_rows: int
+    price_rows: np.ndarray
+    price_sorted: np.ndarray
+    price_missing: np.ndarray
+    context_rows: np.ndarray
+    context_sorted: np.ndarray
+    context_missing: np.ndarray
+    provider_rows: dict[str, np.ndarray]
+
+    @classmethod
+    def build(
+        cls, metrics: dict[str, np.ndarray], provider_codes: np.ndarray, provider_categories: tuple[str, ...]
+    ) -> ConstraintIndex:
+        price_rows, price_sorted, price_missing = _sorted_present(metrics["price_input_per_1m"])
+        context_rows, context_sorted, context_missing = _sorted_present(metrics["context_window"])
+        by_code = np.argsort(provider_codes, kind="stable")
+        bounds = np.searchsorted(provider_codes[by_code], np.arange(len(provider_categories) + 1))
+        provider_rows = {
+            name: by_code[bounds[code] : bounds[code + 1]] for code, name in enumerate(provider_categories)
+        }
+        return cls(
+            n_rows=len(provider_codes),
+            price_rows=price_rows,
+            price_sorted=price_sorted,
+            price_missing=price_missing,
+            context_rows=context_rows,
+            context_sorted=context_sorted,
+            context_missing=context_missing,
+            provider_rows=provider_rows,
+        )
+
+    def candidate_rows(
+        self, max_price: float | None, min_context: int | None, provider_allowlist: set[str] | None
+    ) -> np.ndarray:
+        """
+        Sorted row ids meeting every given constraint. Each constraint yields its
+        matching rows in O(log n + k); the smallest set is then checked against the
+        other constraints with membership masks over those rows only.
+        """
+        row_sets: list[np.ndarray] = []
+        if max_price is not None:
+            cut = np.searchsorted(self.price_sorted, max_price, side="right")
+            row_sets.append(np.concatenate([self.price_rows[:cut], self.price_missing]))
+        if min_context is not None:
+            cut = np.searchsorted(self.context_sorted, min_context, side="left")
+            row_sets.append(np.concatenate([self.context_rows[cut:], self.context_missing]))
+        if provider_allowlist:
+            empty = np.empty(0, dtype=np.intp)
+            row_sets.append(np.concatenate([self.provider_rows.get(name, empty) for name in provider_allowlist]))
+        if not row_sets:
+            return np.arange(self.n_rows)
+
+        row_sets.sort(key=len)
+        rows = np.sort(row_sets[0])
+        for other in row_sets[1:]:
+            if not len(rows):
+                break
+            rows = rows[np.isin(rows, other, assume_unique=True)]
+        return rows
+
+
+@dataclass(slots=True)
+class ScoringMatrix:
+    """
+    Column-oriented, in-memory copy of models_latest.
+
+    Metrics are float64 arrays (NaN for missing), providers are stored both as the
+    original strings (for output) and as integer codes into lowercased categories
+    (for allowlist filtering). key_rank is each row's position in canonical_model_key
+    order, the integer tie-break used when ranking.
+    """
+
+    snapshot_ts: datetime | None
+    row_snapshot_ts: np.ndarray
+    canonical_model_key: np.ndarray
+    key_rank: np.ndarray
+    model_name: np.ndarray
+    provider: np.ndarray
+    provider_codes: np.ndarray
+    provider_categories: tuple[str, ...]
+    metrics: dict[str, np.ndarray]
+    null_rates: dict[str, float]
+    fingerprint: str
+    column_stats: dict[str, dict[str, float | None]]
+    index: ConstraintIndex
+
+    def __len__(self) -> int:
+        return len(self.canonical_model_key)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, column_stats: dict[str, dict[str, float | None]] | None = None) -> ScoringMatrix:
+        n_rows = len(df)
+
+        def _objects(col: str) -> np.ndarray:
+            if col not in df.columns:
+                return np.full(n_rows, None, dtype=object)
+            series = df[col].astype(object)
+            return series.where(series.notna(), None).to_numpy(dtype=object)
+
+        metrics = {
+            col: (
+                df[col].to_numpy(dtype="float64", na_value=np.nan)
+                if col in df.columns
+                else np.full(n_rows, np.nan, dtype="float64")
+            )
+            for col in METRIC_COLUMNS
+        }
+
+        provider = _objects("provider")
+        lowered = np.array([(p or "").lower() for p in provider], dtype=str)
+        categories, codes = np.unique(lowered, return_inverse=True)
+        provider_categories = tuple(str(c) for c in categories)
+        provider_codes = np.asarray(codes, dtype="int32")
+
+        if "snapshot_ts" in df.columns and n_rows:
+            row_snapshot_ts = pd.to_datetime(df["snapshot_ts"]).to_numpy(dtype="datetime64[us]")
+        else:
+            row_snapshot_ts = np.full(n_rows, np.datetime64("NaT"), dtype="datetime64[us]")
+
+        canonical_model_key = _objects("canonical_model_key")
+        key_order = np.argsort(np.array([key or "" for key in canonical_model_key], dtype=str), kind="stable")
+        key_rank = np.empty(n_rows, dtype=np.intp)
+        key_rank[key_order] = np.arange(n_rows)
+
+        valid_ts = row_snapshot_ts[~np.isnat(row_snapshot_ts)]
+        snapshot_ts = pd.Timestamp(valid_ts.max()).to_pydatetime() if len(valid_ts) else None
+
+        null_rates: dict[str, float] = {}
+        if n_rows:
+            for field in NULL_RATE_FIELDS:
+                missing = pd.isna(provider) if field == "provider" else np.isnan(metrics[field])
+                null_rates[field] = float(missing.mean())
+
+        # Cheap content fingerprint (no per-string hashing): timestamps, provider codes
+        # and metric bytes.
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(row_snapshot_ts.tobytes())
+        digest.update(provider_codes.tobytes())
+        digest.update("\x1f".join(provider_categories).encode())
+        for col in METRIC_COLUMNS:
+            digest.update(metrics[col].tobytes())
+
+        return cls(
+            snapshot_ts=snapshot_ts,
+            row_snapshot_ts=row_snapshot_ts,
+            canonical_model_key=canonical_model_key,
+            key_rank=key_rank,
+            model_name=_objects("model_name"),
+            provider=provider,
+            provider_codes=provider_codes,
+            provider_categories=provider_categories,
+            metrics=metrics,
+            null_rates=null_rates,
+            fingerprint=digest.hexdigest(),
+            column_stats=dict(column_stats or {}),
+            index=ConstraintIndex.build(metrics, provider_codes, provider_categories),
+        )
+
+    def snapshot_ts_utc(self) -> datetime | None:
+        if self.snapshot_ts is None:
+            return None
+        return self.snapshot_ts.replace(tzinfo=timezone.utc)
+
+    def snapshot_id(self) -> str:
+        """
+        Identifier of the data this matrix was built from: the snapshot time plus a
+        content fingerprint, so it is the same across processes and differs whenever
+        the scored columns do.
+        """
+        ts = self.snapshot_ts.isoformat() if self.snapshot_ts is not None else "empty"
+        return f"{ts}/{self.fingerprint}"
+
+    def snapshot_stats(self, col: str) -> dict[str, float | None]:
+        """
+        min_value / max_value / median of a metric over the whole snapshot: the stored
+        snapshot_stats row when loaded, otherwise computed from the matrix (both cover
+        all of models_latest).
+        """
+        stats = self.column_stats.get(col)
+        if stats is None:
+            values = self.metrics[col]
+            present = values[~np.isnan(values)]
+            if len(present):
+                stats = {
+                    "min_value": float(present.min()),
+                    "max_value": float(present.max()),
+                    "median": float(np.median(present)),
+                }
+            else:
+                stats = {"min_value": None, "max_value": None, "median": None}
+            self.column_stats[col] = stats
+        return stats
+
+    def provider_mask(self, allowlist: set[str]) -> np.ndarray:
+        allowed = [code for code, name in enumerate(self.provider_categories) if name in allowlist]
+        return np.isin(self.provider_codes, allowed)
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU of recommendation payloads with a per-entry TTL.
+
+    Keys include the snapshot id, so entries from an older snapshot are never served;
+    invalidate_scoring_matrix() also clears the cache so they do not linger.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_s: float = 300.0) -> None:
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_s, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_RESPONSE_CACHE = ResponseCache()
+
+
+def response_cache() -> ResponseCache:
+    return _RESPONSE_CACHE
+
+
+_CACHE_LOCK = threading.Lock()
+# (snapshot version the matrix was built at, matrix)
+_CACHED_ENTRY: tuple[Hashable | None, ScoringMatrix] | None = None
+
+
+def get_scoring_matrix(
+    loader: Callable[[], pd.DataFrame],
+    stats_loader: Callable[[], dict[str, dict[str, float | None]]] | None = None,
+    version: Hashable | None = None,
+) -> ScoringMatrix:
+    """
+    Return the process-wide ScoringMatrix, building it with loader() (and the snapshot
+    column statistics from stats_loader(), if given) on a cache miss.
+
+    `version` is a marker of the warehouse's current snapshot (see
+    src.ingest.last_ingest_marker). When it differs from the marker the cached matrix was built at,
+    e.g. after an ingest in another process, the matrix is rebuilt and the response
+    cache cleared. None skips the check and serves the cached matrix.
+    invalidate_scoring_matrix() drops the cache outright.
+    """
+    global _CACHED_ENTRY
+    entry = _CACHED_ENTRY
+    if entry is not None and (version is None or version == entry[0]):
+        return entry[1]
+    with _CACHE_LOCK:
+        entry = _CACHED_ENTRY
+        if entry is None or (version is not None and version != entry[0]):
+            if entry is not None:
+                _RESPONSE_CACHE.clear()
+            frame = loader()
+            entry = _CACHED_ENTRY = (version, ScoringMatrix.from_frame(frame, stats_loader() if stats_loader else None))
+        return entry[1]
+
+
+def cached_scoring_matrix() -> ScoringMatrix | None:
+    entry = _CACHED_ENTRY
+    return entry[1] if entry is not None else None
+
+
+def invalidate_scoring_matrix() -> None:
+    """Drop the cached ScoringMatrix and every cached response built from it."""
+    global _CACHED_ENTRY
+    with _CACHE_LOCK:
+        _CACHED_ENTRY = None
+    _RESPONSE_CACHE.clear()
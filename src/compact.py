@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import argparse
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.ingest import INGEST_LOCK_PATH, _ingest_file_lock
+from src.schema import ARROW_SCHEMA, MANIFEST_SCHEMA
+from src.warehouse import rebuild_derived_tables, write_connection
+
+BRONZE_ROOT = Path("data") / "bronze"
+PARTITION_FILE = "part-0.parquet"
+MANIFEST_PARTITION_FILE = "manifest-0.parquet"
+ROW_GROUP_SIZE = 128 * 1024
+
+
+@dataclass(slots=True)
+class CompactionResult:
+    snapshot_files: int
+    partitions: list[Path]
+    rows: int
+    manifest_partitions: list[Path] = field(default_factory=list)
+
+
+def snapshot_files(root: Path = BRONZE_ROOT) -> list[Path]:
+    """Per-ingest snapshot files (`<root>/<source>/models_snapshot_*.parquet`) not yet compacted."""
+    return sorted(
+        path
+        for path in root.glob("*/models_snapshot_*.parquet")
+        if "=" not in path.parent.name
+    )
+
+
+def manifest_files(root: Path = BRONZE_ROOT) -> list[Path]:
+    """Per-ingest manifest files (`<root>/<source>/manifest_*.parquet`) not yet compacted."""
+    return sorted(path for path in root.glob("*/manifest_*.parquet") if "=" not in path.parent.name)
+
+
+def partition_files(root: Path = BRONZE_ROOT, name: str = PARTITION_FILE) -> list[Path]:
+    """Compacted files (`<root>/source=<source>/date=<YYYY-MM-DD>/<name>`)."""
+    return sorted(root.glob(f"source=*/date=*/{name}"))
+
+
+def partition_path(root: Path, source: str, day: str, name: str = PARTITION_FILE) -> Path:
+    return root / f"source={source}" / f"date={day}" / name
+
+
+def _stage(con: duckdb.DuckDBPyConnection, paths: list[Path], table: str = "staged_rows") -> None:
+    """
+    Load Parquet files into a typed temp table (`staged_rows` by default). Older
+    snapshots store snapshot_ts as an ISO string and may lack newer columns; INSERT BY
+    NAME casts to the bronze types and fills missing columns with NULL.
+    """
+    if not paths:
+        return
+    con.execute(
+        f"INSERT INTO {table} BY NAME SELECT * FROM read_parquet(?, union_by_name = true, hive_partitioning = false)",
+        [[str(path) for path in paths]],
+    )
+
+
+def _write_partition(table: pa.Table, out_path: Path) -> None:
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE, write_statistics=True)
+    os.replace(tmp_path, out_path)
+
+
+def _compact_staged(
+    con: duckdb.DuckDBPyConnection, root: Path, table: str, name: str, schema: pa.Schema
+) -> tuple[list[Path], int]:
+    """
+    Rewrite every (source, date) partition that has rows staged in `table` together
+    with its existing `name` file; returns (partitions written, rows written).
+    """
+    partitions = con.execute(
+        f"SELECT DISTINCT source, strftime(snapshot_ts, '%Y-%m-%d') FROM {table} ORDER BY 1, 2"
+    ).fetchall()
+    _stage(con, [p for s, d in partitions if (p := partition_path(root, s, d, name)).exists()], table)
+
+    written: list[Path] = []
+    rows = 0
+    for source, day in partitions:
+        rows_table = con.execute(
+            f"SELECT DISTINCT * FROM {table} "
+            "WHERE source = ? AND strftime(snapshot_ts, '%Y-%m-%d') = ? "
+            "ORDER BY snapshot_ts, canonical_model_key",
+            [source, day],
+        ).to_arrow_table()
+        out_path = partition_path(root, source, day, name)
+        _write_partition(rows_table.cast(schema), out_path)
+        written.append(out_path)
+        rows += rows_table.num_rows
+    return written, rows
+
+
+def compact_bronze(root: Path = BRONZE_ROOT, *, keep_snapshots: bool = False) -> CompactionResult:
+    """
+    Merge per-ingest snapshot files into one Parquet file per (source, UTC date), and
+    their manifest files into one manifest file per partition.
+
+    Partitions touched by new snapshots are rewritten together with their existing
+    compacted rows, sorted by (snapshot_ts, canonical_model_key) so row-group min/max
+    statistics on both columns prune scans. Exact duplicate rows (e.g. from a re-run
+    after an interrupted compaction) are dropped. Each partition is written to a temp
+    file and renamed into place; snapshot files are deleted only after every partition
+    has been written, unless keep_snapshots is set.
+    """
+    files = snapshot_files(root)
+    manifests = manifest_files(root)
+    result = CompactionResult(snapshot_files=len(files), partitions=[], rows=0)
+    if not files and not manifests:
+        return result
+
+    con = duckdb.connect()
+    try:
+        con.register("bronze_template", ARROW_SCHEMA.empty_table())
+        con.execute("CREATE TEMP TABLE staged_rows AS SELECT * FROM bronze_template")
+        _stage(con, files)
+        result.partitions, result.rows = _compact_staged(con, root, "staged_rows", PARTITION_FILE, ARROW_SCHEMA)
+
+        con.register("manifest_template", MANIFEST_SCHEMA.empty_table())
+        con.execute("CREATE TEMP TABLE staged_manifest AS SELECT * FROM manifest_template")
+        _stage(con, manifests, "staged_manifest")
+        result.manifest_partitions, _ = _compact_staged(
+            con, root, "staged_manifest", MANIFEST_PARTITION_FILE, MANIFEST_SCHEMA
+        )
+    finally:
+        con.close()
+
+    if not keep_snapshots:
+        for path in files + manifests:
+            path.unlink()
+    return result
+
+
+def rebuild_bronze(root: Path = BRONZE_ROOT) -> int:
+    """
+    Replace bronze_models with the rows stored under `root` (compacted partitions plus
+    any snapshot files not yet compacted), add the snapshot membership stored in the
+    manifest files to snapshot_manifest, then reconcile the derived tables. Snapshots
+    without a manifest file (written before manifests were kept) held every row, so
+    their membership is backfilled from bronze_models. Returns the number of bronze rows.
+    """
+    paths = partition_files(root) + snapshot_files(root)
+    manifests = partition_files(root, MANIFEST_PARTITION_FILE) + manifest_files(root)
+    with write_connection() as con:
+        con.execute("BEGIN TRANSACTION")
+        try:
+            con.execute("DELETE FROM bronze_models")
+            if paths:
+                con.execute(
+                    "INSERT INTO bronze_models BY NAME SELECT DISTINCT * "
+                    "FROM read_parquet(?, union_by_name = true, hive_partitioning = false)",
+                    [[str(path) for path in paths]],
+                )
+            if manifests:
+                con.execute(
+                    "INSERT INTO snapshot_manifest SELECT DISTINCT f.snapshot_ts, f.source, f.canonical_model_key "
+                    "FROM read_parquet(?, hive_partitioning = false) f WHERE NOT EXISTS ("
+                    "SELECT 1 FROM snapshot_manifest m WHERE m.snapshot_ts = f.snapshot_ts "
+                    "AND m.source IS NOT DISTINCT FROM f.source AND m.canonical_model_key = f.canonical_model_key)",
+                    [[str(path) for path in manifests]],
+                )
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        rebuild_derived_tables(con)
+        return int(con.execute("SELECT COUNT(*) FROM bronze_models").fetchone()[0])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compact bronze snapshot files into date partitions")
+    parser.add_argument("--root", type=Path, default=BRONZE_ROOT)
+    parser.add_argument("--keep-snapshots", action="store_true", help="Do not delete compacted snapshot files")
+    parser.add_argument("--rebuild-bronze", action="store_true", help="Reload bronze_models from the Parquet files")
+    args = parser.parse_args()
+
+    # Serialize with ingests, and signal a running app to release the warehouse file.
+    with _ingest_file_lock(INGEST_LOCK_PATH):
+        result = compact_bronze(args.root, keep_snapshots=args.keep_snapshots)
+        print(f"Compacted {result.snapshot_files} snapshot files into {len(result.partitions)} partitions ({result.rows} rows)")
+        if args.rebuild_bronze:
+            rows = rebuild_bronze(args.root)
+            INGEST_LOCK_PATH.touch()  # new last_ingest_marker(): apps reload their scoring matrix
+            print(f"Rebuilt bronze_models: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
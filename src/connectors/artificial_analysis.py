@@ -1,13 +1,24 @@
 from __future__ import annotations
 
 import json
+import logging
 import os
+import time
 from pathlib import Path
-from dataclasses import dataclass
-from typing import Any
+from dataclasses import dataclass, field
+from typing import Any, Iterator
 from urllib.error import HTTPError, URLError
 from urllib.request import Request, urlopen
 
+from src.connectors.base import ConnectorError, NotModifiedError
+from src.connectors.pagination import Pagination, iter_paginated, with_query
+from src.connectors.resilience import CircuitBreaker, RetryPolicy, circuit_breaker, is_transient, set_read_timeout
+from src.connectors.streaming import decode_content, iter_json_records
+
+logger = logging.getLogger(__name__)
+
+VALIDATORS_PATH = Path("data") / "bronze" / "artificial_analysis" / "http_validators.json"
+
 
 def _api_key_from_env_file(env_path: str = ".env") -> str | None:
     path = Path(env_path)
@@ -23,29 +34,114 @@ def _api_key_from_env_file(env_path: str = ".env") -> str | None:
     return None
 
 
-class ArtificialAnalysisError(RuntimeError):
+class ArtificialAnalysisError(ConnectorError):
     """Raised when AA API call fails."""
 
 
 @dataclass(slots=True)
 class ArtificialAnalysisConnector:
+    """
+    AA API client. Requests are conditional: the ETag / Last-Modified of the last
+    complete response are kept in `validators_path` (next to the bronze snapshots) and
+    sent back as If-None-Match / If-Modified-Since, so an unchanged upstream answers
+    304 and fetch()/iter_records() raise NotModifiedError instead of re-sending the
+    payload. Responses may be gzip- or deflate-compressed.
+
+    connect_timeout_s bounds connecting and waiting for the response headers;
+    read_timeout_s bounds each read of the body. Connection errors, timeouts, 429 and
+    5xx are retried per `retry`. Calls go through a circuit breaker shared by all
+    instances for the endpoint: once it opens, requests fail immediately (and ingest
+    falls back) until its reset interval has passed.
+
+    With `pagination` set the catalog is read page by page (see
+    src.connectors.pagination); paged requests are not conditional, since one page's
+    validators say nothing about the others.
+    """
+
     endpoint: str = "https://artificialanalysis.ai/api/v2/data/llms/models"
+    validators_path: Path = field(default_factory=lambda: VALIDATORS_PATH)
+    connect_timeout_s: float = 5.0
+    read_timeout_s: float = 30.0
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    breaker: CircuitBreaker | None = None
+    pagination: Pagination | None = None
 
-    def fetch(self) -> list[dict[str, Any]]:
+    def _breaker(self) -> CircuitBreaker:
+        return self.breaker or circuit_breaker(self.endpoint)
+
+    def _request(self, url: str | None = None, *, conditional: bool = True) -> Request:
         api_key = os.getenv("AA_API_KEY") or _api_key_from_env_file()
         if not api_key:
             raise ArtificialAnalysisError("AA_API_KEY is not set")
+        headers = {"x-api-key": api_key, "accept": "application/json", "accept-encoding": "gzip, deflate"}
+        validators = load_validators(self.validators_path) if conditional else {}
+        if validators.get("etag"):
+            headers["if-none-match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["if-modified-since"] = validators["last_modified"]
+        return Request(url or self.endpoint, headers=headers, method="GET")
+
+    def _open(self, request: Request) -> Any:
+        breaker = self._breaker()
+        if not breaker.allow():
+            raise ArtificialAnalysisError("AA API circuit open: recent requests failed")
+        try:
+            for retry in range(self.retry.attempts):
+                try:
+                    response = urlopen(request, timeout=self.connect_timeout_s)
+                except HTTPError as exc:
+                    if exc.code == 304:
+                        breaker.record_success()
+                        raise NotModifiedError("AA API: not modified") from exc
+                    error: Exception = exc
+                    message = f"AA API HTTP error: {exc.code}"
+                except (URLError, OSError) as exc:
+                    error = exc
+                    message = f"AA API connection error: {getattr(exc, 'reason', exc)}"
+                else:
+                    breaker.record_success()
+                    set_read_timeout(response, self.read_timeout_s)
+                    return response
+                if not is_transient(error) or retry + 1 >= self.retry.attempts:
+                    break
+                delay = self.retry.delay(retry)
+                logger.warning("%s; retrying in %.2fs", message, delay)
+                time.sleep(delay)
+            if is_transient(error):
+                breaker.record_failure()
+            elif isinstance(error, HTTPError):
+                breaker.record_success()  # the upstream answered; a 4xx is not an outage
+            raise ArtificialAnalysisError(message) from error
+        finally:
+            breaker.release()
 
-        request = Request(self.endpoint, headers={"x-api-key": api_key, "accept": "application/json"}, method="GET")
+    def _save_validators(self, response: Any) -> None:
+        headers = getattr(response, "headers", None)
+        if headers is None:
+            return
+        validators = {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+        if any(validators.values()):
+            self.validators_path.parent.mkdir(parents=True, exist_ok=True)
+            self.validators_path.write_text(json.dumps(validators), encoding="utf-8")
+
+    def _read_json(self, response: Any) -> Any:
         try:
-            with urlopen(request, timeout=30) as response:
-                payload = json.loads(response.read().decode("utf-8"))
-        except HTTPError as exc:
-            raise ArtificialAnalysisError(f"AA API HTTP error: {exc.code}") from exc
-        except URLError as exc:
-            raise ArtificialAnalysisError(f"AA API connection error: {exc.reason}") from exc
+            with response:
+                return json.loads(decode_content(response).read().decode("utf-8"))
         except json.JSONDecodeError as exc:
             raise ArtificialAnalysisError("AA API returned invalid JSON") from exc
+        except (URLError, OSError) as exc:
+            self._breaker().record_failure()
+            raise ArtificialAnalysisError(f"AA API connection error: {exc}") from exc
+
+    def _fetch_page(self, params: dict[str, Any]) -> Any:
+        return self._read_json(self._open(self._request(with_query(self.endpoint, params), conditional=False)))
+
+    def fetch(self) -> list[dict[str, Any]]:
+        if self.pagination is not None:
+            return list(self.iter_records())
+        response = self._open(self._request())
+        payload = self._read_json(response)
 
         if isinstance(payload, list):
             records = payload
@@ -56,4 +152,41 @@ class ArtificialAnalysisConnector:
 
         if not isinstance(records, list):
             raise ArtificialAnalysisError("AA API payload did not contain a model list")
+        self._save_validators(response)
         return [r for r in records if isinstance(r, dict)]
+
+    def iter_records(self) -> Iterator[dict[str, Any]]:
+        """
+        Incremental variant of fetch(): the request is sent (and HTTP/connection errors
+        raised) immediately, then records are parsed from the response one at a time.
+        Validators are saved only once the whole response has been parsed. Paginated
+        catalogs are handed on page by page as pages arrive.
+        """
+        if self.pagination is not None:
+            return iter_paginated(self._fetch_page, self.pagination)
+        return self._iter_response(self._open(self._request()))
+
+    def _iter_response(self, response: Any) -> Iterator[dict[str, Any]]:
+        with response:
+            try:
+                yield from iter_json_records(decode_content(response))
+            except json.JSONDecodeError as exc:
+                raise ArtificialAnalysisError("AA API returned invalid JSON") from exc
+            except (URLError, OSError) as exc:
+                self._breaker().record_failure()
+                raise ArtificialAnalysisError(f"AA API connection error: {exc}") from exc
+        self._save_validators(response)
+
+
+def load_validators(path: Path = VALIDATORS_PATH) -> dict[str, str]:
+    """Saved {"etag", "last_modified"} for conditional requests ({} if none)."""
+    try:
+        validators = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return {k: v for k, v in validators.items() if isinstance(v, str)} if isinstance(validators, dict) else {}
+
+
+def discard_validators(path: Path = VALIDATORS_PATH) -> None:
+    """Forget saved validators so the next request fetches the full payload."""
+    path.unlink(missing_ok=True)
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from typing import Any, Iterator, Protocol
+
+
+class ConnectorError(RuntimeError):
+    """Raised when a connector cannot fetch records from its source."""
+
+
+class NotModifiedError(ConnectorError):
+    """Raised when a conditional request finds the source unchanged (HTTP 304)."""
+
+
+class Connector(Protocol):
+    def fetch(self) -> list[dict[str, Any]]: ...
+
+    def iter_records(self) -> Iterator[dict[str, Any]]: ...
@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import json
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
+
+from src.connectors.streaming import iter_json_records
 
 
 class FixtureConnector:
@@ -17,3 +19,7 @@ class FixtureConnector:
             records = payload.get("data") or payload.get("models") or []
             return [r for r in records if isinstance(r, dict)]
         return []
+
+    def iter_records(self) -> Iterator[dict[str, Any]]:
+        with self.fixture_path.open("rb") as handle:
+            yield from iter_json_records(handle)
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from src.connectors.base import ConnectorError
+from src.connectors.pagination import Pagination, iter_paginated, with_query
+from src.connectors.streaming import iter_json_records
+
+
+@dataclass(slots=True)
+class HttpJsonConnector:
+    """
+    Generic connector for a JSON endpoint returning a model list, either top-level or
+    under one of `keys` (the same payload shapes as the AA API), optionally paginated.
+    """
+
+    endpoint: str
+    headers: dict[str, str] = field(default_factory=dict)
+    timeout_s: float = 30.0
+    keys: tuple[str, ...] = ("data", "models")
+    pagination: Pagination | None = None
+
+    def _open(self, url: str | None = None) -> Any:
+        request = Request(url or self.endpoint, headers={"accept": "application/json", **self.headers}, method="GET")
+        try:
+            return urlopen(request, timeout=self.timeout_s)
+        except HTTPError as exc:
+            raise ConnectorError(f"{self.endpoint}: HTTP error {exc.code}") from exc
+        except URLError as exc:
+            raise ConnectorError(f"{self.endpoint}: connection error: {exc.reason}") from exc
+
+    def _fetch_page(self, params: dict[str, Any]) -> Any:
+        try:
+            with self._open(with_query(self.endpoint, params)) as response:
+                return json.load(response)
+        except json.JSONDecodeError as exc:
+            raise ConnectorError(f"{self.endpoint}: invalid JSON") from exc
+        except OSError as exc:
+            raise ConnectorError(f"{self.endpoint}: connection error: {exc}") from exc
+
+    def fetch(self) -> list[dict[str, Any]]:
+        return list(self.iter_records())
+
+    def iter_records(self) -> Iterator[dict[str, Any]]:
+        """Send the (first) request now, raising on HTTP/connection errors, then stream records."""
+        if self.pagination is not None:
+            return iter_paginated(self._fetch_page, self.pagination, self.keys)
+        return self._iter_response(self._open())
+
+    def _iter_response(self, response: Any) -> Iterator[dict[str, Any]]:
+        with response:
+            try:
+                yield from iter_json_records(response, keys=self.keys)
+            except json.JSONDecodeError as exc:
+                raise ConnectorError(f"{self.endpoint}: invalid JSON") from exc
+            except OSError as exc:
+                raise ConnectorError(f"{self.endpoint}: connection error: {exc}") from exc
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import itertools
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+PAGINATION_MODES = ("offset", "cursor")
+
+# Where paged responses put their metadata, besides the top level.
+_META_KEYS = ("meta", "pagination")
+
+FetchPage = Callable[[dict[str, Any]], Any]
+
+
+@dataclass(slots=True)
+class Pagination:
+    """
+    How an endpoint pages its model list.
+
+    mode="offset" sends `limit_param`/`offset_param`; pages after the first are fetched
+    up to `max_parallel` at a time (all offsets up to the reported total, or until a
+    short page when no total is given). Servers often cap `limit` below `page_size`,
+    so offsets advance by the limit the first page echoes (`limit_keys`) or, failing
+    that, by the number of records it actually returned. mode="cursor" sends
+    `cursor_param` from the previous page's next cursor; pages are inherently
+    sequential, so the next page is fetched while the current one is handed on.
+    """
+
+    mode: str = "offset"
+    page_size: int = 500
+    max_parallel: int = 4
+    limit_param: str = "limit"
+    offset_param: str = "offset"
+    cursor_param: str = "cursor"
+    total_keys: tuple[str, ...] = ("total", "total_count")
+    limit_keys: tuple[str, ...] = ("limit", "page_size", "per_page")
+    next_cursor_keys: tuple[str, ...] = ("next_cursor", "next")
+
+    def __post_init__(self) -> None:
+        if self.mode not in PAGINATION_MODES:
+            raise ValueError(f"pagination mode must be one of {PAGINATION_MODES}, got {self.mode!r}")
+        if self.page_size < 1 or self.max_parallel < 1:
+            raise ValueError("page_size and max_parallel must be positive")
+
+
+def with_query(url: str, params: dict[str, Any]) -> str:
+    """`url` with `params` added to (or replacing entries of) its query string."""
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    query.update({key: str(value) for key, value in params.items()})
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def page_records(payload: Any, keys: tuple[str, ...] = ("data", "models")) -> list[dict[str, Any]]:
+    """Records of one page: a top-level list, or the first non-empty list under `keys`."""
+    if isinstance(payload, dict):
+        payload = next((payload[key] for key in keys if payload.get(key)), [])
+    if not isinstance(payload, list):
+        return []
+    return [record for record in payload if isinstance(record, dict)]
+
+
+def _page_meta(payload: Any, names: tuple[str, ...]) -> Any:
+    if not isinstance(payload, dict):
+        return None
+    for scope in (payload, *(payload.get(key) for key in _META_KEYS)):
+        if isinstance(scope, dict):
+            for name in names:
+                if scope.get(name) not in (None, ""):
+                    return scope[name]
+    return None
+
+
+def _prefetched(
+    pool: ThreadPoolExecutor, fetch_page: FetchPage, params: Iterable[dict[str, Any]], depth: int
+) -> Iterator[Any]:
+    """Page payloads in `params` order, keeping up to `depth` requests in flight."""
+    pending: deque[Future[Any]] = deque()
+    params = iter(params)
+    while True:
+        while len(pending) < depth and (next_params := next(params, None)) is not None:
+            pending.append(pool.submit(fetch_page, next_params))
+        if not pending:
+            return
+        yield pending.popleft().result()
+
+
+def _offset_params(pagination: Pagination, offset: int) -> dict[str, Any]:
+    return {pagination.limit_param: pagination.page_size, pagination.offset_param: offset}
+
+
+def _echoed_limit(payload: Any, pagination: Pagination) -> int | None:
+    try:
+        limit = int(_page_meta(payload, pagination.limit_keys))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit > 0 else None
+
+
+def _iter_offset(
+    first: Any, fetch_page: FetchPage, pagination: Pagination, keys: tuple[str, ...]
+) -> Iterator[dict[str, Any]]:
+    records = page_records(first, keys)
+    yield from records
+    if not records:
+        return
+    total = _page_meta(first, pagination.total_keys)
+    echoed = _echoed_limit(first, pagination)
+    # Records the server actually serves per page, which may be fewer than requested.
+    step = echoed or len(records)
+    start = step
+    if total is None and echoed is not None and len(records) < echoed:
+        return  # a short page: the whole catalog
+    if total is None and echoed is None and len(records) < pagination.page_size:
+        # Either the whole catalog or a server capping `limit` silently: the next
+        # page tells, before any further pages are fetched in parallel.
+        records = page_records(fetch_page(_offset_params(pagination, step)), keys)
+        yield from records
+        if len(records) < step:
+            return
+        start = 2 * step
+    offsets = range(start, int(total), step) if total is not None else itertools.count(start, step)
+
+    pool = ThreadPoolExecutor(max_workers=pagination.max_parallel, thread_name_prefix="page-fetch")
+    try:
+        params = (_offset_params(pagination, offset) for offset in offsets)
+        for payload in _prefetched(pool, fetch_page, params, pagination.max_parallel):
+            records = page_records(payload, keys)
+            yield from records
+            if total is None and len(records) < step:
+                return
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _iter_cursor(
+    first: Any, fetch_page: FetchPage, pagination: Pagination, keys: tuple[str, ...]
+) -> Iterator[dict[str, Any]]:
+    base = {pagination.limit_param: pagination.page_size}
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-fetch")
+    try:
+        payload, cursor = first, None
+        while True:
+            previous, cursor = cursor, _page_meta(payload, pagination.next_cursor_keys)
+            following = None
+            if cursor is not None and cursor != previous:
+                following = pool.submit(fetch_page, {**base, pagination.cursor_param: cursor})
+            yield from page_records(payload, keys)
+            if following is None:
+                return
+            payload = following.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_paginated(
+    fetch_page: FetchPage,
+    pagination: Pagination,
+    keys: tuple[str, ...] = ("data", "models"),
+) -> Iterator[dict[str, Any]]:
+    """
+    Records of every page, page by page in order, so normalization can start on the
+    first page while later ones are still being fetched. fetch_page(params) returns
+    the decoded JSON payload of the request with `params` added to its query string.
+    The first page is fetched before returning, so its errors are raised here.
+    """
+    if pagination.mode == "cursor":
+        first = fetch_page({pagination.limit_param: pagination.page_size})
+        return _iter_cursor(first, fetch_page, pagination, keys)
+    first = fetch_page(_offset_params(pagination, 0))
+    return _iter_offset(first, fetch_page, pagination, keys)
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from typing import Callable
+
+from src.connectors.artificial_analysis import ArtificialAnalysisConnector
+from src.connectors.base import Connector, ConnectorError
+from src.connectors.fixture import FixtureConnector
+
+ConnectorFactory = Callable[[], Connector]
+
+_REGISTRY: dict[str, ConnectorFactory] = {}
+
+
+def register_connector(name: str, factory: ConnectorFactory, *, replace: bool = False) -> None:
+    """Make a source available to multi-source ingest under `name` (also its bronze directory)."""
+    if name in _REGISTRY and not replace:
+        raise ValueError(f"connector {name!r} is already registered")
+    _REGISTRY[name] = factory
+
+
+def create_connector(name: str) -> Connector:
+    try:
+        factory = _REGISTRY[name]
+    except KeyError:
+        raise ConnectorError(f"unknown source {name!r}; registered: {', '.join(sorted(_REGISTRY))}") from None
+    return factory()
+
+
+def registered_sources() -> list[str]:
+    return sorted(_REGISTRY)
+
+
+register_connector("artificial_analysis", ArtificialAnalysisConnector)
+register_connector("fixture", FixtureConnector)
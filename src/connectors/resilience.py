@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+from urllib.error import HTTPError, URLError
+
+
+@dataclass(slots=True)
+class RetryPolicy:
+    """Jittered exponential backoff: before retry n, sleep uniform(0, min(max_delay_s, base_delay_s * 2**n))."""
+
+    attempts: int = 3
+    base_delay_s: float = 0.5
+    max_delay_s: float = 8.0
+
+    def delay(self, retry: int) -> float:
+        return random.uniform(0.0, min(self.max_delay_s, self.base_delay_s * 2**retry))
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Errors worth retrying: connection failures, timeouts, HTTP 429 and 5xx."""
+    if isinstance(exc, HTTPError):
+        return exc.code == 429 or exc.code >= 500
+    return isinstance(exc, (URLError, TimeoutError, ConnectionError))
+
+
+class CircuitBreaker:
+    """
+    Remembers consecutive failures of one upstream.
+
+    After `failure_threshold` failed calls in a row the circuit opens and allow()
+    returns False for `reset_after_s`, so callers fail fast instead of waiting on
+    timeouts. Then one trial call is let through (half-open): success closes the
+    circuit, failure opens it again, and a trial that ends any other way is released
+    with release() so the next call can try again.
+    """
+
+    def __init__(self, failure_threshold: int = 2, reset_after_s: float = 300.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_after_s = reset_after_s
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_running or time.monotonic() - self._opened_at < self.reset_after_s:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """End a half-open trial that was neither a success nor a failure; a no-op otherwise."""
+        with self._lock:
+            self._trial_running = False
+
+    def status(self) -> dict[str, Any]:
+        with self._lock:
+            if self._opened_at is None:
+                state = "closed"
+            elif self._trial_running or time.monotonic() - self._opened_at >= self.reset_after_s:
+                state = "half-open"
+            else:
+                state = "open"
+            return {"state": state, "consecutive_failures": self._failures}
+
+
+_BREAKERS: dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def circuit_breaker(key: str) -> CircuitBreaker:
+    """Process-wide breaker for `key` (e.g. an endpoint URL), shared by every connector instance."""
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(key)
+        if breaker is None:
+            breaker = _BREAKERS[key] = CircuitBreaker()
+        return breaker
+
+
+def set_read_timeout(response: Any, timeout_s: float) -> None:
+    """
+    Switch an open urllib response's socket to `timeout_s` for body reads. urlopen()
+    applies its single timeout to connecting and reading the headers; responses that
+    do not expose a socket are left alone.
+    """
+    raw = getattr(getattr(response, "fp", None), "raw", None)
+    sock = getattr(raw, "_sock", None)
+    if sock is not None:
+        sock.settimeout(timeout_s)
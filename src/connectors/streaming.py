@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import codecs
+import gzip
+import json
+import zlib
+from typing import Any, BinaryIO, Iterator
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+class _InflateReader:
+    """File-like view decompressing a zlib ("deflate") byte stream as it is read."""
+
+    def __init__(self, stream: BinaryIO) -> None:
+        self._stream = stream
+        self._inflate = zlib.decompressobj()
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            return self._inflate.decompress(self._stream.read()) + self._inflate.flush()
+        while True:
+            chunk = self._stream.read(size)
+            if not chunk:
+                return self._inflate.flush()
+            data = self._inflate.decompress(chunk)
+            if data:
+                return data
+
+
+def decode_content(response: Any) -> BinaryIO:
+    """
+    Wrap an HTTP response so reads return the decoded body according to its
+    Content-Encoding (gzip or deflate); other responses are returned unchanged.
+    """
+    headers = getattr(response, "headers", None)
+    encoding = (headers.get("Content-Encoding") or "").strip().lower() if headers is not None else ""
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=response)
+    if encoding == "deflate":
+        return _InflateReader(response)
+    return response
+
+
+class _Buffer:
+    """Decoded text window over a byte stream; consumed text is dropped as parsing advances."""
+
+    def __init__(self, stream: BinaryIO, chunk_size: int) -> None:
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Read one more chunk. Returns False once the stream is exhausted."""
+        if self.eof:
+            return False
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            self.eof = True
+            self.text = self.text[self.pos :] + self._decoder.decode(b"", final=True)
+        else:
+            self.text = self.text[self.pos :] + self._decoder.decode(chunk)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of input), without consuming it."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise json.JSONDecodeError(f"Expecting {char!r}", self.text, self.pos)
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value, reading more input until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A scalar that ends exactly at the buffer edge may continue in the next chunk.
+            if end == len(self.text) and not self.eof:
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_array(buffer: _Buffer) -> Iterator[Any]:
+    buffer.expect("[")
+    if buffer.peek() == "]":
+        buffer.pos += 1
+        return
+    while True:
+        yield buffer.value()
+        separator = buffer.peek()
+        buffer.pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise json.JSONDecodeError("Expecting ',' or ']'", buffer.text, buffer.pos - 1)
+
+
+def iter_json_records(
+    stream: BinaryIO,
+    keys: tuple[str, ...] = ("data", "models"),
+    chunk_size: int = 64 * 1024,
+) -> Iterator[dict[str, Any]]:
+    """
+    Yield model records one at a time from a JSON payload that is either a top-level
+    list or an object holding the list under one of `keys` (first non-empty one wins).
+
+    Only the current record and one read chunk are held in memory. Values under other
+    top-level keys are decoded and discarded. Non-dict elements are skipped, matching
+    the eager connectors. Raises json.JSONDecodeError on malformed input.
+    """
+    buffer = _Buffer(stream, chunk_size)
+    first = buffer.peek()
+    if first == "[":
+        for item in _iter_array(buffer):
+            if isinstance(item, dict):
+                yield item
+        return
+    if first != "{":
+        buffer.value()  # scalar payload: validate, no records
+        return
+
+    buffer.expect("{")
+    if buffer.peek() == "}":
+        return
+    while True:
+        key = buffer.value()
+        buffer.expect(":")
+        if key in keys and buffer.peek() == "[":
+            yielded = False
+            for item in _iter_array(buffer):
+                if isinstance(item, dict):
+                    yielded = True
+                    yield item
+            if yielded:
+                return
+        else:
+            buffer.value()
+        separator = buffer.peek()
+        buffer.pos += 1
+        if separator == "}":
+            return
+        if separator != ",":
+            raise json.JSONDecodeError("Expecting ',' or '}'", buffer.text, buffer.pos - 1)
@@ -1,52 +1,429 @@
 from __future__ import annotations
 
+import argparse
+import json
+import logging
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import IO, Any, Callable, Iterable, Iterator
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
-from src.connectors.artificial_analysis import ArtificialAnalysisConnector, ArtificialAnalysisError
+from src.catalog import invalidate_scoring_matrix
+from src.connectors.artificial_analysis import ArtificialAnalysisConnector, ArtificialAnalysisError, discard_validators
+from src.connectors.base import NotModifiedError
 from src.connectors.fixture import FixtureConnector
-from src.schema import normalize_records, utc_now_iso
-from src.warehouse import connect, init_warehouse
+from src.connectors.registry import create_connector
+from src.schema import MANIFEST_SCHEMA, normalize_records_arrow, utc_now_iso
+from src.warehouse import append_snapshot, confirm_snapshot, write_connection
 
+try:
+    import fcntl
+except ImportError:  # not available on Windows: fall back to the in-process guard only
+    fcntl = None
 
-def choose_source() -> tuple[str, list[dict]]:
+logger = logging.getLogger(__name__)
+
+INGEST_LOCK_PATH = Path("data") / "ingest.lock"
+
+
+@contextmanager
+def _timed(timings: dict[str, float], stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = (time.perf_counter() - start) * 1000
+
+
+def choose_source(streaming: bool = False) -> tuple[str, Iterable[dict[str, Any]]]:
+    """
+    Pick the AA API, falling back to the fixture. With streaming=True the records are
+    a generator parsed incrementally from the response; connection errors still fall
+    back, but a failure mid-stream surfaces from whoever consumes the records.
+    NotModifiedError (the AA API answered 304) is not a failure and propagates.
+    """
     connector = ArtificialAnalysisConnector()
     try:
-        records = connector.fetch()
+        records = connector.iter_records() if streaming else connector.fetch()
         return "artificial_analysis", records
     except ArtificialAnalysisError:
-        fixture_records = FixtureConnector().fetch()
+        fixture = FixtureConnector()
+        fixture_records = fixture.iter_records() if streaming else fixture.fetch()
         return "fixture", fixture_records
 
 
-def write_snapshot(frame: pd.DataFrame, source: str, snapshot_ts: str) -> Path:
+def _snapshot_path(source: str, snapshot_ts: str, prefix: str = "models_snapshot") -> Path:
     safe_ts = snapshot_ts.replace(":", "-")
-    out_dir = Path("data") / "bronze" / source
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_path = out_dir / f"models_snapshot_{safe_ts}.parquet"
-    frame.to_parquet(out_path, index=False)
+    return Path("data") / "bronze" / source / f"{prefix}_{safe_ts}.parquet"
+
+
+def write_snapshot(frame: pd.DataFrame | pa.Table, source: str, snapshot_ts: str) -> Path:
+    out_path = _snapshot_path(source, snapshot_ts)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(frame, pa.Table):
+        pq.write_table(frame, out_path)
+    else:
+        frame.to_parquet(out_path, index=False)
     return out_path
 
 
-def load_snapshot_into_duckdb(snapshot_path: Path) -> None:
-    con = connect()
-    try:
-        init_warehouse(con)
-        con.execute("INSERT INTO bronze_models SELECT * FROM read_parquet(?)", [str(snapshot_path)])
-    finally:
-        con.close()
+def snapshot_manifest(snapshot: pa.Table) -> pa.Table:
+    """(snapshot_ts, source, canonical_model_key) of every keyed row of a snapshot, once each."""
+    keyed = snapshot.filter(pc.is_valid(snapshot["canonical_model_key"])).select(MANIFEST_SCHEMA.names)
+    return keyed.group_by(MANIFEST_SCHEMA.names, use_threads=False).aggregate([]).cast(MANIFEST_SCHEMA)
+
+
+def write_manifest(manifest: pa.Table, source: str, snapshot_ts: str) -> Path:
+    """
+    Write a snapshot's membership next to its bronze file. Snapshot files hold only
+    changed rows, so this is what tells an unchanged key from a missing one when
+    bronze_models is rebuilt from Parquet (src.compact.rebuild_bronze).
+    """
+    out_path = _snapshot_path(source, snapshot_ts, prefix="manifest")
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(manifest, out_path)
+    return out_path
+
+
+def load_snapshot_into_duckdb(
+    snapshot: Path | pa.Table, on_changes: Callable[[pa.Table], Future[Any]] | None = None
+) -> int:
+    """
+    Append a snapshot to the warehouse; returns the number of changed rows. An Arrow
+    table (already typed like bronze_models) is registered with DuckDB and scanned in
+    place; a Parquet path is read back through a typed staging table. `on_changes` is
+    passed on to append_snapshot.
+    """
+    with write_connection() as con:
+        if isinstance(snapshot, pa.Table):
+            con.register("incoming_snapshot", snapshot)
+            try:
+                return append_snapshot(con, "incoming_snapshot", on_changes)
+            finally:
+                con.unregister("incoming_snapshot")
 
+        # Typed staging table so the upsert compares TIMESTAMPs, not Parquet strings.
+        con.execute("CREATE OR REPLACE TEMP TABLE incoming_snapshot AS SELECT * FROM bronze_models LIMIT 0")
+        con.execute("INSERT INTO incoming_snapshot SELECT * FROM read_parquet(?)", [str(snapshot)])
+        try:
+            return append_snapshot(con, "incoming_snapshot", on_changes)
+        finally:
+            con.execute("DROP TABLE IF EXISTS incoming_snapshot")
 
-def run_ingest() -> Path:
-    source, records = choose_source()
+
+def _persist_snapshot(
+    normalized: pa.Table, source: str, snapshot_ts: str, timings: dict[str, float], *, arrow_load: bool = True
+) -> tuple[Path, int]:
+    """
+    Load DuckDB and write the bronze Parquet file of the rows that changed, plus the
+    snapshot's manifest file; returns (snapshot path, changed row count). The changed
+    rows come from the load's own transaction and are written while it finishes; the
+    load commits only once the files are written, and they are removed if it fails.
+    """
+    out_path = _snapshot_path(source, snapshot_ts)
+    manifest_path = _snapshot_path(source, snapshot_ts, prefix="manifest")
+
+    def _write(changes: pa.Table) -> Path:
+        with _timed(timings, "write_parquet"):
+            write_manifest(snapshot_manifest(normalized), source=source, snapshot_ts=snapshot_ts)
+            return write_snapshot(changes, source=source, snapshot_ts=snapshot_ts)
+
+    with tempfile.TemporaryDirectory() as staging_dir:
+        snapshot: Path | pa.Table = normalized
+        if not arrow_load:
+            # Round-trip through Parquet, as before Arrow loading; the staged file is not kept.
+            snapshot = Path(staging_dir) / out_path.name
+            with _timed(timings, "stage_parquet"):
+                pq.write_table(normalized, snapshot)
+        try:
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                with _timed(timings, "load_duckdb"):
+                    changed = load_snapshot_into_duckdb(snapshot, lambda changes: pool.submit(_write, changes))
+        except Exception:
+            out_path.unlink(missing_ok=True)
+            manifest_path.unlink(missing_ok=True)
+            raise
+    return out_path, changed
+
+
+def _format_timings(timings: dict[str, float]) -> str:
+    return ", ".join(f"{stage}={ms:.1f}ms" for stage, ms in timings.items())
+
+
+def _confirm_unchanged(source: str, snapshot_ts: str, timings: dict[str, float]) -> int:
+    """
+    Record an unchanged (304) source as present at snapshot_ts and write its manifest
+    file; returns the number of keys confirmed. Zero means the warehouse has no
+    earlier snapshot for the source (e.g. it was rebuilt), so the saved validators are
+    stale and are discarded.
+    """
+    with _timed(timings, "confirm"):
+        with write_connection() as con:
+            confirmed = confirm_snapshot(con, source, snapshot_ts)
+            manifest = con.execute(
+                "SELECT snapshot_ts, source, canonical_model_key FROM snapshot_manifest "
+                "WHERE source = ? AND snapshot_ts = CAST(? AS TIMESTAMP) ORDER BY canonical_model_key",
+                [source, snapshot_ts],
+            ).to_arrow_table()
+        if confirmed:
+            write_manifest(manifest.cast(MANIFEST_SCHEMA), source=source, snapshot_ts=snapshot_ts)
+    if not confirmed:
+        discard_validators()
+    return confirmed
+
+
+def run_ingest(*, streaming: bool = True, arrow_load: bool = True) -> Path | None:
+    """
+    Fetch, normalize, persist and load one snapshot.
+
+    With arrow_load=True the normalized Arrow table is loaded into DuckDB directly, so
+    the snapshot is never decoded back from Parquet; arrow_load=False stages it as a
+    temporary Parquet file and loads that. On both paths the bronze Parquet file holds
+    only rows whose content changed since the previous snapshot (zero rows if nothing
+    changed), the same rows appended to bronze_models, and is written while the load
+    finishes. Stage timings (ms) are logged at INFO.
+
+    If the AA API answers 304 Not Modified nothing is normalized or written: the
+    previous snapshot is re-stamped with the new snapshot_ts and None is returned.
+    """
+    timings: dict[str, float] = {}
     snapshot_ts = utc_now_iso()
-    normalized = normalize_records(records=records, source=source, snapshot_ts=snapshot_ts)
-    snapshot_path = write_snapshot(normalized, source=source, snapshot_ts=snapshot_ts)
-    load_snapshot_into_duckdb(snapshot_path)
+    with _timed(timings, "total"):
+        try:
+            with _timed(timings, "fetch_normalize"):
+                source, records = choose_source(streaming=streaming)
+                normalized = normalize_records_arrow(records=records, source=source, snapshot_ts=snapshot_ts)
+        except NotModifiedError:
+            if not _confirm_unchanged("artificial_analysis", snapshot_ts, timings):
+                return run_ingest(streaming=streaming, arrow_load=arrow_load)
+            invalidate_scoring_matrix()
+            logger.info("artificial_analysis not modified: %s", _format_timings(timings))
+            return None
+
+        try:
+            snapshot_path, changed = _persist_snapshot(normalized, source, snapshot_ts, timings, arrow_load=arrow_load)
+        except Exception:
+            if source == "artificial_analysis":
+                # The validators were saved with the response; keep them only for persisted data.
+                discard_validators()
+            raise
+        invalidate_scoring_matrix()
+
+    logger.info(
+        "ingested %d rows (%d changed) from %s: %s",
+        normalized.num_rows,
+        changed,
+        source,
+        _format_timings(timings),
+    )
     return snapshot_path
 
 
+@dataclass(slots=True)
+class SourceResult:
+    source: str
+    snapshot_path: Path | None = None
+    rows: int = 0
+    changed: int = 0
+    timings: dict[str, float] = field(default_factory=dict)
+    error: str | None = None
+
+
+def _fetch_normalize(source: str, snapshot_ts: str, timings: dict[str, float]) -> pa.Table:
+    with _timed(timings, "fetch_normalize"):
+        records = create_connector(source).iter_records()
+        return normalize_records_arrow(records=records, source=source, snapshot_ts=snapshot_ts)
+
+
+def run_ingest_sources(sources: Iterable[str], *, max_workers: int | None = None) -> dict[str, SourceResult]:
+    """
+    Ingest several registered sources (see src.connectors.registry) in one run.
+
+    Every source is fetched and normalized concurrently on a thread pool (network
+    reads overlap; parsing shares the GIL). Each finished source is persisted as soon
+    as it is ready: its own bronze Parquet file under data/bronze/<source>/ and an
+    append to the warehouse through the single writer. A failing source is recorded
+    in its SourceResult and does not affect the others. All sources share one
+    snapshot_ts. Per-source stage timings are logged at INFO. A source answering 304
+    Not Modified is confirmed from its previous snapshot (rows set, snapshot_path None).
+    """
+    names = list(dict.fromkeys(sources))
+    results = {name: SourceResult(source=name) for name in names}
+    if not names:
+        return results
+    snapshot_ts = utc_now_iso()
+    loaded = False
+    with ThreadPoolExecutor(max_workers=max_workers or len(names), thread_name_prefix="ingest-source") as pool:
+        futures = {
+            pool.submit(_fetch_normalize, name, snapshot_ts, results[name].timings): name for name in names
+        }
+        for future in as_completed(futures):
+            result = results[futures[future]]
+            try:
+                normalized = future.result()
+                result.snapshot_path, changed = _persist_snapshot(normalized, result.source, snapshot_ts, result.timings)
+            except NotModifiedError:
+                result.rows = _confirm_unchanged(result.source, snapshot_ts, result.timings)
+                if not result.rows:
+                    result.error = "not modified, but there is no earlier snapshot to confirm"
+                    continue
+                loaded = True
+                logger.info("%s not modified: %d rows confirmed", result.source, result.rows)
+                continue
+            except Exception as exc:
+                if result.source == "artificial_analysis":
+                    discard_validators()
+                result.error = str(exc)
+                logger.warning("source %s failed: %s", result.source, exc)
+                continue
+            loaded = True
+            result.rows, result.changed = normalized.num_rows, changed
+            logger.info(
+                "ingested %d rows (%d changed) from %s: %s",
+                result.rows,
+                result.changed,
+                result.source,
+                _format_timings(result.timings),
+            )
+    if loaded:
+        invalidate_scoring_matrix()
+    return results
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Path | None = None
+        self.error: BaseException | None = None
+
+
+_FLIGHT_LOCK = threading.Lock()
+_IN_FLIGHT: _Flight | None = None
+
+
+@contextmanager
+def _ingest_file_lock(lock_path: Path) -> Iterator[IO[str]]:
+    """Exclusive advisory lock on lock_path, held across processes; yields the open file."""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+", encoding="utf-8") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield handle
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _record_ingest(handle: IO[str], snapshot_path: Path | None) -> None:
+    """Rewrite the held lock file with the finished ingest (see last_ingest_marker)."""
+    handle.seek(0)
+    handle.truncate()
+    json.dump({"finished_at": time.time(), "snapshot_path": str(snapshot_path) if snapshot_path else None}, handle)
+    handle.flush()
+
+
+def last_ingest_marker(lock_path: Path = INGEST_LOCK_PATH) -> tuple[int, int] | None:
+    """
+    Cheap marker of the last ingest finished by any process: the modification time and
+    size of the lock file, which every ingest rewrites once its snapshot is loaded.
+    One stat() call; the warehouse is not opened. None if no lock file exists yet.
+    """
+    try:
+        stat = lock_path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _run_ingest_locked(since: float, lock_path: Path) -> Path | None:
+    with _ingest_file_lock(lock_path) as handle:
+        handle.seek(0)
+        try:
+            last = json.loads(handle.read() or "{}")
+        except json.JSONDecodeError:
+            last = {}
+        if last.get("finished_at", 0.0) >= since:
+            # Another process ingested while we waited for the lock: share its result,
+            # and drop this process's cached matrix, which predates it.
+            invalidate_scoring_matrix()
+            return Path(last["snapshot_path"]) if last.get("snapshot_path") else None
+        snapshot_path = run_ingest()
+        _record_ingest(handle, snapshot_path)
+        return snapshot_path
+
+
+def run_ingest_once(since: float | None = None, lock_path: Path = INGEST_LOCK_PATH) -> Path | None:
+    """
+    Single-flight run_ingest(): callers that overlap share one ingest and its result.
+
+    Within a process, concurrent callers wait on the in-flight call. Across processes,
+    an exclusive file lock under data/ serializes ingests, and a caller that acquires
+    the lock after another process finished an ingest it was waiting on (one finished
+    at or after `since`, a time.time() value defaulting to now) returns that snapshot
+    instead of ingesting again.
+    """
+    global _IN_FLIGHT
+    since = time.time() if since is None else since
+    with _FLIGHT_LOCK:
+        flight = _IN_FLIGHT
+        leader = flight is None
+        if leader:
+            flight = _IN_FLIGHT = _Flight()
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _run_ingest_locked(since, lock_path)
+        return flight.result
+    except BaseException as exc:
+        flight.error = exc
+        raise
+    finally:
+        with _FLIGHT_LOCK:
+            _IN_FLIGHT = None
+        flight.done.set()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest a model snapshot into the warehouse")
+    parser.add_argument(
+        "--sources",
+        type=str,
+        default=None,
+        help="Comma-separated registered sources to ingest concurrently (default: AA API with fixture fallback)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if not args.sources:
+        path = run_ingest_once()
+        print(f"Ingested snapshot: {path}" if path else "Source not modified; previous snapshot confirmed")
+        return
+
+    with _ingest_file_lock(INGEST_LOCK_PATH) as handle:
+        results = run_ingest_sources(s.strip() for s in args.sources.split(",") if s.strip())
+        if any(result.error is None for result in results.values()):
+            _record_ingest(handle, None)
+    for result in results.values():
+        outcome = f"failed: {result.error}" if result.error else f"{result.rows} rows -> {result.snapshot_path or 'not modified'}"
+        print(f"{result.source}: {outcome}")
+
+
 if __name__ == "__main__":
-    path = run_ingest()
-    print(f"Ingested snapshot: {path}")
+    main()
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_BODY = {"task_text": "python debugging, prefer quality", "topk": 5}
+
+
+def _percentile(sorted_ms: list[float], pct: float) -> float:
+    if not sorted_ms:
+        return float("nan")
+    index = min(len(sorted_ms) - 1, max(0, round(pct / 100 * len(sorted_ms)) - 1))
+    return sorted_ms[index]
+
+
+async def _client(host: str, port: int, request: bytes, deadline: float, latencies: list[float], errors: list[str]) -> None:
+    """One keep-alive connection issuing requests back to back until the deadline."""
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            status = int(head.split(b" ", 2)[1])
+            length = 0
+            for line in head.split(b"\r\n")[1:]:
+                name, _, value = line.partition(b":")
+                if name.strip().lower() == b"content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+            errors.append(type(exc).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.01)
+            continue
+        if status == 200:
+            latencies.append((time.perf_counter() - start) * 1000)
+        else:
+            errors.append(f"HTTP {status}")
+    if writer is not None:
+        writer.close()
+
+
+async def run_level(url: str, body: dict, concurrency: int, duration_s: float) -> dict:
+    parts = urlsplit(url)
+    payload = json.dumps(body).encode()
+    request = (
+        f"POST {parts.path or '/'} HTTP/1.1\r\n"
+        f"Host: {parts.netloc}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\n\r\n"
+    ).encode() + payload
+
+    latencies: list[float] = []
+    errors: list[str] = []
+    deadline = time.perf_counter() + duration_s
+    await asyncio.gather(
+        *(_client(parts.hostname, parts.port or 80, request, deadline, latencies, errors) for _ in range(concurrency))
+    )
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / duration_s,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "p99_ms": _percentile(latencies, 99),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Closed-loop load test against a running web app")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/api/recommend")
+    parser.add_argument("--concurrency", default="50,100,250,500", help="Comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--body", type=str, default=None, help="JSON request body")
+    args = parser.parse_args()
+
+    body = json.loads(args.body) if args.body else DEFAULT_BODY
+    print(f"{'clients':>8} {'requests':>9} {'errors':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for level in (int(n) for n in args.concurrency.split(",")):
+        result = asyncio.run(run_level(args.url, body, level, args.duration))
+        print(
+            f"{result['concurrency']:>8} {result['requests']:>9} {result['errors']:>7} {result['rps']:>8.1f} "
+            f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,28 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
 import math
 import re
+from contextlib import contextmanager
 from dataclasses import asdict
-from datetime import date, datetime, timedelta, timezone
-from typing import Any
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterator, Mapping
 
+import duckdb
+import numpy as np
 import pandas as pd
 
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is used instead
+    orjson = None
+
+from src.catalog import ScoringMatrix, cached_scoring_matrix, get_scoring_matrix, response_cache
+from src.ingest import last_ingest_marker
 from src.schema import TaskProfile
-from src.warehouse import connect, init_warehouse
+from src.warehouse import active_manager, connect, latest_snapshot_stats
 
 TASK_KEYWORDS = {
     "coding": ["code", "python", "debug", "program", "refactor"],
@@ -23,28 +34,22 @@ TASK_KEYWORDS = {
 }
 
 
-def _json_safe(value: Any) -> Any:
-    if value is pd.NA:
-        return None
-    if isinstance(value, dict):
-        return {str(k): _json_safe(v) for k, v in value.items()}
-    if isinstance(value, list):
-        return [_json_safe(v) for v in value]
-    if isinstance(value, tuple):
-        return [_json_safe(v) for v in value]
-    if isinstance(value, set):
-        return sorted(_json_safe(v) for v in value)
-    if isinstance(value, (datetime, date, pd.Timestamp)):
-        return value.isoformat()
-    if isinstance(value, float) and math.isnan(value):
-        return None
-    item = getattr(value, "item", None)
-    if callable(item):
-        try:
-            return _json_safe(item())
-        except (TypeError, ValueError):
-            pass
-    return value
+def dumps_payload(payload: Any) -> bytes:
+    """
+    Serialize a recommendation payload. Payloads are built from native Python types
+    (str, int, float, bool, None, list, dict), so they need no conversion pass; orjson
+    is used when installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _profile_payload(task_profile: TaskProfile) -> dict[str, Any]:
+    payload = asdict(task_profile)
+    if payload["provider_allowlist"] is not None:
+        payload["provider_allowlist"] = sorted(payload["provider_allowlist"])
+    return payload
 
 
 def parse_task_profile(
@@ -95,7 +100,25 @@ def _first_non_null(row: pd.Series, cols: list[str]) -> float:
     return 0.0
 
 
-def _normalize_series(series: pd.Series, invert: bool = False, *, missing_policy: str = "neutral") -> pd.Series:
+def _coalesce_columns(columns: Mapping[str, Any], cols: list[str], n_rows: int) -> np.ndarray:
+    """
+    Columnar equivalent of applying _first_non_null row by row:
+    take the first non-null value across cols, falling back to 0.0.
+    """
+    result = np.full(n_rows, np.nan, dtype="float64")
+    for col in cols:
+        if col not in columns:
+            continue
+        missing = np.isnan(result)
+        if not missing.any():
+            break
+        values = np.asarray(columns[col], dtype="float64")
+        result[missing] = values[missing]
+    result[np.isnan(result)] = 0.0
+    return result
+
+
+def _normalize_values(values: np.ndarray, invert: bool = False, *, missing_policy: str = "neutral") -> np.ndarray:
     """
     Normalize into [0,1].
 
@@ -105,199 +128,505 @@ def _normalize_series(series: pd.Series, invert: bool = False, *, missing_policy
           * for non-inverted metrics (higher is better), missing -> min
           * for inverted metrics (lower is better), missing -> max
     """
-    s = series.astype("float64")
+    s = np.asarray(values, dtype="float64")
+    missing = np.isnan(s)
 
-    if s.dropna().empty:
-        filled = s.fillna(0.0)
+    if missing.all():
+        filled = np.zeros_like(s)
     else:
         if missing_policy == "neutral":
-            filled = s.fillna(float(s.median()))
+            fill_value = float(np.nanmedian(s))
         elif missing_policy == "penalize":
-            penalty = float(s.max()) if invert else float(s.min())
-            filled = s.fillna(penalty)
+            fill_value = float(np.nanmax(s)) if invert else float(np.nanmin(s))
         else:
             raise ValueError(f"unknown missing_policy={missing_policy!r}")
+        filled = np.where(missing, fill_value, s)
 
+    if not len(filled):
+        return filled
     min_val, max_val = float(filled.min()), float(filled.max())
     if abs(max_val - min_val) < 1e-9:
-        norm = pd.Series([0.5] * len(filled), index=filled.index)
+        norm = np.full(len(filled), 0.5)
     else:
         norm = (filled - min_val) / (max_val - min_val)
 
     return 1 - norm if invert else norm
 
 
-def _latest_snapshot_ts_utc() -> datetime | None:
+def _normalize_to_stats(
+    values: np.ndarray, stats: Mapping[str, float | None], invert: bool = False, *, missing_policy: str = "neutral"
+) -> np.ndarray:
     """
-    Read max(snapshot_ts) from models_latest. Returns timezone-aware UTC datetime if available.
-    If table doesn't exist / empty / error, returns None.
+    Normalize into [0,1] against snapshot-wide statistics instead of the candidates'
+    own min/max/median, so a model's score does not depend on which other models
+    survived the filters. Missing values follow missing_policy as in _normalize_values,
+    using the snapshot median / min / max.
     """
+    s = np.asarray(values, dtype="float64")
+    min_val, max_val, median = stats["min_value"], stats["max_value"], stats["median"]
+    if min_val is None or max_val is None or abs(max_val - min_val) < 1e-9:
+        return np.full(len(s), 0.5)
+
+    if missing_policy == "neutral":
+        fill_value = median
+    elif missing_policy == "penalize":
+        fill_value = max_val if invert else min_val
+    else:
+        raise ValueError(f"unknown missing_policy={missing_policy!r}")
+    filled = np.clip(np.where(np.isnan(s), fill_value, s), min_val, max_val)
+    norm = (filled - min_val) / (max_val - min_val)
+    return 1 - norm if invert else norm
+
+
+NORMALIZATION_MODES = ("candidates", "snapshot")
+
+
+@contextmanager
+def _read_connection() -> Iterator[Any]:
+    """
+    Thread-owned cursor from the app's ConnectionManager when one is open;
+    otherwise a short-lived connection (CLI path). Read paths never run DDL:
+    migrations are applied by ingest and at app startup.
+    """
+    manager = active_manager()
+    if manager is not None:
+        with manager.reader() as cursor:
+            yield cursor
+        return
+
     con = connect()
     try:
-        init_warehouse(con)
-        row = con.execute("SELECT max(snapshot_ts) AS max_ts FROM models_latest").fetchone()
-        max_ts = row[0] if row else None
-        if max_ts is None:
-            return None
-
-        # duckdb returns Python datetime (naive). Treat as UTC.
-        if isinstance(max_ts, datetime):
-            return max_ts.replace(tzinfo=timezone.utc) if max_ts.tzinfo is None else max_ts.astimezone(timezone.utc)
-
-        # fallback: parse string
-        parsed = datetime.fromisoformat(str(max_ts))
-        return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed.astimezone(timezone.utc)
-    except Exception:
-        return None
+        yield con
     finally:
         con.close()
 
 
-def _maybe_refresh_warehouse(*, refresh: bool, max_age_hours: float) -> str | None:
+def _top_k(score: np.ndarray, keys: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k best scores, best first, ties broken by ascending keys
+    (ScoringMatrix.key_rank, or any sortable array). A partial selection keeps the
+    scores above the k-th best plus only as many boundary ties as are needed, chosen by
+    key with a second partial selection, so just those (at most k) rows are sorted.
+    """
+    n = len(score)
+    k = max(0, min(k, n))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        threshold = score[np.argpartition(-score, k - 1)[k - 1]]
+        above = np.flatnonzero(score > threshold)
+        tied = np.flatnonzero(score == threshold)
+        needed = k - len(above)
+        if needed < len(tied):
+            tied = tied[np.argpartition(keys[tied], needed - 1)[:needed]]
+        candidates = np.concatenate([above, tied])
+    else:
+        candidates = np.arange(n)
+    return candidates[np.lexsort((keys[candidates], -score[candidates]))][:k]
+
+
+def _load_models_latest() -> pd.DataFrame:
+    with _read_connection() as con:
+        try:
+            return con.execute("SELECT * FROM models_latest").fetch_df()
+        except duckdb.CatalogException:
+            # Warehouse not migrated yet (no ingest has run): treat as empty.
+            return pd.DataFrame()
+
+
+def _load_snapshot_stats() -> dict[str, dict[str, float | None]]:
+    with _read_connection() as con:
+        try:
+            return latest_snapshot_stats(con)
+        except duckdb.CatalogException:
+            return {}
+
+
+def _current_matrix() -> ScoringMatrix:
+    """
+    The process-wide ScoringMatrix, revalidated against last_ingest_marker(), which
+    changes after every ingest in any process (cron, another worker, the CLI). A cache
+    hit costs one stat() of the ingest lock file and never opens the warehouse.
+    """
+    return get_scoring_matrix(_load_models_latest, _load_snapshot_stats, version=last_ingest_marker())
+
+
+def _latest_snapshot_ts_utc() -> datetime | None:
+    """
+    max(snapshot_ts) of models_latest as a timezone-aware UTC datetime, or None if the
+    warehouse is empty. Read from the revalidated ScoringMatrix (see _current_matrix).
+    """
+    return _current_matrix().snapshot_ts_utc()
+
+
+# How long a request against an empty warehouse waits for a background refresh;
+# below the app's REQUEST_TIMEOUT_S, so the read-pool thread is released in time.
+EMPTY_WAREHOUSE_WAIT_S = 8.0
+
+
+def _snapshot_due(latest: datetime | None, *, refresh: bool, max_age_hours: float) -> bool:
+    now = datetime.now(tz=timezone.utc)
+    return refresh or latest is None or (now - latest) > timedelta(hours=max_age_hours)
+
+
+def _refresh_due(*, refresh: bool, max_age_hours: float) -> bool:
+    """True if refresh is forced, the warehouse is empty, or the snapshot is older than max_age_hours."""
+    return _snapshot_due(_latest_snapshot_ts_utc(), refresh=refresh, max_age_hours=max_age_hours)
+
+
+def _maybe_refresh_warehouse(latest: datetime | None, *, refresh: bool, max_age_hours: float) -> str | None:
     """
     Option A: auto-refresh on recommend.
     - If refresh=True: always run ingest.
-    - Else: run ingest only if latest snapshot is older than max_age_hours or missing.
+    - Else: run ingest only if the latest snapshot (`latest`) is older than max_age_hours or missing.
 
     Returns a warning string if refresh was attempted but failed; otherwise None.
     """
-    now = datetime.now(tz=timezone.utc)
-    latest = _latest_snapshot_ts_utc()
-
-    needs_refresh = refresh or latest is None or (now - latest) > timedelta(hours=max_age_hours)
-    if not needs_refresh:
+    if not _snapshot_due(latest, refresh=refresh, max_age_hours=max_age_hours):
         return None
 
     try:
         # Lazy import to avoid any circular import headaches at module import time.
-        from src.ingest import run_ingest
+        from src.ingest import run_ingest_once
 
-        run_ingest()
+        run_ingest_once()
         return None
     except Exception as exc:
         # If refresh fails, we still proceed using existing warehouse state.
         return f"Refresh failed; using existing warehouse snapshot. Error: {exc!s}"
 
 
-def recommend(
-    task_profile: TaskProfile,
+def _refresh_in_background(latest: datetime | None, *, max_age_hours: float) -> dict[str, Any]:
+    """
+    Stale-while-revalidate variant of _maybe_refresh_warehouse for refreshes due by
+    age (`latest` is the current snapshot time): start one on the shared
+    BackgroundRefresher (a no-op if one is already running) and return immediately so
+    the caller serves the current snapshot. Only an
+    empty warehouse, where there is nothing to serve, waits for the refresh to finish,
+    for at most EMPTY_WAREHOUSE_WAIT_S.
+
+    Returns the refresh status reported in the payload under "refresh".
+    """
+    from src.refresh import background_refresher
+
+    refresher = background_refresher()
+    stale = _snapshot_due(latest, refresh=False, max_age_hours=max_age_hours)
+
+    triggered = refresher.trigger() if stale else False
+    if latest is None:
+        refresher.wait(EMPTY_WAREHOUSE_WAIT_S)
+    return {"stale": stale, "triggered": triggered, **refresher.status()}
+
+
+def _format_ts(value: np.datetime64) -> str:
+    return str(pd.Timestamp(value))
+
+
+def _optional_float(value: float) -> float | None:
+    return None if math.isnan(value) else float(value)
+
+
+QUALITY_COLUMNS = {
+    "coding": ["coding_index", "quality_index", "reasoning_index"],
+    "math": ["math_index", "reasoning_index", "quality_index"],
+    "reasoning": ["reasoning_index", "quality_index"],
+    "writing": ["quality_index", "reasoning_index"],
+    "rag": ["reasoning_index", "quality_index"],
+    "agent": ["reasoning_index", "coding_index", "quality_index"],
+    "general": ["quality_index", "reasoning_index", "coding_index", "math_index"],
+}
+
+
+def _candidate_rows(matrix: ScoringMatrix, task_profile: TaskProfile) -> np.ndarray:
+    """Row ids of models_latest that satisfy the profile's hard constraints."""
+    return matrix.index.candidate_rows(
+        task_profile.max_price_per_1m, task_profile.min_context, task_profile.provider_allowlist
+    )
+
+
+def _candidate_group_key(task_profile: TaskProfile) -> tuple:
+    """Profiles sharing this key share candidate rows and normalized features."""
+    allowlist = frozenset(task_profile.provider_allowlist) if task_profile.provider_allowlist else None
+    return (task_profile.task_type, task_profile.max_price_per_1m, task_profile.min_context, allowlist)
+
+
+def _with_warnings(payload: dict[str, Any], *warnings: str | None) -> dict[str, Any]:
+    present = [w for w in warnings if w]
+    if present:
+        payload["warning"] = " | ".join(present)
+    return payload
+
+
+def _rank_profiles(
+    matrix: ScoringMatrix,
+    profiles: list[TaskProfile],
     topk: int,
     *,
-    missing_policy: str = "penalize",
-    refresh: bool = False,
-    max_age_hours: float = 24.0,
-) -> dict:
-    refresh_warning = _maybe_refresh_warehouse(refresh=refresh, max_age_hours=max_age_hours)
+    missing_policy: str,
+    refresh_warning: str | None,
+    normalization: str = "candidates",
+) -> list[dict[str, Any]]:
+    """
+    Score and rank every profile against one ScoringMatrix.
 
-    con = connect()
-    try:
-        init_warehouse(con)
-        df = con.execute("SELECT * FROM models_latest").fetch_df()
-    finally:
-        con.close()
+    Profiles are grouped by task type and hard constraints; each group normalizes its
+    quality/speed/cost features once and scores all of its profiles with a single
+    (profiles x 3) @ (3 x models) product.
+
+    normalization="candidates" scales speed and cost over the filtered candidates;
+    "snapshot" scales them against the snapshot-wide statistics (snapshot_stats), with
+    no per-request reductions. Quality is always scaled over the candidates, because
+    its coalesced column differs per task type.
+    """
+    if normalization not in NORMALIZATION_MODES:
+        raise ValueError(f"unknown normalization={normalization!r}")
+
+    def _scaled(values: np.ndarray, col: str, invert: bool = False) -> np.ndarray:
+        if normalization == "snapshot":
+            return _normalize_to_stats(values, matrix.snapshot_stats(col), invert, missing_policy=missing_policy)
+        return _normalize_values(values, invert, missing_policy=missing_policy)
 
-    if df.empty:
-        payload = {"task_profile": asdict(task_profile), "snapshot_ts": None, "recommendations": []}
-        if refresh_warning:
-            payload["warning"] = refresh_warning
-        return _json_safe(payload)
+    results: list[dict[str, Any] | None] = [None] * len(profiles)
+    if len(matrix) == 0:
+        for i, task_profile in enumerate(profiles):
+            payload = {"task_profile": _profile_payload(task_profile), "snapshot_ts": None, "recommendations": []}
+            results[i] = _with_warnings(payload, refresh_warning)
+        return results
 
-    key_fields = ["provider", "price_input_per_1m", "output_tokens_per_s", "context_window"]
-    null_rates = {field: float(df[field].isna().mean()) for field in key_fields if field in df.columns}
     data_quality_warning: str | None = None
+    null_rates = matrix.null_rates
     if null_rates and all(rate >= 0.98 for rate in null_rates.values()):
         data_quality_warning = (
             "models_latest has near-empty provider/price/speed/context fields; "
             "recommendations may be low-confidence due to source schema mismatch"
         )
 
-    if task_profile.max_price_per_1m is not None:
-        df = df[(df["price_input_per_1m"] <= task_profile.max_price_per_1m) | (df["price_input_per_1m"].isna())]
-    if task_profile.min_context is not None:
-        df = df[(df["context_window"] >= task_profile.min_context) | (df["context_window"].isna())]
-    if task_profile.provider_allowlist:
-        providers = df["provider"].fillna("").str.lower()
-        df = df[providers.isin(task_profile.provider_allowlist)]
-
-    if df.empty:
-        payload = {"task_profile": asdict(task_profile), "snapshot_ts": None, "recommendations": []}
-        if refresh_warning:
-            payload["warning"] = refresh_warning
-        return _json_safe(payload)
-
-    quality_cols = {
-        "coding": ["coding_index", "quality_index", "reasoning_index"],
-        "math": ["math_index", "reasoning_index", "quality_index"],
-        "reasoning": ["reasoning_index", "quality_index"],
-        "writing": ["quality_index", "reasoning_index"],
-        "rag": ["reasoning_index", "quality_index"],
-        "agent": ["reasoning_index", "coding_index", "quality_index"],
-        "general": ["quality_index", "reasoning_index", "coding_index", "math_index"],
-    }
-    selected_quality_cols = quality_cols[task_profile.task_type]
-    if not any(df[col].notna().any() for col in selected_quality_cols):
-        payload = {
-            "task_profile": asdict(task_profile),
-            "snapshot_ts": str(df["snapshot_ts"].max()),
-            "recommendations": [],
-            "warning": data_quality_warning
-            or "No quality metrics are available for the selected task type in models_latest.",
-        }
-        if refresh_warning:
-            payload["warning"] = f"{payload['warning']} | {refresh_warning}"
-        return _json_safe(payload)
-
-    df["quality_metric"] = df.apply(lambda row: _first_non_null(row, selected_quality_cols), axis=1)
-    df["quality_norm"] = _normalize_series(df["quality_metric"], missing_policy="neutral")
-
-    df["speed_norm"] = (
-        _normalize_series(df["output_tokens_per_s"], missing_policy=missing_policy) * 0.7
-        + _normalize_series(df["ttft_s"], invert=True, missing_policy=missing_policy) * 0.3
+    groups: dict[tuple, list[int]] = {}
+    for i, task_profile in enumerate(profiles):
+        groups.setdefault(_candidate_group_key(task_profile), []).append(i)
+
+    metrics = matrix.metrics
+    for members in groups.values():
+        task_type = profiles[members[0]].task_type
+        rows = _candidate_rows(matrix, profiles[members[0]])
+        if not len(rows):
+            for i in members:
+                payload = {"task_profile": _profile_payload(profiles[i]), "snapshot_ts": None, "recommendations": []}
+                results[i] = _with_warnings(payload, refresh_warning)
+            continue
+
+        selected_quality_cols = QUALITY_COLUMNS[task_type]
+        candidates = {col: metrics[col][rows] for col in metrics}
+        if not any((~np.isnan(candidates[col])).any() for col in selected_quality_cols):
+            for i in members:
+                payload = {
+                    "task_profile": _profile_payload(profiles[i]),
+                    "snapshot_ts": _format_ts(matrix.row_snapshot_ts[rows].max()),
+                    "recommendations": [],
+                }
+                results[i] = _with_warnings(
+                    payload,
+                    data_quality_warning or "No quality metrics are available for the selected task type in models_latest.",
+                    refresh_warning,
+                )
+            continue
+
+        quality_metric = _coalesce_columns(candidates, selected_quality_cols, len(rows))
+        quality_norm = _normalize_values(quality_metric, missing_policy="neutral")
+        speed_norm = (
+            _scaled(candidates["output_tokens_per_s"], "output_tokens_per_s") * 0.7
+            + _scaled(candidates["ttft_s"], "ttft_s", invert=True) * 0.3
+        )
+        cost_norm = _scaled(candidates["price_input_per_1m"], "price_input_per_1m", invert=True)
+
+        features = np.vstack([quality_norm, speed_norm, cost_norm])
+        weights = np.array([[p.weight_quality, p.weight_speed, p.weight_cost] for p in (profiles[i] for i in members)])
+        scores = weights @ features
+        keys = matrix.key_rank[rows]
+
+        for i, score in zip(members, scores):
+            task_profile = profiles[i]
+            order = _top_k(score, keys, topk)
+            ranked_rows = rows[order]
+            snapshot_ts = _format_ts(matrix.row_snapshot_ts[ranked_rows].max()) if len(ranked_rows) else None
+
+            recs: list[dict[str, Any]] = []
+            for pos, row in zip(order, ranked_rows):
+                context_window = metrics["context_window"][row]
+                recs.append(
+                    {
+                        "canonical_model_key": matrix.canonical_model_key[row],
+                        "model_name": matrix.model_name[row],
+                        "provider": matrix.provider[row],
+                        "score": round(float(score[pos]), 4),
+                        "metrics": {
+                            "quality_metric": float(quality_metric[pos]),
+                            "output_tokens_per_s": _optional_float(metrics["output_tokens_per_s"][row]),
+                            "price_input_per_1m": _optional_float(metrics["price_input_per_1m"][row]),
+                            "context_window": None if math.isnan(context_window) else int(context_window),
+                        },
+                        "justification": (
+                            f"Strong {task_type} quality signal with normalized quality {quality_norm[pos]:.2f}. "
+                            f"Speed {speed_norm[pos]:.2f} and cost-fit {cost_norm[pos]:.2f} under your preferences."
+                        ),
+                        "snapshot_ts": _format_ts(matrix.row_snapshot_ts[row]),
+                    }
+                )
+
+            payload = {"task_profile": _profile_payload(task_profile), "snapshot_ts": snapshot_ts, "recommendations": recs}
+            results[i] = _with_warnings(payload, data_quality_warning, refresh_warning)
+
+    return results
+
+
+def _response_key(
+    task_profile: TaskProfile, topk: int, missing_policy: str, normalization: str, snapshot_id: str
+) -> tuple:
+    fields = tuple(
+        (name, tuple(sorted(value)) if isinstance(value, (set, frozenset)) else value)
+        for name, value in asdict(task_profile).items()
     )
-    df["cost_norm"] = _normalize_series(df["price_input_per_1m"], invert=True, missing_policy=missing_policy)
+    return (fields, topk, missing_policy, normalization, snapshot_id)
 
-    df["score"] = (
-        task_profile.weight_quality * df["quality_norm"]
-        + task_profile.weight_speed * df["speed_norm"]
-        + task_profile.weight_cost * df["cost_norm"]
-    )
 
-    ranked = df.sort_values("score", ascending=False).head(topk)
-    snapshot_ts = str(ranked["snapshot_ts"].max()) if not ranked.empty else None
-
-    recs: list[dict[str, Any]] = []
-    for _, row in ranked.iterrows():
-        recs.append(
-            {
-                "canonical_model_key": row["canonical_model_key"],
-                "model_name": row["model_name"],
-                "provider": row.get("provider"),
-                "score": round(float(row["score"]), 4),
-                "metrics": {
-                    "quality_metric": row.get("quality_metric"),
-                    "output_tokens_per_s": row.get("output_tokens_per_s"),
-                    "price_input_per_1m": row.get("price_input_per_1m"),
-                    "context_window": row.get("context_window"),
-                },
-                "justification": (
-                    f"Strong {task_profile.task_type} quality signal with normalized quality {row['quality_norm']:.2f}. "
-                    f"Speed {row['speed_norm']:.2f} and cost-fit {row['cost_norm']:.2f} under your preferences."
-                ),
-                "snapshot_ts": str(row["snapshot_ts"]),
-            }
+def _etag(key: tuple) -> str:
+    # Weak: the "refresh" status attached to a payload may differ between responses.
+    return 'W/"' + hashlib.sha1(repr(key).encode()).hexdigest()[:24] + '"'
+
+
+def _recommend_keyed(
+    profiles: list[TaskProfile],
+    topk: int,
+    *,
+    missing_policy: str,
+    refresh: bool,
+    max_age_hours: float,
+    background_refresh: bool,
+    normalization: str,
+) -> list[tuple[tuple, dict]]:
+    """
+    (response key, payload) per profile. Payloads are served from the response cache
+    when an entry for the same profile, topk, missing_policy, normalization and snapshot
+    exists; only the misses are ranked. Payloads carrying a refresh-failure warning are not cached.
+    """
+    matrix = _current_matrix()
+    latest = matrix.snapshot_ts_utc()
+    refresh_status: dict[str, Any] | None = None
+    if background_refresh and not refresh:
+        refresh_status = _refresh_in_background(latest, max_age_hours=max_age_hours)
+        refresh_warning = None
+        if refresh_status["state"] == "failed":
+            refresh_warning = f"Background refresh failed; using existing warehouse snapshot. Error: {refresh_status['error']}"
+    else:
+        refresh_warning = _maybe_refresh_warehouse(latest, refresh=refresh, max_age_hours=max_age_hours)
+    if cached_scoring_matrix() is not matrix:
+        # An ingest finished meanwhile (inline, or awaited on an empty warehouse).
+        matrix = _current_matrix()
+
+    cache = response_cache()
+    snapshot_id = matrix.snapshot_id()
+    keys = [_response_key(profile, topk, missing_policy, normalization, snapshot_id) for profile in profiles]
+    payloads = [cache.get(key) if refresh_warning is None else None for key in keys]
+    misses = [i for i, payload in enumerate(payloads) if payload is None]
+    if misses:
+        ranked = _rank_profiles(
+            matrix,
+            [profiles[i] for i in misses],
+            topk,
+            missing_policy=missing_policy,
+            refresh_warning=refresh_warning,
+            normalization=normalization,
         )
+        for i, payload in zip(misses, ranked):
+            payloads[i] = payload
+            if refresh_warning is None:
+                cache.put(keys[i], payloads[i])
 
-    payload: dict[str, Any] = {"task_profile": asdict(task_profile), "snapshot_ts": snapshot_ts, "recommendations": recs}
+    results: list[tuple[tuple, dict]] = []
+    for key, payload in zip(keys, payloads):
+        payload = dict(payload)
+        if refresh_status is not None:
+            payload["refresh"] = refresh_status
+        results.append((key, payload))
+    return results
 
-    warnings: list[str] = []
-    if data_quality_warning:
-        warnings.append(data_quality_warning)
-    if refresh_warning:
-        warnings.append(refresh_warning)
-    if warnings:
-        payload["warning"] = " | ".join(warnings)
 
-    return _json_safe(payload)
+def recommend(
+    task_profile: TaskProfile,
+    topk: int,
+    *,
+    missing_policy: str = "penalize",
+    refresh: bool = False,
+    max_age_hours: float = 24.0,
+    background_refresh: bool = False,
+    normalization: str = "candidates",
+) -> dict:
+    """
+    Rank models for one task profile. With background_refresh=True a refresh due by
+    age runs on a background thread (see _refresh_in_background) instead of inline,
+    and the payload carries its status under "refresh". refresh=True always ingests
+    inline before ranking.
+    """
+    payload, _ = recommend_with_etag(
+        task_profile,
+        topk,
+        missing_policy=missing_policy,
+        refresh=refresh,
+        max_age_hours=max_age_hours,
+        background_refresh=background_refresh,
+        normalization=normalization,
+    )
+    return payload
+
+
+def recommend_with_etag(
+    task_profile: TaskProfile,
+    topk: int,
+    *,
+    missing_policy: str = "penalize",
+    refresh: bool = False,
+    max_age_hours: float = 24.0,
+    background_refresh: bool = False,
+    normalization: str = "candidates",
+) -> tuple[dict, str]:
+    """recommend() plus a weak ETag derived from the profile, topk, missing_policy and snapshot id."""
+    [(key, payload)] = _recommend_keyed(
+        [task_profile],
+        topk,
+        missing_policy=missing_policy,
+        refresh=refresh,
+        max_age_hours=max_age_hours,
+        background_refresh=background_refresh,
+        normalization=normalization,
+    )
+    return payload, _etag(key)
+
+
+def recommend_batch(
+    profiles: list[TaskProfile],
+    topk: int,
+    *,
+    missing_policy: str = "penalize",
+    refresh: bool = False,
+    max_age_hours: float = 24.0,
+    background_refresh: bool = False,
+    normalization: str = "candidates",
+) -> list[dict]:
+    """
+    Rank many task profiles in one pass: one freshness check, one ScoringMatrix, and
+    one matrix product per group of profiles sharing task type and constraints.
+    Each result has the same shape as recommend().
+    """
+    keyed = _recommend_keyed(
+        profiles,
+        topk,
+        missing_policy=missing_policy,
+        refresh=refresh,
+        max_age_hours=max_age_hours,
+        background_refresh=background_refresh,
+        normalization=normalization,
+    )
+    return [payload for _key, payload in keyed]
 
 
 def _extract_budget_from_text(task: str) -> float | None:
@@ -342,6 +671,13 @@ def main() -> None:
         choices=["neutral", "penalize"],
         help="How to treat missing speed/cost metrics during scoring",
     )
+    parser.add_argument(
+        "--normalization",
+        type=str,
+        default="candidates",
+        choices=list(NORMALIZATION_MODES),
+        help="Scale speed/cost over the filtered candidates or over the whole snapshot (snapshot_stats)",
+    )
 
     # Option A: auto-refresh on recommend
     parser.add_argument(
@@ -372,8 +708,9 @@ def main() -> None:
         missing_policy=args.missing_policy,
         refresh=args.refresh,
         max_age_hours=args.max_age_hours,
+        normalization=args.normalization,
     )
-    print(json.dumps(_json_safe(result), indent=2))
+    print(json.dumps(result, indent=2))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from src.ingest import run_ingest_once
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundRefresher:
+    """
+    Runs ingest on a daemon thread, at most one run at a time.
+
+    trigger() while a run is in flight is a no-op, so concurrent stale requests share
+    a single refresh. The outcome of the last run is kept for status().
+    """
+
+    def __init__(self, run: Callable[[], Any] | None = None) -> None:
+        self._run = run
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._done.set()
+        self._state = "idle"
+        self._started_at: datetime | None = None
+        self._finished_at: datetime | None = None
+        self._error: str | None = None
+
+    def trigger(self) -> bool:
+        """Start a refresh unless one is running. Returns True if this call started it."""
+        with self._lock:
+            if not self._done.is_set():
+                return False
+            self._done.clear()
+            self._state = "running"
+            self._started_at = datetime.now(tz=timezone.utc)
+            self._finished_at = None
+            self._error = None
+        threading.Thread(target=self._target, name="warehouse-refresh", daemon=True).start()
+        return True
+
+    def _target(self) -> None:
+        state, error = "succeeded", None
+        try:
+            (self._run or run_ingest_once)()
+        except Exception as exc:
+            logger.exception("background refresh failed")
+            state, error = "failed", str(exc)
+        with self._lock:
+            self._state = state
+            self._error = error
+            self._finished_at = datetime.now(tz=timezone.utc)
+            self._done.set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until no refresh is running. Returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def status(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "started_at": self._started_at.isoformat() if self._started_at else None,
+                "finished_at": self._finished_at.isoformat() if self._finished_at else None,
+                "error": self._error,
+            }
+
+
+_REFRESHER = BackgroundRefresher()
+
+
+def background_refresher() -> BackgroundRefresher:
+    return _REFRESHER
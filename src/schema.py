@@ -2,9 +2,10 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, Iterable
 
 import pandas as pd
+import pyarrow as pa
 
 CANONICAL_COLUMNS = [
     "snapshot_ts",
@@ -26,6 +27,32 @@ CANONICAL_COLUMNS = [
 ]
 
 
+# Arrow types matching the bronze_models DDL in src/warehouse.py.
+ARROW_SCHEMA = pa.schema(
+    [
+        ("snapshot_ts", pa.timestamp("us")),
+        ("source", pa.string()),
+        ("model_name", pa.string()),
+        ("provider", pa.string()),
+        ("quality_index", pa.float64()),
+        ("coding_index", pa.float64()),
+        ("math_index", pa.float64()),
+        ("reasoning_index", pa.float64()),
+        ("output_tokens_per_s", pa.float64()),
+        ("ttft_s", pa.float64()),
+        ("price_input_per_1m", pa.float64()),
+        ("price_output_per_1m", pa.float64()),
+        ("context_window", pa.int64()),
+        ("is_open_source", pa.bool_()),
+        ("license", pa.string()),
+        ("canonical_model_key", pa.string()),
+    ]
+)
+
+# Arrow types matching the snapshot_manifest DDL: which keys each snapshot contained.
+MANIFEST_SCHEMA = pa.schema([ARROW_SCHEMA.field(name) for name in ("snapshot_ts", "source", "canonical_model_key")])
+
+
 @dataclass(slots=True)
 class TaskProfile:
     task_type: str
@@ -45,6 +72,7 @@ def _pick(record: dict[str, Any], *keys: str) -> Any:
     """
     Try keys in order. Supports dotted paths like 'pricing.price_1m_input_tokens'.
     Returns the first non-None value found.
+    Uncompiled reference for ExtractionPlan, which normalize_records() uses.
     """
     for key in keys:
         if "." in key:
@@ -111,158 +139,196 @@ def canonical_model_key(model_name: str, provider: str | None) -> str:
     return f"{provider_part}::{name}"
 
 
-def normalize_records(records: list[dict[str, Any]], source: str, snapshot_ts: str) -> pd.DataFrame:
-    normalized: list[dict[str, Any]] = []
+# Source aliases per canonical field, tried in order; the first non-None value wins.
+FIELD_ALIASES: dict[str, tuple[str, ...]] = {
+    "model_name": ("model_name", "modelName", "name", "model"),
+    # AA v2 uses model_creator.{name,slug}
+    "provider": (
+        "provider",
+        "provider_name",
+        "providerName",
+        "vendor",
+        "lab",
+        "organization",
+        "developer",
+        "creator.name",
+        "model_creator.name",  # ✅ AA v2
+        "model_creator.slug",  # sometimes useful fallback
+    ),
+    # AA v2 stores indices under evaluations.*
+    "quality_index": (
+        "quality_index",
+        "intelligence_index",
+        "intelligenceIndex",
+        "overall_index",
+        "overall",
+        "evaluations.artificial_analysis_intelligence_index",  # ✅ AA v2
+    ),
+    "coding_index": (
+        "coding_index",
+        "codingIndex",
+        "code_index",
+        "evaluations.artificial_analysis_coding_index",  # ✅ AA v2
+    ),
+    "math_index": (
+        "math_index",
+        "mathIndex",
+        "evaluations.artificial_analysis_math_index",  # ✅ AA v2
+    ),
+    "reasoning_index": ("reasoning_index", "reasoningIndex", "reasoning"),
+    # AA v2 throughput/latency fields
+    "output_tokens_per_s": (
+        "output_tokens_per_s",
+        "outputTokensPerSecond",
+        "tokens_per_second",
+        "tokensPerSecond",
+        "throughput",
+        "performance.output_tokens_per_s",
+        "median_output_tokens_per_second",  # ✅ AA v2
+    ),
+    "ttft_s": (
+        "ttft_s",
+        "time_to_first_token",
+        "timeToFirstToken",
+        "latency_ttft_s",
+        "median_time_to_first_token_seconds",  # ✅ AA v2
+        "median_time_to_first_answer_token",  # AA v2 synonym (seconds)
+    ),
+    # AA v2 pricing fields
+    "price_input_per_1m": (
+        "price_input_per_1m",
+        "input_price_per_1m",
+        "inputPricePer1M",
+        "input_cost_per_million",
+        "pricing.input_price_per_1m",
+        "pricing.inputPricePer1M",
+        "pricing.price_1m_input_tokens",  # ✅ AA v2
+    ),
+    "price_output_per_1m": (
+        "price_output_per_1m",
+        "output_price_per_1m",
+        "outputPricePer1M",
+        "output_cost_per_million",
+        "pricing.output_price_per_1m",
+        "pricing.outputPricePer1M",
+        "pricing.price_1m_output_tokens",  # ✅ AA v2
+    ),
+    # AA v2 sample record did not include context; keep existing keys + nested guesses
+    "context_window": (
+        "context_window",
+        "contextWindow",
+        "context_tokens",
+        "max_context",
+        "maxContext",
+        "context.window",
+        "context.max_tokens",
+        "context.maxTokens",
+    ),
+    "is_open_source": ("is_open_source", "open_source", "openSource"),
+    "license": ("license", "license_type", "licenseType", "licence"),
+}
+
+
+class ExtractionPlan:
+    """
+    FIELD_ALIASES compiled for repeated extraction: dotted paths are split once, and
+    for each distinct record shape (its top-level keys, in order) the aliases that
+    cannot match are dropped once and the surviving candidates cached. Per record,
+    only those candidates are probed, in the original alias order, so results are
+    identical to calling _pick() with the full alias list.
+    """
+
+    def __init__(self, aliases: dict[str, tuple[str, ...]], max_shapes: int = 256) -> None:
+        self._fields = [(field, tuple(tuple(key.split(".")) for key in keys)) for field, keys in aliases.items()]
+        self._max_shapes = max_shapes
+        self._by_shape: dict[tuple[str, ...], list[tuple[str, tuple[tuple[str, ...], ...]]]] = {}
+
+    def _resolve(self, shape: tuple[str, ...]) -> list[tuple[str, tuple[tuple[str, ...], ...]]]:
+        present = set(shape)
+        return [(field, tuple(path for path in paths if path[0] in present)) for field, paths in self._fields]
+
+    def extract(self, record: dict[str, Any]) -> dict[str, Any]:
+        shape = tuple(record)
+        resolved = self._by_shape.get(shape)
+        if resolved is None:
+            resolved = self._resolve(shape)
+            if len(self._by_shape) < self._max_shapes:
+                self._by_shape[shape] = resolved
+
+        values: dict[str, Any] = {}
+        for field, paths in resolved:
+            value = None
+            for path in paths:
+                current: Any = record.get(path[0])
+                for part in path[1:]:
+                    if not isinstance(current, dict):
+                        current = None
+                        break
+                    current = current.get(part)
+                if current is not None:
+                    value = current
+                    break
+            values[field] = value
+        return values
+
 
-    for record in records:
-        model_name = _pick(record, "model_name", "modelName", "name", "model") or "unknown-model"
-
-        # AA v2 uses model_creator.{name,slug}
-        provider = _pick(
-            record,
-            "provider",
-            "provider_name",
-            "providerName",
-            "vendor",
-            "lab",
-            "organization",
-            "developer",
-            "creator.name",
-            "model_creator.name",  # ✅ AA v2
-            "model_creator.slug",  # sometimes useful fallback
-        )
-
-        row = {
-            "snapshot_ts": snapshot_ts,
-            "source": source,
-            "model_name": str(model_name),
-            "provider": str(provider) if provider is not None else None,
-
-            # AA v2 stores indices under evaluations.*
-            "quality_index": _to_float(
-                _pick(
-                    record,
-                    "quality_index",
-                    "intelligence_index",
-                    "intelligenceIndex",
-                    "overall_index",
-                    "overall",
-                    "evaluations.artificial_analysis_intelligence_index",  # ✅ AA v2
-                )
-            ),
-            "coding_index": _to_float(
-                _pick(
-                    record,
-                    "coding_index",
-                    "codingIndex",
-                    "code_index",
-                    "evaluations.artificial_analysis_coding_index",  # ✅ AA v2
-                )
-            ),
-            "math_index": _to_float(
-                _pick(
-                    record,
-                    "math_index",
-                    "mathIndex",
-                    "evaluations.artificial_analysis_math_index",  # ✅ AA v2
-                )
-            ),
-            "reasoning_index": _to_float(
-                _pick(
-                    record,
-                    "reasoning_index",
-                    "reasoningIndex",
-                    "reasoning",
-                )
-            ),
-
-            # AA v2 throughput/latency fields
-            "output_tokens_per_s": _none_if_nonpositive(
-                _to_float(
-                    _pick(
-                        record,
-                        "output_tokens_per_s",
-                        "outputTokensPerSecond",
-                        "tokens_per_second",
-                        "tokensPerSecond",
-                        "throughput",
-                        "performance.output_tokens_per_s",
-                        "median_output_tokens_per_second",  # ✅ AA v2
-                    )
-                )
-            ),
-            "ttft_s": _none_if_nonpositive(
-                _to_float(
-                    _pick(
-                        record,
-                        "ttft_s",
-                        "time_to_first_token",
-                        "timeToFirstToken",
-                        "latency_ttft_s",
-                        "median_time_to_first_token_seconds",  # ✅ AA v2
-                        "median_time_to_first_answer_token",  # AA v2 synonym (seconds)
-                    )
-                )
-            ),
-
-            # AA v2 pricing fields
-            "price_input_per_1m": _none_if_nonpositive(
-                _to_float(
-                    _pick(
-                        record,
-                        "price_input_per_1m",
-                        "input_price_per_1m",
-                        "inputPricePer1M",
-                        "input_cost_per_million",
-                        "pricing.input_price_per_1m",
-                        "pricing.inputPricePer1M",
-                        "pricing.price_1m_input_tokens",  # ✅ AA v2
-                    )
-                )
-            ),
-            "price_output_per_1m": _none_if_nonpositive(
-                _to_float(
-                    _pick(
-                        record,
-                        "price_output_per_1m",
-                        "output_price_per_1m",
-                        "outputPricePer1M",
-                        "output_cost_per_million",
-                        "pricing.output_price_per_1m",
-                        "pricing.outputPricePer1M",
-                        "pricing.price_1m_output_tokens",  # ✅ AA v2
-                    )
-                )
-            ),
-
-            # AA v2 sample record did not include context; keep existing keys + nested guesses
-            "context_window": _to_int(
-                _pick(
-                    record,
-                    "context_window",
-                    "contextWindow",
-                    "context_tokens",
-                    "max_context",
-                    "maxContext",
-                    "context.window",
-                    "context.max_tokens",
-                    "context.maxTokens",
-                )
-            ),
-
-            "is_open_source": _to_bool(_pick(record, "is_open_source", "open_source", "openSource")),
-            "license": _pick(record, "license", "license_type", "licenseType", "licence"),
-        }
-
-        row["canonical_model_key"] = canonical_model_key(row["model_name"], row["provider"])
-        normalized.append(row)
-
-    frame = pd.DataFrame(normalized)
-    if frame.empty:
-        frame = pd.DataFrame(columns=CANONICAL_COLUMNS)
-
-    for col in CANONICAL_COLUMNS:
-        if col not in frame.columns:
-            frame[col] = None
+def _normalize_columns(records: Iterable[dict[str, Any]]) -> dict[str, list[Any]]:
+    """Extract and coerce records straight into per-column lists (no per-row dicts)."""
+    plan = ExtractionPlan(FIELD_ALIASES)
+    columns: dict[str, list[Any]] = {col: [] for col in CANONICAL_COLUMNS if col not in ("snapshot_ts", "source")}
 
+    for record in records:
+        raw = plan.extract(record)
+        model_name = str(raw["model_name"] or "unknown-model")
+        provider = str(raw["provider"]) if raw["provider"] is not None else None
+
+        columns["model_name"].append(model_name)
+        columns["provider"].append(provider)
+        columns["quality_index"].append(_to_float(raw["quality_index"]))
+        columns["coding_index"].append(_to_float(raw["coding_index"]))
+        columns["math_index"].append(_to_float(raw["math_index"]))
+        columns["reasoning_index"].append(_to_float(raw["reasoning_index"]))
+        columns["output_tokens_per_s"].append(_none_if_nonpositive(_to_float(raw["output_tokens_per_s"])))
+        columns["ttft_s"].append(_none_if_nonpositive(_to_float(raw["ttft_s"])))
+        columns["price_input_per_1m"].append(_none_if_nonpositive(_to_float(raw["price_input_per_1m"])))
+        columns["price_output_per_1m"].append(_none_if_nonpositive(_to_float(raw["price_output_per_1m"])))
+        columns["context_window"].append(_to_int(raw["context_window"]))
+        columns["is_open_source"].append(_to_bool(raw["is_open_source"]))
+        columns["license"].append(str(raw["license"]) if raw["license"] is not None else None)
+        columns["canonical_model_key"].append(canonical_model_key(model_name, provider))
+
+    return columns
+
+
+def normalize_records(records: Iterable[dict[str, Any]], source: str, snapshot_ts: str) -> pd.DataFrame:
+    columns = _normalize_columns(records)
+    n_rows = len(columns["model_name"])
+    if n_rows == 0:
+        return pd.DataFrame(columns=CANONICAL_COLUMNS)
+
+    frame = pd.DataFrame({"snapshot_ts": [snapshot_ts] * n_rows, "source": [source] * n_rows, **columns})
     return frame[CANONICAL_COLUMNS]
+
+
+def _snapshot_datetime(snapshot_ts: str) -> datetime:
+    """ISO snapshot timestamp as naive UTC, matching bronze_models.snapshot_ts (TIMESTAMP)."""
+    parsed = datetime.fromisoformat(snapshot_ts)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def normalize_records_arrow(records: Iterable[dict[str, Any]], source: str, snapshot_ts: str) -> pa.Table:
+    """
+    Columnar variant of normalize_records(): builds one typed Arrow array per column
+    with the bronze_models types (TIMESTAMP, DOUBLE, BIGINT, BOOLEAN, VARCHAR), so the
+    snapshot can be written to Parquet and loaded into DuckDB without pandas.
+    """
+    columns = _normalize_columns(records)
+    n_rows = len(columns["model_name"])
+    arrays = [
+        pa.array([_snapshot_datetime(snapshot_ts)] * n_rows, type=ARROW_SCHEMA.field("snapshot_ts").type),
+        pa.array([source] * n_rows, type=pa.string()),
+    ]
+    arrays.extend(pa.array(columns[col], type=ARROW_SCHEMA.field(col).type) for col in CANONICAL_COLUMNS[2:])
+    return pa.Table.from_arrays(arrays, schema=ARROW_SCHEMA)
@@ -1,77 +1,895 @@
 from __future__ import annotations
 
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
+from typing import Any, Callable, Iterator
 
 import duckdb
+import pyarrow as pa
 
+try:
+    import fcntl
+except ImportError:  # not available on Windows: no cross-process writer signal
+    fcntl = None
 
-def connect(db_path: str | Path = "data/warehouse.duckdb") -> duckdb.DuckDBPyConnection:
+DEFAULT_DB_PATH = "data/warehouse.duckdb"
+
+
+# How long connect() waits for another process to release the database file.
+LOCK_TIMEOUT_S = 30.0
+# How often a ConnectionManager checks whether another process is writing.
+WRITER_POLL_S = 0.05
+
+
+def _is_lock_conflict(exc: duckdb.Error) -> bool:
+    return isinstance(exc, duckdb.IOException) and "lock" in str(exc).lower()
+
+
+def connect(
+    db_path: str | Path = DEFAULT_DB_PATH,
+    *,
+    read_only: bool = False,
+    lock_timeout_s: float = LOCK_TIMEOUT_S,
+) -> duckdb.DuckDBPyConnection:
+    """
+    Open the warehouse. DuckDB lets one process write a database file (or several
+    processes read it), so while another process holds the file this retries with
+    backoff for up to `lock_timeout_s` before raising.
+    """
     Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-    con = duckdb.connect(str(db_path))
-    return con
-
-
-def init_warehouse(con: duckdb.DuckDBPyConnection) -> None:
-    con.execute(
-        """
-        CREATE TABLE IF NOT EXISTS bronze_models (
-            snapshot_ts TIMESTAMP,
-            source VARCHAR,
-            model_name VARCHAR,
-            provider VARCHAR,
-            quality_index DOUBLE,
-            coding_index DOUBLE,
-            math_index DOUBLE,
-            reasoning_index DOUBLE,
-            output_tokens_per_s DOUBLE,
-            ttft_s DOUBLE,
-            price_input_per_1m DOUBLE,
-            price_output_per_1m DOUBLE,
-            context_window BIGINT,
-            is_open_source BOOLEAN,
-            license VARCHAR,
-            canonical_model_key VARCHAR
-        );
-        """
+    deadline = time.monotonic() + lock_timeout_s
+    delay_s = 0.01
+    while True:
+        try:
+            return duckdb.connect(str(db_path), read_only=read_only)
+        except duckdb.Error as exc:
+            remaining = deadline - time.monotonic()
+            if not _is_lock_conflict(exc) or remaining <= 0:
+                raise
+            time.sleep(min(delay_s, remaining))
+            delay_s = min(delay_s * 2, 0.25)
+
+
+class ConnectionManager:
+    """
+    Shares one DuckDB database instance between the threads of a process and keeps it
+    open for the process's lifetime, releasing the file only while a writer needs it.
+
+    Reads open the file read-only, which lets several processes (more app workers)
+    read at once. A write in this process waits for the current readers, reopens the
+    file read-write and closes it again when done, so the next read reopens it
+    read-only. Writers in other processes (`python -m src.ingest`, a cron ingest,
+    `python -m src.compact`) hold the ingest lock file next to the database
+    (`lock_path`, data/ingest.lock) while they write; a single watcher thread polls it
+    every `poll_s` and, while it is held, closes the file whenever no reader is using
+    it. Each thread reuses its own cursor while the same database instance stays open;
+    writes go through a single writer cursor guarded by a lock. Without fcntl
+    (Windows) there is no watcher and writers in other processes wait for close().
+    """
+
+    def __init__(
+        self, db_path: str | Path = DEFAULT_DB_PATH, lock_path: str | Path | None = None, poll_s: float = WRITER_POLL_S
+    ) -> None:
+        self.db_path = Path(db_path)
+        self.lock_path = Path(lock_path) if lock_path is not None else self.db_path.with_name("ingest.lock")
+        self.poll_s = poll_s
+        self._con: duckdb.DuckDBPyConnection | None = None
+        self._read_only = False
+        self._generation = 0
+        self._users = 0
+        self._writers_waiting = 0
+        self._opened = False
+        self._writer_elsewhere = False
+        self._watcher: threading.Thread | None = None
+        self._stop_watching = threading.Event()
+        self._local = threading.local()
+        self._cursors: list[duckdb.DuckDBPyConnection] = []
+        self._writer: duckdb.DuckDBPyConnection | None = None
+        self._state = threading.Condition()
+        self._write_lock = threading.Lock()
+
+    def open(self) -> None:
+        """Apply pending migrations and start handing out connections (idempotent)."""
+        with self._state:
+            if self._opened:
+                return
+            self._opened = True
+        with self._lease(write=True):
+            init_warehouse(self._con)
+        if fcntl is not None:
+            self._stop_watching.clear()
+            self._watcher = threading.Thread(target=self._watch_writers, name="warehouse-writer-watch", daemon=True)
+            self._watcher.start()
+
+    def close(self) -> None:
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+        with self._state:
+            self._opened = False
+            self._close_connection()
+            self._state.notify_all()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened
+
+    @property
+    def holds_database(self) -> bool:
+        """Whether the database file is currently open by this manager."""
+        return self._con is not None
+
+    def _close_connection(self) -> None:
+        for cursor in self._cursors:
+            cursor.close()
+        self._cursors.clear()
+        self._writer = None
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+    def _watch_writers(self) -> None:
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "a+", encoding="utf-8") as handle:
+            while not self._stop_watching.wait(self.poll_s):
+                try:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    held = True
+                else:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+                    held = False
+                with self._state:
+                    self._writer_elsewhere = held
+                    if held and self._users == 0:
+                        self._close_connection()
+
+    @contextmanager
+    def _lease(self, *, write: bool) -> Iterator[int]:
+        """Keep the database open (read-write when `write`) for the body; yields its generation."""
+        with self._state:
+            if write:
+                self._writers_waiting += 1
+            try:
+                while True:
+                    if not self._opened:
+                        raise RuntimeError("ConnectionManager is not open")
+                    if self._con is not None and not (self._read_only and (write or self._writers_waiting)):
+                        break
+                    if self._con is not None and self._users > 0:
+                        self._state.wait()  # read-only instance still in use; a writer is next
+                        continue
+                    self._close_connection()
+                    read_only = not write and not self._writers_waiting
+                    self._con = connect(self.db_path, read_only=read_only)
+                    self._read_only = read_only
+                    self._generation += 1
+                    self._state.notify_all()
+                    break
+            finally:
+                if write:
+                    self._writers_waiting -= 1
+            self._users += 1
+            generation = self._generation
+        try:
+            yield generation
+        finally:
+            with self._state:
+                self._users -= 1
+                if self._users == 0 and self._con is not None:
+                    self._state.notify_all()
+                    if not self._read_only or self._writer_elsewhere:
+                        self._close_connection()
+
+    def _new_cursor(self) -> duckdb.DuckDBPyConnection:
+        with self._state:
+            cursor = self._con.cursor()
+            self._cursors.append(cursor)
+            return cursor
+
+    @contextmanager
+    def reader(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Cursor owned by the calling thread, valid for the body. Callers must not close it."""
+        with self._lease(write=False) as generation:
+            cached = getattr(self._local, "cursor", None)
+            if cached is None or cached[0] != generation:
+                cached = (generation, self._new_cursor())
+                self._local.cursor = cached
+            yield cached[1]
+
+    @contextmanager
+    def writer(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        with self._write_lock, self._lease(write=True):
+            if self._writer is None:
+                self._writer = self._new_cursor()
+            yield self._writer
+
+
+_ACTIVE_MANAGER: ConnectionManager | None = None
+
+
+def open_warehouse(db_path: str | Path = DEFAULT_DB_PATH) -> ConnectionManager:
+    """Open the process-wide ConnectionManager (idempotent)."""
+    global _ACTIVE_MANAGER
+    if _ACTIVE_MANAGER is None:
+        manager = ConnectionManager(db_path)
+        manager.open()
+        _ACTIVE_MANAGER = manager
+    return _ACTIVE_MANAGER
+
+
+def close_warehouse() -> None:
+    global _ACTIVE_MANAGER
+    if _ACTIVE_MANAGER is not None:
+        _ACTIVE_MANAGER.close()
+        _ACTIVE_MANAGER = None
+
+
+def active_manager() -> ConnectionManager | None:
+    return _ACTIVE_MANAGER
+
+
+@contextmanager
+def write_connection(db_path: str | Path = DEFAULT_DB_PATH) -> Iterator[duckdb.DuckDBPyConnection]:
+    """
+    Writer connection for ingest: the shared writer cursor when a ConnectionManager is
+    open, otherwise a short-lived connection (CLI / cron path). Either way the file is
+    released again once the write is done.
+    """
+    manager = _ACTIVE_MANAGER
+    if manager is not None:
+        with manager.writer() as cursor:
+            yield cursor
+        return
+
+    con = connect(db_path)
+    try:
+        init_warehouse(con)
+        yield con
+    finally:
+        con.close()
+
+
+_BRONZE_MODELS_DDL = """
+CREATE TABLE IF NOT EXISTS bronze_models (
+    snapshot_ts TIMESTAMP,
+    source VARCHAR,
+    model_name VARCHAR,
+    provider VARCHAR,
+    quality_index DOUBLE,
+    coding_index DOUBLE,
+    math_index DOUBLE,
+    reasoning_index DOUBLE,
+    output_tokens_per_s DOUBLE,
+    ttft_s DOUBLE,
+    price_input_per_1m DOUBLE,
+    price_output_per_1m DOUBLE,
+    context_window BIGINT,
+    is_open_source BOOLEAN,
+    license VARCHAR,
+    canonical_model_key VARCHAR
+);
+"""
+
+_SILVER_MODELS_DDL = """
+CREATE OR REPLACE VIEW silver_models AS
+SELECT
+    snapshot_ts,
+    source,
+    model_name,
+    provider,
+    CAST(quality_index AS DOUBLE) AS quality_index,
+    CAST(coding_index AS DOUBLE) AS coding_index,
+    CAST(math_index AS DOUBLE) AS math_index,
+    CAST(reasoning_index AS DOUBLE) AS reasoning_index,
+    CAST(output_tokens_per_s AS DOUBLE) AS output_tokens_per_s,
+    CAST(ttft_s AS DOUBLE) AS ttft_s,
+    CAST(price_input_per_1m AS DOUBLE) AS price_input_per_1m,
+    CAST(price_output_per_1m AS DOUBLE) AS price_output_per_1m,
+    CAST(context_window AS BIGINT) AS context_window,
+    CAST(is_open_source AS BOOLEAN) AS is_open_source,
+    license,
+    canonical_model_key
+FROM bronze_models;
+"""
+
+_MODELS_HISTORY_DDL = "CREATE OR REPLACE VIEW models_history AS SELECT * FROM silver_models;"
+
+_MODELS_LATEST_VIEW_DDL = """
+CREATE OR REPLACE VIEW models_latest AS
+SELECT s.*
+FROM silver_models s
+INNER JOIN (
+    SELECT canonical_model_key, MAX(snapshot_ts) AS max_snapshot_ts
+    FROM silver_models
+    GROUP BY canonical_model_key
+) latest
+ON s.canonical_model_key = latest.canonical_model_key
+AND s.snapshot_ts = latest.max_snapshot_ts;
+"""
+
+_LATEST_COLUMNS = [
+    "snapshot_ts",
+    "source",
+    "model_name",
+    "provider",
+    "quality_index",
+    "coding_index",
+    "math_index",
+    "reasoning_index",
+    "output_tokens_per_s",
+    "ttft_s",
+    "price_input_per_1m",
+    "price_output_per_1m",
+    "context_window",
+    "is_open_source",
+    "license",
+]
+
+_MODELS_LATEST_TABLE_DDL = """
+CREATE TABLE models_latest (
+    snapshot_ts TIMESTAMP,
+    source VARCHAR,
+    model_name VARCHAR,
+    provider VARCHAR,
+    quality_index DOUBLE,
+    coding_index DOUBLE,
+    math_index DOUBLE,
+    reasoning_index DOUBLE,
+    output_tokens_per_s DOUBLE,
+    ttft_s DOUBLE,
+    price_input_per_1m DOUBLE,
+    price_output_per_1m DOUBLE,
+    context_window BIGINT,
+    is_open_source BOOLEAN,
+    license VARCHAR,
+    canonical_model_key VARCHAR PRIMARY KEY
+);
+"""
+
+# Latest row per key within a relation; when several sources publish a key in the
+# same snapshot the greatest source name wins, so the choice does not depend on the
+# order in which sources are loaded.
+_LATEST_PER_KEY_SQL = """
+SELECT *
+FROM {relation}
+WHERE canonical_model_key IS NOT NULL
+QUALIFY row_number() OVER (
+    PARTITION BY canonical_model_key ORDER BY snapshot_ts DESC, coalesce(source, '') DESC
+) = 1
+"""
+
+# Latest row per (source, key) within a relation.
+_LATEST_PER_SOURCE_KEY_SQL = """
+SELECT *
+FROM {relation}
+WHERE canonical_model_key IS NOT NULL
+QUALIFY row_number() OVER (PARTITION BY source, canonical_model_key ORDER BY snapshot_ts DESC) = 1
+"""
+
+_UPSERT_MODELS_LATEST_SQL = (
+    "INSERT INTO models_latest "
+    + _LATEST_PER_KEY_SQL
+    + " ON CONFLICT (canonical_model_key) DO UPDATE SET "
+    + ", ".join(f"{col} = excluded.{col}" for col in _LATEST_COLUMNS)
+    + " WHERE excluded.snapshot_ts > models_latest.snapshot_ts OR (excluded.snapshot_ts = models_latest.snapshot_ts"
+    + " AND coalesce(excluded.source, '') >= coalesce(models_latest.source, ''))"
+)
+
+_CONTENT_COLUMNS = [col for col in _LATEST_COLUMNS if col != "snapshot_ts"]
+
+
+def _content_hash(alias: str) -> str:
+    return "hash(" + ", ".join(f"{alias}.{col}" for col in _CONTENT_COLUMNS) + ")"
+
+
+# Rows of {relation} (one per source and key) whose content differs from the newest
+# bronze row of the same source and key. Several sources can publish the same key, so
+# rows are compared within their source rather than against models_latest.
+_CHANGED_ROWS_SQL = (
+    "SELECT i.* FROM ("
+    + _LATEST_PER_SOURCE_KEY_SQL
+    + ") i LEFT JOIN ("
+    + _LATEST_PER_SOURCE_KEY_SQL.format(relation="bronze_models")
+    + ") l ON l.canonical_model_key = i.canonical_model_key AND l.source IS NOT DISTINCT FROM i.source "
+    + f"WHERE l.canonical_model_key IS NULL OR {_content_hash('i')} <> {_content_hash('l')}"
+)
+
+_SNAPSHOT_MANIFEST_DDL = """
+CREATE TABLE IF NOT EXISTS snapshot_manifest (
+    snapshot_ts TIMESTAMP,
+    source VARCHAR,
+    canonical_model_key VARCHAR
+);
+"""
+
+_BACKFILL_MANIFEST_SQL = """
+INSERT INTO snapshot_manifest
+SELECT DISTINCT b.snapshot_ts, b.source, b.canonical_model_key
+FROM bronze_models b
+WHERE b.canonical_model_key IS NOT NULL
+AND NOT EXISTS (
+    SELECT 1 FROM snapshot_manifest m
+    WHERE m.snapshot_ts = b.snapshot_ts
+    AND m.canonical_model_key = b.canonical_model_key
+    AND m.source IS NOT DISTINCT FROM b.source
+);
+"""
+
+# Every model of every snapshot: manifest entries resolved to the row in effect at
+# that snapshot (bronze only stores rows whose content changed).
+_MODELS_HISTORY_MANIFEST_DDL = """
+CREATE OR REPLACE VIEW models_history AS
+SELECT m.snapshot_ts, s.* EXCLUDE (snapshot_ts)
+FROM snapshot_manifest m
+ASOF JOIN silver_models s
+ON m.canonical_model_key = s.canonical_model_key
+AND coalesce(m.source, '') = coalesce(s.source, '')
+AND m.snapshot_ts >= s.snapshot_ts;
+"""
+
+# Numeric columns summarized per snapshot in snapshot_stats.
+STATS_COLUMNS = [
+    "quality_index",
+    "coding_index",
+    "math_index",
+    "reasoning_index",
+    "output_tokens_per_s",
+    "ttft_s",
+    "price_input_per_1m",
+    "price_output_per_1m",
+    "context_window",
+]
+
+_SNAPSHOT_STATS_DDL = """
+CREATE TABLE IF NOT EXISTS snapshot_stats (
+    snapshot_ts TIMESTAMP,
+    column_name VARCHAR,
+    row_count BIGINT,
+    null_count BIGINT,
+    min_value DOUBLE,
+    max_value DOUBLE,
+    p05 DOUBLE,
+    p25 DOUBLE,
+    median DOUBLE,
+    p75 DOUBLE,
+    p95 DOUBLE,
+    PRIMARY KEY (snapshot_ts, column_name)
+);
+"""
+
+
+def _column_stats_sql(col: str) -> str:
+    value = f"CAST({col} AS DOUBLE)"
+    quantiles = ", ".join(
+        f"quantile_cont({value}, {q}) AS {name}"
+        for name, q in (("p05", 0.05), ("p25", 0.25), ("median", 0.5), ("p75", 0.75), ("p95", 0.95))
+    )
+    return (
+        f"SELECT '{col}' AS column_name, count(*) AS row_count, count(*) - count({col}) AS null_count, "
+        f"min({value}) AS min_value, max({value}) AS max_value, {quantiles} FROM models_latest"
     )
 
-    con.execute(
-        """
-        CREATE OR REPLACE VIEW silver_models AS
+
+# Stats of models_latest (the population the recommender scores), keyed by its newest snapshot_ts.
+_REFRESH_SNAPSHOT_STATS_SQL = (
+    "INSERT OR REPLACE INTO snapshot_stats "
+    "SELECT (SELECT max(snapshot_ts) FROM models_latest) AS snapshot_ts, * FROM ("
+    + " UNION ALL ".join(_column_stats_sql(col) for col in STATS_COLUMNS)
+    + ") WHERE (SELECT max(snapshot_ts) FROM models_latest) IS NOT NULL"
+)
+
+# SCD2 history: one row per version of a model's content. valid_to is NULL for the
+# current version; a version ends when its content changes or its key is missing from
+# a later snapshot of its source. Rows arrive in valid_from order, so DuckDB's
+# min/max zone maps prune point-in-time range scans.
+_MODELS_SCD_DDL = """
+CREATE TABLE IF NOT EXISTS models_scd (
+    canonical_model_key VARCHAR,
+    valid_from TIMESTAMP,
+    valid_to TIMESTAMP,
+    source VARCHAR,
+    model_name VARCHAR,
+    provider VARCHAR,
+    quality_index DOUBLE,
+    coding_index DOUBLE,
+    math_index DOUBLE,
+    reasoning_index DOUBLE,
+    output_tokens_per_s DOUBLE,
+    ttft_s DOUBLE,
+    price_input_per_1m DOUBLE,
+    price_output_per_1m DOUBLE,
+    context_window BIGINT,
+    is_open_source BOOLEAN,
+    license VARCHAR,
+    UNIQUE (source, canonical_model_key, valid_from)
+);
+"""
+
+_SCD_COLUMNS = ", ".join(_CONTENT_COLUMNS)
+
+# Versions from models_history (every snapshot's members): a version is a run of a
+# (source, key)'s consecutive snapshots of that source with equal content, valid until
+# the next snapshot of the source after the run (NULL if there is none yet).
+_BACKFILL_MODELS_SCD_SQL = f"""
+INSERT INTO models_scd
+WITH source_snapshots AS (
+    SELECT
+        source,
+        snapshot_ts,
+        row_number() OVER (PARTITION BY source ORDER BY snapshot_ts) AS seq,
+        lead(snapshot_ts) OVER (PARTITION BY source ORDER BY snapshot_ts) AS next_ts
+    FROM (SELECT DISTINCT source, snapshot_ts FROM snapshot_manifest)
+),
+members AS (
+    SELECT h.*, ss.seq, ss.next_ts, {_content_hash("h")} AS content_hash
+    FROM models_history h
+    JOIN source_snapshots ss ON ss.source IS NOT DISTINCT FROM h.source AND ss.snapshot_ts = h.snapshot_ts
+    WHERE h.canonical_model_key IS NOT NULL
+    QUALIFY row_number() OVER (PARTITION BY h.source, h.canonical_model_key, h.snapshot_ts) = 1
+),
+runs AS (
+    SELECT
+        *,
+        sum(starts_run) OVER (PARTITION BY source, canonical_model_key ORDER BY snapshot_ts) AS run
+    FROM (
         SELECT
-            snapshot_ts,
-            source,
-            model_name,
-            provider,
-            CAST(quality_index AS DOUBLE) AS quality_index,
-            CAST(coding_index AS DOUBLE) AS coding_index,
-            CAST(math_index AS DOUBLE) AS math_index,
-            CAST(reasoning_index AS DOUBLE) AS reasoning_index,
-            CAST(output_tokens_per_s AS DOUBLE) AS output_tokens_per_s,
-            CAST(ttft_s AS DOUBLE) AS ttft_s,
-            CAST(price_input_per_1m AS DOUBLE) AS price_input_per_1m,
-            CAST(price_output_per_1m AS DOUBLE) AS price_output_per_1m,
-            CAST(context_window AS BIGINT) AS context_window,
-            CAST(is_open_source AS BOOLEAN) AS is_open_source,
-            license,
-            canonical_model_key
-        FROM bronze_models;
-        """
+            *,
+            CASE
+                WHEN content_hash = lag(content_hash) OVER w AND seq = lag(seq) OVER w + 1 THEN 0
+                ELSE 1
+            END AS starts_run
+        FROM members
+        WINDOW w AS (PARTITION BY source, canonical_model_key ORDER BY snapshot_ts)
     )
+)
+SELECT
+    canonical_model_key,
+    min(snapshot_ts) AS valid_from,
+    max(CASE WHEN is_last THEN next_ts END) AS valid_to,
+    {", ".join(f"any_value({col})" for col in _CONTENT_COLUMNS)}
+FROM (
+    SELECT *, snapshot_ts = max(snapshot_ts) OVER (PARTITION BY source, canonical_model_key, run) AS is_last
+    FROM runs
+)
+GROUP BY source, canonical_model_key, run
+ORDER BY valid_from, canonical_model_key, source;
+"""
+
+# Point-in-time lookup: SELECT * FROM models_as_of(TIMESTAMP '2025-01-01 12:00:00').
+_MODELS_AS_OF_MACRO_DDL = """
+CREATE OR REPLACE MACRO models_as_of(ts) AS TABLE
+SELECT * FROM models_scd
+WHERE valid_from <= ts AND (valid_to IS NULL OR valid_to > ts);
+"""
+
+# Incremental maintenance from the latest rows per source and key of a snapshot
+# ({relation}). Only snapshots newer than a (source, key)'s open version touch it.
+_CLOSE_CHANGED_VERSIONS_SQL = (
+    "UPDATE models_scd SET valid_to = i.snapshot_ts FROM ("
+    + _LATEST_PER_SOURCE_KEY_SQL
+    + ") i WHERE models_scd.canonical_model_key = i.canonical_model_key "
+    + "AND models_scd.source IS NOT DISTINCT FROM i.source AND models_scd.valid_to IS NULL "
+    + f"AND i.snapshot_ts > models_scd.valid_from AND {_content_hash('models_scd')} <> {_content_hash('i')}"
+)
+
+_CLOSE_MISSING_VERSIONS_SQL = """
+UPDATE models_scd SET valid_to = snap.snapshot_ts
+FROM (SELECT source, max(snapshot_ts) AS snapshot_ts FROM {relation} GROUP BY source) snap
+WHERE models_scd.valid_to IS NULL AND models_scd.source IS NOT DISTINCT FROM snap.source
+AND models_scd.valid_from < snap.snapshot_ts
+AND NOT EXISTS (
+    SELECT 1 FROM {relation} r
+    WHERE r.canonical_model_key = models_scd.canonical_model_key AND r.source IS NOT DISTINCT FROM snap.source
+)
+"""
+
+_OPEN_NEW_VERSIONS_SQL = (
+    f"INSERT INTO models_scd SELECT canonical_model_key, snapshot_ts, NULL, {_SCD_COLUMNS} FROM ("
+    + _LATEST_PER_SOURCE_KEY_SQL
+    + ") i WHERE NOT EXISTS (SELECT 1 FROM models_scd s "
+    + "WHERE s.canonical_model_key = i.canonical_model_key AND s.source IS NOT DISTINCT FROM i.source "
+    + "AND (s.valid_to IS NULL OR s.valid_from >= i.snapshot_ts)) "
+    + "ORDER BY canonical_model_key, source"
+)
+
+# Statements of released migrations as they first shipped, since superseded above.
+# Kept verbatim so a fresh database runs the same SQL for each version as one that
+# was upgraded through it; the corrections are applied by later versions.
+_V2_LATEST_PER_KEY_SQL = """
+SELECT *
+FROM {relation}
+WHERE canonical_model_key IS NOT NULL
+QUALIFY row_number() OVER (PARTITION BY canonical_model_key ORDER BY snapshot_ts DESC) = 1
+"""
 
-    con.execute("CREATE OR REPLACE VIEW models_history AS SELECT * FROM silver_models;")
-
-    con.execute(
-        """
-        CREATE OR REPLACE VIEW models_latest AS
-        SELECT s.*
-        FROM silver_models s
-        INNER JOIN (
-            SELECT canonical_model_key, MAX(snapshot_ts) AS max_snapshot_ts
-            FROM silver_models
-            GROUP BY canonical_model_key
-        ) latest
-        ON s.canonical_model_key = latest.canonical_model_key
-        AND s.snapshot_ts = latest.max_snapshot_ts;
-        """
+_V3_BACKFILL_MANIFEST_SQL = """
+INSERT INTO snapshot_manifest
+SELECT DISTINCT b.snapshot_ts, b.source, b.canonical_model_key
+FROM bronze_models b
+WHERE b.canonical_model_key IS NOT NULL
+AND NOT EXISTS (
+    SELECT 1 FROM snapshot_manifest m
+    WHERE m.snapshot_ts = b.snapshot_ts AND m.canonical_model_key = b.canonical_model_key
+);
+"""
+
+_V3_MODELS_HISTORY_MANIFEST_DDL = """
+CREATE OR REPLACE VIEW models_history AS
+SELECT m.snapshot_ts, s.* EXCLUDE (snapshot_ts)
+FROM snapshot_manifest m
+ASOF JOIN silver_models s
+ON m.canonical_model_key = s.canonical_model_key AND m.snapshot_ts >= s.snapshot_ts;
+"""
+
+_V5_MODELS_SCD_DDL = """
+CREATE TABLE IF NOT EXISTS models_scd (
+    canonical_model_key VARCHAR,
+    valid_from TIMESTAMP,
+    valid_to TIMESTAMP,
+    source VARCHAR,
+    model_name VARCHAR,
+    provider VARCHAR,
+    quality_index DOUBLE,
+    coding_index DOUBLE,
+    math_index DOUBLE,
+    reasoning_index DOUBLE,
+    output_tokens_per_s DOUBLE,
+    ttft_s DOUBLE,
+    price_input_per_1m DOUBLE,
+    price_output_per_1m DOUBLE,
+    context_window BIGINT,
+    is_open_source BOOLEAN,
+    license VARCHAR,
+    PRIMARY KEY (canonical_model_key, valid_from)
+);
+"""
+
+_V5_BACKFILL_MODELS_SCD_SQL = f"""
+INSERT INTO models_scd
+WITH source_snapshots AS (
+    SELECT
+        source,
+        snapshot_ts,
+        row_number() OVER (PARTITION BY source ORDER BY snapshot_ts) AS seq,
+        lead(snapshot_ts) OVER (PARTITION BY source ORDER BY snapshot_ts) AS next_ts
+    FROM (SELECT DISTINCT source, snapshot_ts FROM snapshot_manifest)
+),
+members AS (
+    SELECT h.*, ss.seq, ss.next_ts, {_content_hash("h")} AS content_hash
+    FROM models_history h
+    JOIN source_snapshots ss ON ss.source IS NOT DISTINCT FROM h.source AND ss.snapshot_ts = h.snapshot_ts
+    WHERE h.canonical_model_key IS NOT NULL
+    QUALIFY row_number() OVER (PARTITION BY h.canonical_model_key, h.snapshot_ts) = 1
+),
+runs AS (
+    SELECT
+        *,
+        sum(starts_run) OVER (PARTITION BY canonical_model_key ORDER BY snapshot_ts) AS run
+    FROM (
+        SELECT
+            *,
+            CASE
+                WHEN content_hash = lag(content_hash) OVER w AND seq = lag(seq) OVER w + 1 THEN 0
+                ELSE 1
+            END AS starts_run
+        FROM members
+        WINDOW w AS (PARTITION BY canonical_model_key ORDER BY snapshot_ts)
     )
+)
+SELECT
+    canonical_model_key,
+    min(snapshot_ts) AS valid_from,
+    max(CASE WHEN is_last THEN next_ts END) AS valid_to,
+    {", ".join(f"any_value({col})" for col in _CONTENT_COLUMNS)}
+FROM (
+    SELECT *, snapshot_ts = max(snapshot_ts) OVER (PARTITION BY canonical_model_key, run) AS is_last FROM runs
+)
+GROUP BY canonical_model_key, run
+ORDER BY valid_from, canonical_model_key;
+"""
+
+# Ordered (version, statements). Append new versions; never edit an applied one.
+MIGRATIONS: list[tuple[int, list[str]]] = [
+    (1, [_BRONZE_MODELS_DDL, _SILVER_MODELS_DDL, _MODELS_HISTORY_DDL, _MODELS_LATEST_VIEW_DDL]),
+    # models_latest becomes a physical table upserted at ingest time.
+    (
+        2,
+        [
+            "DROP VIEW IF EXISTS models_latest;",
+            _MODELS_LATEST_TABLE_DDL,
+            "INSERT INTO models_latest " + _V2_LATEST_PER_KEY_SQL.format(relation="silver_models"),
+        ],
+    ),
+    # bronze_models keeps only changed rows; snapshot_manifest records snapshot membership.
+    (3, [_SNAPSHOT_MANIFEST_DDL, _V3_BACKFILL_MANIFEST_SQL, _V3_MODELS_HISTORY_MANIFEST_DDL]),
+    # Per-snapshot column statistics for snapshot-level normalization.
+    (4, [_SNAPSHOT_STATS_DDL, _REFRESH_SNAPSHOT_STATS_SQL]),
+    # SCD2 validity intervals per model, backfilled from the existing history.
+    (5, [_V5_MODELS_SCD_DDL, _V5_BACKFILL_MODELS_SCD_SQL, _MODELS_AS_OF_MACRO_DDL]),
+    # Sources sharing a key are kept apart: models_history resolves manifest entries
+    # within their own source, the manifest backfill matches on source, and
+    # models_latest is recomputed with the source tie-break.
+    (
+        6,
+        [
+            _MODELS_HISTORY_MANIFEST_DDL,
+            _BACKFILL_MANIFEST_SQL,
+            "DELETE FROM models_latest;",
+            "INSERT INTO models_latest " + _LATEST_PER_KEY_SQL.format(relation="models_history"),
+        ],
+    ),
+    # models_scd versions are kept per (source, canonical_model_key); rebuilt from history.
+    (7, ["DROP TABLE models_scd;", _MODELS_SCD_DDL, _BACKFILL_MODELS_SCD_SQL, _MODELS_AS_OF_MACRO_DDL]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_schema_version(con: duckdb.DuckDBPyConnection) -> int:
+    """Highest applied migration version, or 0 for an uninitialized database."""
+    try:
+        row = con.execute("SELECT max(version) FROM schema_version").fetchone()
+    except duckdb.CatalogException:
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS schema_version "
+            "(version INTEGER PRIMARY KEY, applied_at TIMESTAMP DEFAULT current_timestamp);"
+        )
+        return 0
+    return int(row[0]) if row and row[0] is not None else 0
+
+
+def init_warehouse(con: duckdb.DuckDBPyConnection) -> list[int]:
+    """
+    Apply pending migrations, each in its own transaction. Cheap when the database is
+    already at SCHEMA_VERSION (one version lookup, no DDL). Returns the versions applied.
+    """
+    current = current_schema_version(con)
+    applied: list[int] = []
+    for version, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        con.execute("BEGIN TRANSACTION")
+        try:
+            for statement in statements:
+                con.execute(statement)
+            con.execute("INSERT INTO schema_version (version) VALUES (?)", [version])
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        applied.append(version)
+    return applied
+
+
+def latest_snapshot_stats(con: duckdb.DuckDBPyConnection) -> dict[str, dict[str, float | None]]:
+    """snapshot_stats rows of the newest snapshot, by column name ({} if there are none)."""
+    cursor = con.execute(
+        "SELECT * EXCLUDE (snapshot_ts) FROM snapshot_stats "
+        "WHERE snapshot_ts = (SELECT max(snapshot_ts) FROM snapshot_stats)"
+    )
+    names = [d[0] for d in cursor.description]
+    return {row[0]: dict(zip(names[1:], row[1:])) for row in cursor.fetchall()}
+
+
+def _update_models_scd(con: duckdb.DuckDBPyConnection, relation: str) -> None:
+    for statement in (_CLOSE_CHANGED_VERSIONS_SQL, _CLOSE_MISSING_VERSIONS_SQL, _OPEN_NEW_VERSIONS_SQL):
+        con.execute(statement.format(relation=relation))
+
+
+def models_as_of(con: duckdb.DuckDBPyConnection, ts: str | datetime) -> pa.Table:
+    """Every model version valid at `ts` (one row per source and canonical_model_key), from models_scd."""
+    return con.execute(
+        "SELECT * FROM models_as_of(CAST(? AS TIMESTAMP)) ORDER BY canonical_model_key, source", [ts]
+    ).to_arrow_table()
+
+
+def append_snapshot(
+    con: duckdb.DuckDBPyConnection,
+    relation: str,
+    on_changes: Callable[[pa.Table], Future[Any]] | None = None,
+) -> int:
+    """
+    Add the snapshot in `relation` (a table or view with the bronze_models columns) to
+    the warehouse in one transaction:
+
+    - bronze_models gets only rows whose content changed since the newest bronze row
+      of the same source and key,
+    - snapshot_manifest records every key present in the snapshot,
+    - models_latest is upserted; older rows never overwrite newer ones,
+    - models_scd closes versions whose content changed or whose key is missing from
+      the snapshot of its source, and opens versions for new or changed keys,
+    - snapshot_stats gets the column statistics of the upserted models_latest.
+
+    on_changes(changed_rows) is called once the changed rows are known and may start
+    work on them (e.g. writing them to Parquet) while the rest of the transaction runs;
+    the snapshot is committed only if the Future it returns succeeds.
+
+    Returns the number of changed rows appended to bronze_models.
+    """
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute("CREATE OR REPLACE TEMP TABLE snapshot_changes AS " + _CHANGED_ROWS_SQL.format(relation=relation))
+        pending = None
+        if on_changes is not None:
+            pending = on_changes(con.execute("SELECT * FROM snapshot_changes").to_arrow_table())
+        con.execute("INSERT INTO bronze_models SELECT * FROM snapshot_changes")
+        con.execute(
+            "INSERT INTO snapshot_manifest SELECT snapshot_ts, source, canonical_model_key FROM ("
+            + _LATEST_PER_SOURCE_KEY_SQL.format(relation=relation)
+            + ")"
+        )
+        con.execute(_UPSERT_MODELS_LATEST_SQL.format(relation=relation))
+        _update_models_scd(con, relation)
+        con.execute(_REFRESH_SNAPSHOT_STATS_SQL)
+        changed = con.execute("SELECT COUNT(*) FROM snapshot_changes").fetchone()[0]
+        con.execute("DROP TABLE snapshot_changes")
+        if pending is not None:
+            pending.result()
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return int(changed)
+
+
+def confirm_snapshot(con: duckdb.DuckDBPyConnection, source: str, snapshot_ts: str) -> int:
+    """
+    Record that `source` is unchanged at `snapshot_ts` (e.g. the upstream answered
+    304 Not Modified) without any new rows: the keys of the source's previous snapshot
+    are added to snapshot_manifest at snapshot_ts and their models_latest rows are
+    stamped with it, so freshness checks see the new snapshot. Returns the number of
+    keys confirmed.
+    """
+    previous_keys = (
+        "SELECT canonical_model_key FROM snapshot_manifest WHERE source = $source AND snapshot_ts = "
+        "(SELECT max(snapshot_ts) FROM snapshot_manifest WHERE source = $source AND snapshot_ts < $ts)"
+    )
+    params = {"source": source, "ts": snapshot_ts}
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(
+            f"INSERT INTO snapshot_manifest SELECT CAST($ts AS TIMESTAMP), $source, canonical_model_key FROM ({previous_keys})",
+            params,
+        )
+        con.execute(
+            "UPDATE models_latest SET snapshot_ts = CAST($ts AS TIMESTAMP) "
+            f"WHERE source = $source AND snapshot_ts < CAST($ts AS TIMESTAMP) AND canonical_model_key IN ({previous_keys})",
+            params,
+        )
+        con.execute(_REFRESH_SNAPSHOT_STATS_SQL)
+        confirmed = con.execute(
+            "SELECT COUNT(*) FROM snapshot_manifest WHERE source = $source AND snapshot_ts = CAST($ts AS TIMESTAMP)",
+            {"source": source, "ts": snapshot_ts},
+        ).fetchone()[0]
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return int(confirmed)
+
+
+def rebuild_derived_tables(con: duckdb.DuckDBPyConnection) -> None:
+    """
+    Reconcile derived tables with bronze_models: add manifest entries for bronze rows
+    that lack one (e.g. rows loaded outside append_snapshot), recompute
+    models_latest from models_history and models_scd from silver_models, and refresh
+    snapshot_stats.
+    """
+    con.execute("BEGIN TRANSACTION")
+    try:
+        con.execute(_BACKFILL_MANIFEST_SQL)
+        con.execute("DELETE FROM models_latest")
+        con.execute("INSERT INTO models_latest " + _LATEST_PER_KEY_SQL.format(relation="models_history"))
+        con.execute("DELETE FROM models_scd")
+        con.execute(_BACKFILL_MODELS_SCD_SQL)
+        con.execute(_REFRESH_SNAPSHOT_STATS_SQL)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
@@ -0,0 +1,66 @@
+import shutil
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+from src.catalog import invalidate_scoring_matrix
+from src.ingest import run_ingest
+
+FIXTURE_PATH = Path(__file__).resolve().parents[1] / "data" / "fixtures" / "fixture.json"
+
+
+@pytest.fixture
+def client(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    (tmp_path / "data" / "fixtures").mkdir(parents=True)
+    shutil.copy(FIXTURE_PATH, tmp_path / "data" / "fixtures" / "fixture.json")
+    monkeypatch.chdir(tmp_path)
+    run_ingest()
+    invalidate_scoring_matrix()
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.mark.parametrize("path", ["/api/recommend", "/api/recommend/batch"])
+def test_unknown_normalization_is_rejected(client: TestClient, path: str) -> None:
+    body = {"task_text": "python debugging"} if path == "/api/recommend" else {"items": [{"task_text": "python"}]}
+    response = client.post(path, json={**body, "normalization": "bogus"})
+    assert response.status_code == 422
+
+
+REQUEST = {"task_text": "python debugging, prefer quality", "topk": 3}
+
+
+def test_recommend_answers_304_for_a_matching_etag(client: TestClient) -> None:
+    first = client.post("/api/recommend", json=REQUEST)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    cached = client.post("/api/recommend", json=REQUEST, headers={"If-None-Match": f'W/"other", {etag}'})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag and cached.content == b""
+
+    other = client.post("/api/recommend", json={**REQUEST, "topk": 2}, headers={"If-None-Match": etag})
+    assert other.status_code == 200 and other.headers["etag"] != etag
+
+
+def test_batch_returns_one_result_per_item(client: TestClient) -> None:
+    items = [{"task_text": "python debugging, prefer quality"}, {"task_text": "math proofs", "min_context": 100000}]
+    response = client.post("/api/recommend/batch", json={"items": items, "topk": 3})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == len(items)
+    for item, result in zip(items, results):
+        assert {"task_profile", "snapshot_ts", "recommendations", "refresh"} <= result.keys()
+        single = client.post("/api/recommend", json={**item, "topk": 3}).json()
+        assert result["recommendations"] == single["recommendations"]
+
+
+def test_cache_endpoint_counts_hits_and_misses(client: TestClient) -> None:
+    before = client.get("/api/cache").json()
+    client.post("/api/recommend", json=REQUEST)
+    client.post("/api/recommend", json=REQUEST)
+    after = client.get("/api/cache").json()
+    assert (after["misses"] - before["misses"], after["hits"] - before["hits"]) == (1, 1)
+    assert after["size"] >= 1
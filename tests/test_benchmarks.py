@@ -0,0 +1,399 @@
+"""
+Latency benchmarks for the hot paths.
+
+Skipped by default; run with `RUN_BENCHMARKS=1 python -m pytest -q -s tests/test_benchmarks.py`
+to print per-request timings.
+"""
+
+import io
+import json
+import math
+import os
+import time
+import tracemalloc
+from datetime import date, datetime
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import ingest
+from src import recommend as rec
+from src.catalog import ScoringMatrix, invalidate_scoring_matrix, response_cache
+from src.connectors.streaming import iter_json_records
+from src.schema import FIELD_ALIASES, ExtractionPlan, _pick, normalize_records, normalize_records_arrow
+from src.warehouse import _MODELS_LATEST_VIEW_DDL, MIGRATIONS, append_snapshot, connect, init_warehouse
+
+pytestmark = pytest.mark.skipif(not os.getenv("RUN_BENCHMARKS"), reason="set RUN_BENCHMARKS=1 to run benchmarks")
+
+BENCH_SIZES = [1_000, 10_000, 100_000]
+
+
+def _json_safe(value: Any) -> Any:
+    # Reference for the recursive conversion payloads went through before they were built native.
+    if value is pd.NA:
+        return None
+    if isinstance(value, dict):
+        return {str(k): _json_safe(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, tuple):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, set):
+        return sorted(_json_safe(v) for v in value)
+    if isinstance(value, (datetime, date, pd.Timestamp)):
+        return value.isoformat()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    item = getattr(value, "item", None)
+    if callable(item):
+        try:
+            return _json_safe(item())
+        except (TypeError, ValueError):
+            pass
+    return value
+
+
+def _synthetic_catalog(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+
+    def _metric(low: float, high: float, null_rate: float) -> np.ndarray:
+        values = rng.uniform(low, high, n_rows)
+        values[rng.random(n_rows) < null_rate] = np.nan
+        return values
+
+    providers = np.array(["OpenAI", "Google", "Meta", "Alibaba", "Mistral", None], dtype=object)
+    return pd.DataFrame(
+        {
+            "snapshot_ts": pd.Timestamp("2026-01-01 00:00:00"),
+            "source": "fixture",
+            "model_name": [f"model-{i}" for i in range(n_rows)],
+            "provider": providers[rng.integers(0, len(providers), n_rows)],
+            "quality_index": _metric(30, 90, 0.2),
+            "coding_index": _metric(30, 90, 0.5),
+            "math_index": _metric(30, 90, 0.5),
+            "reasoning_index": _metric(30, 90, 0.3),
+            "output_tokens_per_s": _metric(10, 300, 0.1),
+            "ttft_s": _metric(0.1, 3, 0.1),
+            "price_input_per_1m": _metric(0.05, 20, 0.1),
+            "price_output_per_1m": _metric(0.1, 60, 0.1),
+            "context_window": rng.choice([8192, 32768, 131072, 200000], n_rows),
+            "is_open_source": rng.random(n_rows) < 0.5,
+            "license": "proprietary",
+            "canonical_model_key": [f"p::model-{i}" for i in range(n_rows)],
+        }
+    )
+
+
+def _time_per_call(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+@pytest.fixture(autouse=True)
+def _reset_scoring_matrix(monkeypatch: pytest.MonkeyPatch):
+    # Repeated identical calls would otherwise time response-cache hits.
+    monkeypatch.setattr(response_cache(), "maxsize", 0)
+    invalidate_scoring_matrix()
+    yield
+    invalidate_scoring_matrix()
+
+
+def _patch_catalog(monkeypatch: pytest.MonkeyPatch, frame: pd.DataFrame) -> None:
+    class _FakeConn:
+        def execute(self, _query: str):
+            class _Result:
+                @staticmethod
+                def fetch_df() -> pd.DataFrame:
+                    return frame.copy()
+
+            return _Result()
+
+        def close(self) -> None:
+            return None
+
+    monkeypatch.setattr(rec, "connect", lambda: _FakeConn())
+    monkeypatch.setattr(rec, "_load_snapshot_stats", lambda: {})
+    monkeypatch.setattr(rec, "_maybe_refresh_warehouse", lambda *_args, **_kwargs: None)
+
+
+@pytest.mark.parametrize("n_rows", BENCH_SIZES)
+def test_bench_quality_metric_row_wise_vs_columnar(monkeypatch: pytest.MonkeyPatch, n_rows: int) -> None:
+    frame = _synthetic_catalog(n_rows)
+    profile = rec.parse_task_profile("python debugging, prefer quality", None, None, None)
+
+    def _row_wise(columns: dict, cols: list[str], n_rows: int) -> np.ndarray:
+        df = pd.DataFrame({col: columns[col] for col in cols})
+        return df.apply(lambda row: rec._first_non_null(row, cols), axis=1).to_numpy()
+
+    _patch_catalog(monkeypatch, frame)
+    columnar_ms = _time_per_call(lambda: rec.recommend(profile, topk=5))
+    columnar = rec.recommend(profile, topk=5)
+
+    monkeypatch.setattr(rec, "_coalesce_columns", _row_wise)
+    row_wise_ms = _time_per_call(lambda: rec.recommend(profile, topk=5), repeat=1)
+    row_wise = rec.recommend(profile, topk=5)
+
+    assert columnar == row_wise
+    print(f"\nrecommend() n={n_rows}: row-wise apply {row_wise_ms:.1f} ms, columnar coalesce {columnar_ms:.1f} ms")
+
+
+@pytest.mark.parametrize("n_rows", BENCH_SIZES)
+def test_bench_cached_scoring_matrix(monkeypatch: pytest.MonkeyPatch, n_rows: int) -> None:
+    frame = _synthetic_catalog(n_rows)
+    profile = rec.parse_task_profile("python debugging, prefer quality", None, None, None)
+    _patch_catalog(monkeypatch, frame)
+
+    def _cold() -> None:
+        invalidate_scoring_matrix()
+        rec.recommend(profile, topk=5)
+
+    cold_ms = _time_per_call(_cold)
+    warm_ms = _time_per_call(lambda: rec.recommend(profile, topk=5))
+    print(f"\nrecommend() n={n_rows}: cache miss {cold_ms:.1f} ms, cache hit {warm_ms:.1f} ms")
+
+
+@pytest.mark.parametrize("n_rows", BENCH_SIZES)
+def test_bench_response_cache_hit_vs_miss(monkeypatch: pytest.MonkeyPatch, n_rows: int) -> None:
+    frame = _synthetic_catalog(n_rows)
+    profile = rec.parse_task_profile("python debugging, prefer quality, budget $5/1M tokens", 5.0, None, None)
+    _patch_catalog(monkeypatch, frame)
+    rec.recommend(profile, topk=5)
+
+    miss_ms = _time_per_call(lambda: rec.recommend(profile, topk=5))
+    monkeypatch.setattr(response_cache(), "maxsize", 1024)
+    rec.recommend(profile, topk=5)
+    hit_ms = _time_per_call(lambda: rec.recommend(profile, topk=5))
+    print(f"\nrecommend() n={n_rows}: response cache miss {miss_ms:.2f} ms, hit {hit_ms:.3f} ms")
+
+
+@pytest.mark.parametrize("n_rows", BENCH_SIZES)
+def test_bench_candidate_vs_snapshot_normalization(monkeypatch: pytest.MonkeyPatch, n_rows: int) -> None:
+    frame = _synthetic_catalog(n_rows)
+    profile = rec.parse_task_profile("python debugging, prefer quality", None, None, None)
+    _patch_catalog(monkeypatch, frame)
+    rec.recommend(profile, topk=5, normalization="snapshot")
+
+    candidates_ms = _time_per_call(lambda: rec.recommend(profile, topk=5))
+    snapshot_ms = _time_per_call(lambda: rec.recommend(profile, topk=5, normalization="snapshot"))
+    print(f"\nrecommend() n={n_rows}: per-request normalization {candidates_ms:.1f} ms, snapshot stats {snapshot_ms:.1f} ms")
+
+
+@pytest.mark.parametrize("n_rows", BENCH_SIZES)
+def test_bench_constraint_masks_vs_index(n_rows: int) -> None:
+    frame = _synthetic_catalog(n_rows)
+    matrix = ScoringMatrix.from_frame(frame)
+    price, context = matrix.metrics["price_input_per_1m"], matrix.metrics["context_window"]
+    allowlist = {"meta", "mistral"}
+
+    def _masks() -> np.ndarray:
+        # The pre-index path: full-length masks plus per-request provider lowercasing.
+        mask = (price <= 0.5) | np.isnan(price)
+        mask &= (context >= 131072) | np.isnan(context)
+        mask &= frame["provider"].fillna("").str.lower().isin(allowlist).to_numpy()
+        return np.flatnonzero(mask)
+
+    mask_ms = _time_per_call(_masks)
+    index_ms = _time_per_call(lambda: matrix.index.candidate_rows(0.5, 131072, allowlist))
+    assert matrix.index.candidate_rows(0.5, 131072, allowlist).tolist() == _masks().tolist()
+    print(f"\nconstraints n={n_rows}: boolean masks {mask_ms:.2f} ms, sorted index {index_ms:.2f} ms")
+
+
+@pytest.mark.parametrize("topk", [5, 20, 100])
+def test_bench_payload_build_and_serialize(topk: int) -> None:
+    matrix = ScoringMatrix.from_frame(_synthetic_catalog(10_000))
+    profile = rec.parse_task_profile("python debugging, prefer quality", None, None, "meta,openai,google")
+
+    def _build() -> dict:
+        [payload] = rec._rank_profiles(matrix, [profile], topk, missing_policy="penalize", refresh_warning=None)
+        return payload
+
+    def _json_safe_path() -> bytes:
+        # Previous path: recursive _json_safe, then the stdlib encoder as in JSONResponse.
+        safe = _json_safe(_build())
+        return json.dumps(safe, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def _native_path() -> bytes:
+        return rec.dumps_payload(_build())
+
+    build_ms = _time_per_call(_build, repeat=20)
+    old_ms = _time_per_call(_json_safe_path, repeat=20)
+    new_ms = _time_per_call(_native_path, repeat=20)
+    assert json.loads(_native_path()) == json.loads(_json_safe_path())
+    print(
+        f"\ntopk={topk}: build {build_ms:.3f} ms, build+_json_safe+json {old_ms:.3f} ms, "
+        f"build+dumps_payload {new_ms:.3f} ms"
+    )
+
+
+def test_bench_per_request_ddl_vs_versioned_migrations(tmp_path) -> None:
+    # The legacy path re-ran the original (v1) CREATE ... IF NOT EXISTS / CREATE OR
+    # REPLACE VIEW DDL on every call; later migrations are one-off data migrations
+    # (drops, backfills) that were never part of it, so they are not replayed.
+    legacy_path, db_path = tmp_path / "legacy.duckdb", tmp_path / "bench.duckdb"
+    legacy_ddl = dict(MIGRATIONS)[1]
+    con = connect(db_path)
+    init_warehouse(con)
+    con.close()
+
+    def _legacy_ddl_every_call() -> None:
+        con = connect(legacy_path)
+        try:
+            for statement in legacy_ddl:
+                con.execute(statement)
+            con.execute("SELECT max(snapshot_ts) FROM models_latest").fetchone()
+        finally:
+            con.close()
+
+    def _migrated() -> None:
+        con = connect(db_path)
+        try:
+            con.execute("SELECT max(snapshot_ts) FROM models_latest").fetchone()
+        finally:
+            con.close()
+
+    legacy_ms = _time_per_call(_legacy_ddl_every_call, repeat=20)
+    migrated_ms = _time_per_call(_migrated, repeat=20)
+    print(
+        f"\nfreshness check: DDL every call {legacy_ms:.2f} ms, versioned migrations {migrated_ms:.2f} ms "
+        f"(saves {legacy_ms - migrated_ms:.2f} ms per request)"
+    )
+
+
+def test_bench_models_latest_view_vs_table_over_1000_snapshots(tmp_path) -> None:
+    n_snapshots, n_models = 1_000, 200
+    con = connect(tmp_path / "bench.duckdb")
+    try:
+        init_warehouse(con)
+        for i in range(n_snapshots):
+            con.execute("CREATE OR REPLACE TEMP TABLE incoming AS SELECT * FROM bronze_models LIMIT 0")
+            con.execute(
+                """
+                INSERT INTO incoming (snapshot_ts, source, model_name, quality_index, canonical_model_key)
+                SELECT TIMESTAMP '2025-01-01' + to_hours(?), 'fixture', 'model-' || m, random() * 100, 'p::model-' || m
+                FROM range(?) t(m)
+                """,
+                [i, n_models],
+            )
+            append_snapshot(con, "incoming")
+
+        con.execute(_MODELS_LATEST_VIEW_DDL.replace("VIEW models_latest", "VIEW models_latest_legacy_view"))
+        view_ms = _time_per_call(lambda: con.execute("SELECT * FROM models_latest_legacy_view").fetch_df(), repeat=5)
+        table_ms = _time_per_call(lambda: con.execute("SELECT * FROM models_latest").fetch_df(), repeat=5)
+        assert len(con.execute("SELECT * FROM models_latest").fetch_df()) == n_models
+        print(f"\nmodels_latest over {n_snapshots} snapshots: GROUP BY view {view_ms:.1f} ms, upserted table {table_ms:.1f} ms")
+    finally:
+        con.close()
+
+
+@pytest.mark.parametrize("n_rows", BENCH_SIZES)
+def test_bench_top_k_partial_selection_vs_full_sort(n_rows: int) -> None:
+    rng = np.random.default_rng(0)
+    score = rng.random(n_rows)
+    keys = np.array([f"p::model-{i}" for i in range(n_rows)], dtype=object)
+
+    full_ms = _time_per_call(lambda: np.lexsort((keys, -score))[:20])
+    partial_ms = _time_per_call(lambda: rec._top_k(score, keys, 20))
+    assert rec._top_k(score, keys, 20).tolist() == np.lexsort((keys, -score))[:20].tolist()
+    tied = np.full(n_rows, 0.5)
+    key_rank = np.arange(n_rows)
+    tied_ms = _time_per_call(lambda: rec._top_k(tied, key_rank, 20))
+    assert rec._top_k(tied, key_rank, 20).tolist() == list(range(min(20, n_rows)))
+    print(
+        f"\ntop-20 n={n_rows}: full sort {full_ms:.2f} ms, argpartition {partial_ms:.2f} ms, "
+        f"all scores tied {tied_ms:.2f} ms"
+    )
+
+
+@pytest.mark.parametrize("n_profiles", [10, 100, 500])
+def test_bench_recommend_batch_vs_loop(monkeypatch: pytest.MonkeyPatch, n_profiles: int) -> None:
+    frame = _synthetic_catalog(10_000)
+    _patch_catalog(monkeypatch, frame)
+    texts = ["python debugging, prefer quality", "fast cheap chat", "math proofs, best accuracy", "rag over documents"]
+    profiles = [rec.parse_task_profile(texts[i % len(texts)], None, None, None) for i in range(n_profiles)]
+    rec.recommend(profiles[0], topk=5)
+
+    loop_ms = _time_per_call(lambda: [rec.recommend(p, topk=5) for p in profiles], repeat=1)
+    batch_ms = _time_per_call(lambda: rec.recommend_batch(profiles, topk=5), repeat=1)
+    print(f"\n{n_profiles} profiles x 10k models: recommend() loop {loop_ms:.1f} ms, recommend_batch() {batch_ms:.1f} ms")
+
+
+def _peak_mib(fn) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def test_bench_streaming_json_peak_memory() -> None:
+    record = {"model_name": "m", "model_creator": {"name": "p", "slug": "p"}, "evaluations": {"x": 1.0}, "pad": "x" * 400}
+    raw = json.dumps({"data": [dict(record, model_name=f"m{i}") for i in range(20_000)]}).encode("utf-8")
+
+    def _consume(records) -> None:
+        for _ in records:
+            pass
+
+    eager_mib = _peak_mib(lambda: _consume(json.loads(io.BytesIO(raw).read().decode("utf-8"))["data"]))
+    streaming_mib = _peak_mib(lambda: _consume(iter_json_records(io.BytesIO(raw))))
+    print(f"\n{len(raw) / 2**20:.1f} MiB payload: json.loads peak {eager_mib:.1f} MiB, streaming peak {streaming_mib:.2f} MiB")
+
+
+def _synthetic_aa_records(n_records: int) -> list[dict]:
+    return [
+        {
+            "id": f"id-{i}",
+            "name": f"Model {i}",
+            "slug": f"model-{i}",
+            "model_creator": {"id": "c", "name": f"Creator {i % 40}", "slug": f"creator-{i % 40}"},
+            "evaluations": {
+                "artificial_analysis_intelligence_index": 50 + i % 30,
+                "artificial_analysis_coding_index": 40 + i % 30,
+                "artificial_analysis_math_index": 30 + i % 30,
+            },
+            "pricing": {"price_1m_input_tokens": 0.1 + i % 7, "price_1m_output_tokens": 0.3 + i % 9},
+            "median_output_tokens_per_second": 20 + i % 200,
+            "median_time_to_first_token_seconds": 0.2 + (i % 10) / 10,
+        }
+        for i in range(n_records)
+    ]
+
+
+def test_bench_compiled_extraction_plan_vs_pick() -> None:
+    records = _synthetic_aa_records(100_000)
+
+    def _with_pick() -> None:
+        for record in records:
+            {field: _pick(record, *keys) for field, keys in FIELD_ALIASES.items()}
+
+    def _with_plan() -> None:
+        plan = ExtractionPlan(FIELD_ALIASES)
+        for record in records:
+            plan.extract(record)
+
+    pick_ms = _time_per_call(_with_pick, repeat=1)
+    plan_ms = _time_per_call(_with_plan, repeat=1)
+    print(
+        f"\nfield extraction, 100k AA records: _pick {pick_ms / 100:.2f} us/record, "
+        f"compiled plan {plan_ms / 100:.2f} us/record"
+    )
+
+
+def test_bench_normalize_and_write_pandas_vs_arrow(tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    records = _synthetic_aa_records(100_000)
+    ts = "2026-01-01T00:00:00+00:00"
+
+    pandas_ms = _time_per_call(
+        lambda: ingest.write_snapshot(normalize_records(records, "bench", ts), source="pandas", snapshot_ts=ts), repeat=1
+    )
+    arrow_ms = _time_per_call(
+        lambda: ingest.write_snapshot(normalize_records_arrow(records, "bench", ts), source="arrow", snapshot_ts=ts), repeat=1
+    )
+    print(f"\nnormalize + write 100k records: pandas {pandas_ms:.0f} ms, arrow {arrow_ms:.0f} ms")
@@ -0,0 +1,104 @@
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from src import compact, ingest
+from src.schema import normalize_records_arrow
+from src.warehouse import connect
+
+
+def _snapshot(ts: str, quality: float) -> Path:
+    records = [{"model_name": "m1", "provider": "p", "quality_index": quality}, {"model_name": "m2", "provider": "p"}]
+    table = normalize_records_arrow(records, source="fixture", snapshot_ts=ts)
+    return ingest.write_snapshot(table, source="fixture", snapshot_ts=ts)
+
+
+def test_compact_bronze_partitions_by_source_and_date(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    # Pre-Arrow snapshots stored snapshot_ts as an ISO string.
+    legacy = pd.DataFrame([{"snapshot_ts": "2025-01-01T01:00:00+00:00", "source": "fixture", "model_name": "m0"}])
+    ingest.write_snapshot(legacy, source="fixture", snapshot_ts="2025-01-01T01:00:00+00:00")
+    _snapshot("2025-01-01T02:00:00+00:00", 70)
+    _snapshot("2025-01-02T02:00:00+00:00", 71)
+
+    result = compact.compact_bronze()
+
+    assert result.snapshot_files == 3
+    assert result.rows == 5
+    assert [p.parent.name for p in result.partitions] == ["date=2025-01-01", "date=2025-01-02"]
+    assert compact.snapshot_files() == []
+    first = pq.ParquetFile(result.partitions[0])
+    assert first.metadata.num_rows == 3
+    stats = first.metadata.row_group(0).column(first.schema_arrow.get_field_index("snapshot_ts")).statistics
+    assert stats.has_min_max
+
+    # A later snapshot for an existing date is merged into that partition.
+    _snapshot("2025-01-02T03:00:00+00:00", 72)
+    again = compact.compact_bronze()
+    assert again.partitions == [result.partitions[1]]
+    assert pq.ParquetFile(result.partitions[1]).metadata.num_rows == 4
+
+
+def test_rebuild_bronze_from_compacted_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    for ts, quality in (("2025-01-01T00:00:00+00:00", 70), ("2025-01-02T00:00:00+00:00", 75)):
+        ingest.load_snapshot_into_duckdb(_snapshot(ts, quality))
+    compact.compact_bronze()
+
+    con = connect()
+    try:
+        con.execute("DELETE FROM bronze_models")
+    finally:
+        con.close()
+
+    # Snapshot files without a manifest hold full snapshots, so bronze gets every row back.
+    assert compact.rebuild_bronze() == 4
+    con = connect()
+    try:
+        latest = con.execute("SELECT quality_index FROM models_latest WHERE model_name = 'm1'").fetchone()
+        history = con.execute("SELECT COUNT(*) FROM models_history").fetchone()
+    finally:
+        con.close()
+    assert latest == (75.0,)
+    assert history == (4,)
+
+
+def test_rebuild_bronze_from_deduplicated_snapshots(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    snapshots = [
+        ("2025-01-01T00:00:00+00:00", [("m1", 70), ("m2", 50)]),
+        ("2025-01-01T06:00:00+00:00", [("m1", 70), ("m2", 50)]),  # unchanged: no bronze rows
+        ("2025-01-02T00:00:00+00:00", [("m1", 75)]),  # m2 missing
+    ]
+    for ts, rows in snapshots:
+        records = [{"model_name": name, "provider": "p", "quality_index": quality} for name, quality in rows]
+        table = normalize_records_arrow(records, source="fixture", snapshot_ts=ts)
+        ingest._persist_snapshot(table, "fixture", ts, {})
+    result = compact.compact_bronze()
+    assert len(result.manifest_partitions) == 2 and compact.manifest_files() == []
+
+    queries = {
+        "bronze": "SELECT COUNT(*) FROM bronze_models",
+        "history": "SELECT snapshot_ts, canonical_model_key, quality_index FROM models_history ORDER BY 1, 2",
+        "scd": "SELECT canonical_model_key, valid_from, valid_to FROM models_scd ORDER BY 1, 2",
+        "stats": "SELECT snapshot_ts, row_count FROM snapshot_stats WHERE column_name = 'quality_index' ORDER BY 1",
+    }
+
+    def _state() -> dict:
+        con = connect()
+        try:
+            return {name: con.execute(sql).fetchall() for name, sql in queries.items()}
+        finally:
+            con.close()
+
+    expected = _state()
+    assert expected["bronze"] == [(3,)] and len(expected["history"]) == 5
+
+    Path("data/warehouse.duckdb").unlink()
+    assert compact.rebuild_bronze() == 3
+    rebuilt = _state()
+    assert rebuilt["history"] == expected["history"]
+    assert rebuilt["scd"] == expected["scd"]
+    assert rebuilt["stats"][-1] == expected["stats"][-1]
@@ -1,5 +1,11 @@
+import gzip
+import io
 import json
+import threading
+import time
+import zlib
 from pathlib import Path
+from urllib.error import HTTPError, URLError
 
 import pytest
 
@@ -9,6 +15,9 @@ from src.connectors.artificial_analysis import (
     _api_key_from_env_file,
 )
 from src.connectors.fixture import FixtureConnector
+from src.connectors.pagination import Pagination, iter_paginated, with_query
+from src.connectors.resilience import CircuitBreaker, RetryPolicy
+from src.connectors.streaming import decode_content, iter_json_records
 
 
 class _FakeResponse:
@@ -54,3 +63,218 @@ def test_api_key_from_env_file(tmp_path: Path) -> None:
     env_path = tmp_path / ".env"
     env_path.write_text("AA_API_KEY=file-token\n", encoding="utf-8")
     assert _api_key_from_env_file(str(env_path)) == "file-token"
+
+
+def test_iter_json_records_streams_across_chunks() -> None:
+    payload = {"meta": {"note": "x" * 50}, "data": [{"model_name": f"m{i}", "score": i * 1.5} for i in range(20)] + [7]}
+    stream = io.BytesIO(json.dumps(payload).encode("utf-8"))
+    records = list(iter_json_records(stream, chunk_size=7))
+    assert [r["model_name"] for r in records] == [f"m{i}" for i in range(20)]
+    assert records[3]["score"] == 4.5
+
+
+def test_iter_json_records_matches_eager_parsing_for_fallback_key_and_lists() -> None:
+    payload = {"data": [], "models": [{"model_name": "é-model"}]}
+    assert list(iter_json_records(io.BytesIO(json.dumps(payload, ensure_ascii=False).encode("utf-8")), chunk_size=3)) == [
+        {"model_name": "é-model"}
+    ]
+    assert list(iter_json_records(io.BytesIO(b'[{"a": 1}, 2, {"b": 12345}]'), chunk_size=2)) == [{"a": 1}, {"b": 12345}]
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_records(io.BytesIO(b'{"data": [{"a": 1},'), chunk_size=4))
+
+
+def test_artificial_analysis_iter_records_streams_response(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("AA_API_KEY", "token")
+    monkeypatch.setattr(
+        "src.connectors.artificial_analysis.urlopen",
+        lambda request, timeout=30: io.BytesIO(b'{"data": [{"model_name": "a"}, {"model_name": "b"}]}'),
+    )
+    records = ArtificialAnalysisConnector().iter_records()
+    assert [r["model_name"] for r in records] == ["a", "b"]
+
+
+@pytest.mark.parametrize("encoding, compress", [("gzip", gzip.compress), ("deflate", zlib.compress), ("", bytes)])
+def test_decode_content_streams_compressed_bodies(encoding: str, compress) -> None:
+    payload = {"data": [{"model_name": f"m{i}"} for i in range(50)]}
+    response = io.BytesIO(compress(json.dumps(payload).encode("utf-8")))
+    response.headers = {"Content-Encoding": encoding}
+    records = list(iter_json_records(decode_content(response), chunk_size=16))
+    assert [r["model_name"] for r in records] == [f"m{i}" for i in range(50)]
+
+
+def test_artificial_analysis_retries_transient_errors(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("AA_API_KEY", "token")
+    outcomes = [URLError("reset"), HTTPError("u", 503, "busy", {}, None), '{"data": [{"model_name": "a"}]}']
+    sleeps: list[float] = []
+
+    def fake_urlopen(request, timeout=30):
+        assert timeout == 2.0
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return _FakeResponse(outcome)
+
+    monkeypatch.setattr("src.connectors.artificial_analysis.urlopen", fake_urlopen)
+    monkeypatch.setattr("src.connectors.artificial_analysis.time.sleep", sleeps.append)
+    connector = ArtificialAnalysisConnector(
+        connect_timeout_s=2.0, retry=RetryPolicy(attempts=3, base_delay_s=1.0), breaker=CircuitBreaker()
+    )
+    assert connector.fetch() == [{"model_name": "a"}]
+    assert len(sleeps) == 2 and 0 <= sleeps[0] <= 1.0 and 0 <= sleeps[1] <= 2.0
+
+
+def test_artificial_analysis_circuit_breaker_fails_fast(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("AA_API_KEY", "token")
+    calls: list[int] = []
+
+    def failing_urlopen(request, timeout=30):
+        calls.append(1)
+        raise HTTPError("u", 502, "bad gateway", {}, None)
+
+    monkeypatch.setattr("src.connectors.artificial_analysis.urlopen", failing_urlopen)
+    monkeypatch.setattr("src.connectors.artificial_analysis.time.sleep", lambda _s: None)
+    breaker = CircuitBreaker(failure_threshold=1, reset_after_s=60)
+    connector = ArtificialAnalysisConnector(retry=RetryPolicy(attempts=2), breaker=breaker)
+
+    with pytest.raises(ArtificialAnalysisError, match="502"):
+        connector.fetch()
+    assert len(calls) == 2 and breaker.status()["state"] == "open"
+    with pytest.raises(ArtificialAnalysisError, match="circuit open"):
+        connector.fetch()
+    assert len(calls) == 2
+
+    # After the reset interval one trial call goes through and closes the circuit on success.
+    breaker.reset_after_s = 0
+    monkeypatch.setattr(
+        "src.connectors.artificial_analysis.urlopen", lambda request, timeout=30: _FakeResponse('[{"model_name": "b"}]')
+    )
+    assert connector.fetch() == [{"model_name": "b"}]
+    assert breaker.status() == {"state": "closed", "consecutive_failures": 0}
+
+
+def test_artificial_analysis_does_not_retry_client_errors(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("AA_API_KEY", "token")
+    calls: list[int] = []
+
+    def unauthorized(request, timeout=30):
+        calls.append(1)
+        raise HTTPError("u", 401, "unauthorized", {}, None)
+
+    monkeypatch.setattr("src.connectors.artificial_analysis.urlopen", unauthorized)
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(ArtificialAnalysisError, match="401"):
+        ArtificialAnalysisConnector(breaker=breaker).fetch()
+    assert len(calls) == 1 and breaker.status()["state"] == "closed"
+
+
+def test_artificial_analysis_half_open_trial_ending_in_client_error_releases_breaker(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("AA_API_KEY", "token")
+    monkeypatch.setattr("src.connectors.artificial_analysis.time.sleep", lambda _s: None)
+    breaker = CircuitBreaker(failure_threshold=1, reset_after_s=0)
+    connector = ArtificialAnalysisConnector(retry=RetryPolicy(attempts=1), breaker=breaker)
+    outcomes: list[object] = [
+        HTTPError("u", 502, "bad gateway", {}, None),  # opens the circuit
+        HTTPError("u", 404, "not found", {}, None),  # the half-open trial
+        ValueError("unexpected"),  # a trial that ends in neither success nor failure
+        '[{"model_name": "b"}]',
+    ]
+
+    def fake_urlopen(request, timeout=30):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return _FakeResponse(outcome)
+
+    monkeypatch.setattr("src.connectors.artificial_analysis.urlopen", fake_urlopen)
+    with pytest.raises(ArtificialAnalysisError, match="502"):
+        connector.fetch()
+    with pytest.raises(ArtificialAnalysisError, match="404"):
+        connector.fetch()
+    assert breaker.status()["state"] == "closed"
+
+    breaker.record_failure()  # open again, so the next call is a trial
+    with pytest.raises(ValueError):
+        connector.fetch()
+    assert connector.fetch() == [{"model_name": "b"}]
+    assert breaker.status() == {"state": "closed", "consecutive_failures": 0}
+
+
+def test_iter_paginated_offset_pages_in_order_with_bounded_parallelism() -> None:
+    catalog = [{"model_name": f"m{i}"} for i in range(7)]
+    lock = threading.Lock()
+    active, peak, requested = [0], [0], []
+
+    def fetch_page(params):
+        with lock:
+            requested.append(params["offset"])
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        offset, limit = params["offset"], params["limit"]
+        return {"data": catalog[offset : offset + limit], "meta": {"total": len(catalog)}}
+
+    records = iter_paginated(fetch_page, Pagination(page_size=2, max_parallel=2))
+    assert requested == [0]  # the first page is fetched eagerly
+    assert [r["model_name"] for r in records] == [f"m{i}" for i in range(7)]
+    assert sorted(requested) == [0, 2, 4, 6] and peak[0] == 2
+
+
+def test_iter_paginated_without_total_stops_at_short_page_and_follows_cursors() -> None:
+    catalog = [{"model_name": f"m{i}"} for i in range(5)]
+    offset_pages = iter_paginated(
+        lambda p: catalog[p["offset"] : p["offset"] + p["limit"]], Pagination(page_size=2, max_parallel=3)
+    )
+    assert [r["model_name"] for r in offset_pages] == [f"m{i}" for i in range(5)]
+
+    pages = {None: {"models": catalog[:3], "next_cursor": "c1"}, "c1": {"models": catalog[3:], "meta": {"next": None}}}
+    cursor_pages = iter_paginated(lambda p: pages[p.get("cursor")], Pagination(mode="cursor"))
+    assert [r["model_name"] for r in cursor_pages] == [f"m{i}" for i in range(5)]
+
+    assert with_query("http://x/models?key=1&offset=9", {"offset": 0, "limit": 2}) == "http://x/models?key=1&offset=0&limit=2"
+
+
+@pytest.mark.parametrize(
+    ("with_total", "echo_limit"), [(True, False), (False, False), (False, True), (True, True)]
+)
+def test_iter_paginated_offset_follows_a_server_capped_page_size(with_total: bool, echo_limit: bool) -> None:
+    catalog = [{"model_name": f"m{i}"} for i in range(10)]
+    cap = 3
+    requested: list[int] = []
+
+    def fetch_page(params):
+        requested.append(params["offset"])
+        offset, limit = params["offset"], min(params["limit"], cap)
+        meta = {"total": len(catalog)} if with_total else {}
+        if echo_limit:
+            meta["limit"] = limit
+        return {"data": catalog[offset : offset + limit], "meta": meta}
+
+    records = iter_paginated(fetch_page, Pagination(page_size=5, max_parallel=2))
+    assert [r["model_name"] for r in records] == [f"m{i}" for i in range(10)]
+    assert sorted(set(requested))[:4] == [0, 3, 6, 9]
+
+
+def test_artificial_analysis_paginated_requests_are_not_conditional(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("AA_API_KEY", "token")
+    validators_path = tmp_path / "http_validators.json"
+    validators_path.write_text(json.dumps({"etag": '"v1"'}), encoding="utf-8")
+    urls: list[str] = []
+
+    def fake_urlopen(request, timeout=30):
+        assert request.headers.get("If-none-match") is None
+        urls.append(request.full_url)
+        offset = int(request.full_url.rsplit("offset=", 1)[1])
+        return _FakeResponse(json.dumps({"data": [{"model_name": f"m{offset}"}], "total": 3}))
+
+    monkeypatch.setattr("src.connectors.artificial_analysis.urlopen", fake_urlopen)
+    connector = ArtificialAnalysisConnector(
+        "http://aa.test/models", validators_path=validators_path, pagination=Pagination(page_size=1)
+    )
+    assert [r["model_name"] for r in connector.fetch()] == ["m0", "m1", "m2"]
+    assert sorted(urls) == [f"http://aa.test/models?limit=1&offset={i}" for i in range(3)]
@@ -1,9 +1,30 @@
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
 
 import pandas as pd
 import pytest
 
 from src import ingest
+from src.catalog import cached_scoring_matrix
+from src.connectors.artificial_analysis import ArtificialAnalysisConnector
+from src.connectors.http_json import HttpJsonConnector
+from src.connectors.pagination import Pagination
+from src.connectors.registry import register_connector
+from src.recommend import parse_task_profile, recommend
+from src.schema import normalize_records_arrow
+from src.warehouse import close_warehouse, connect, open_warehouse
 
 
 def test_choose_source_falls_back_to_fixture(monkeypatch: pytest.MonkeyPatch) -> None:
@@ -35,3 +56,357 @@ def test_write_snapshot_creates_parquet(tmp_path: Path) -> None:
         assert out.suffix == ".parquet"
     finally:
         os.chdir(cwd)
+
+
+def test_load_snapshot_from_arrow_matches_parquet(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    records = [{"model_name": "m1", "provider": "p", "quality_index": 70, "context_window": 4096}]
+    table = normalize_records_arrow(records, source="fixture", snapshot_ts="2025-01-01T00:00:00+00:00")
+    rows = []
+    for name, snapshot in (("arrow", table), ("parquet", None)):
+        workdir = tmp_path / name
+        workdir.mkdir()
+        monkeypatch.chdir(workdir)
+        if snapshot is None:
+            snapshot = ingest.write_snapshot(table, source="fixture", snapshot_ts="2025-01-01T00:00:00+00:00")
+        ingest.load_snapshot_into_duckdb(snapshot)
+        con = connect()
+        try:
+            rows += con.execute("SELECT snapshot_ts, quality_index, context_window FROM bronze_models").fetchall()
+        finally:
+            con.close()
+    assert rows[0][1:] == rows[1][1:] == (70.0, 4096)
+    assert str(rows[0][0]) == str(rows[1][0]) == "2025-01-01 00:00:00"
+
+
+def test_unchanged_snapshot_is_not_stored_twice(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    records = [{"model_name": "m1", "provider": "p", "quality_index": 70}]
+    changed = []
+    for ts in ("2025-01-01T00:00:00+00:00", "2025-01-02T00:00:00+00:00"):
+        table = normalize_records_arrow(records, source="fixture", snapshot_ts=ts)
+        changed.append(ingest.load_snapshot_into_duckdb(table))
+    assert changed == [1, 0]
+    con = connect()
+    try:
+        assert con.execute("SELECT count(*) FROM bronze_models").fetchone()[0] == 1
+        history = con.execute("SELECT snapshot_ts, quality_index FROM models_history ORDER BY 1").fetchall()
+        latest = con.execute("SELECT snapshot_ts FROM models_latest").fetchall()
+    finally:
+        con.close()
+    assert [(str(ts), q) for ts, q in history] == [("2025-01-01 00:00:00", 70.0), ("2025-01-02 00:00:00", 70.0)]
+    assert str(latest[0][0]) == "2025-01-02 00:00:00"
+
+
+def test_persist_snapshot_writes_changed_rows_on_both_paths(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    first = [{"model_name": "m1", "provider": "p", "quality_index": 70}, {"model_name": "m2", "provider": "p"}]
+    second = [{"model_name": "m1", "provider": "p", "quality_index": 75}, {"model_name": "m2", "provider": "p"}]
+    written = {}
+    for arrow_load in (True, False):
+        workdir = tmp_path / str(arrow_load)
+        workdir.mkdir()
+        monkeypatch.chdir(workdir)
+        for ts, records in (("2025-01-01T00:00:00+00:00", first), ("2025-01-02T00:00:00+00:00", second)):
+            table = normalize_records_arrow(records, source="fixture", snapshot_ts=ts)
+            path, changed = ingest._persist_snapshot(table, "fixture", ts, {}, arrow_load=arrow_load)
+        written[arrow_load] = pd.read_parquet(path)[["canonical_model_key", "quality_index"]]
+        assert changed == 1
+    assert written[True].equals(written[False])
+    assert written[True]["quality_index"].tolist() == [75.0]
+
+
+def test_failed_load_removes_snapshot_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    ts = "2025-01-01T00:00:00+00:00"
+    table = normalize_records_arrow([{"model_name": "m1", "provider": "p"}], source="fixture", snapshot_ts=ts)
+
+    def _failing_scd_update(con, relation) -> None:
+        raise RuntimeError("load failed")
+
+    monkeypatch.setattr("src.warehouse._update_models_scd", _failing_scd_update)
+    with pytest.raises(RuntimeError, match="load failed"):
+        ingest._persist_snapshot(table, "fixture", ts, {})
+    assert not list((tmp_path / "data" / "bronze").rglob("*.parquet"))
+    con = connect()
+    try:
+        assert con.execute("SELECT count(*) FROM bronze_models").fetchone()[0] == 0
+    finally:
+        con.close()
+
+
+def test_run_ingest_logs_stage_timings(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture) -> None:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ingest, "choose_source", lambda streaming=False: ("fixture", [{"model_name": "m1"}]))
+    with caplog.at_level(logging.INFO, logger="src.ingest"):
+        path = ingest.run_ingest()
+    assert path.exists()
+    for stage in ("fetch_normalize", "write_parquet", "load_duckdb", "total"):
+        assert f"{stage}=" in caplog.text
+
+
+def test_run_ingest_once_shares_one_ingest_across_threads(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = []
+
+    def _slow_ingest() -> Path:
+        calls.append(1)
+        time.sleep(0.2)
+        return tmp_path / f"snapshot-{len(calls)}.parquet"
+
+    monkeypatch.setattr(ingest, "run_ingest", _slow_ingest)
+    since = time.time()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: ingest.run_ingest_once(since, tmp_path / "ingest.lock"), range(8)))
+    assert calls == [1]
+    assert set(results) == {tmp_path / "snapshot-1.parquet"}
+
+
+def _refresher(lock_path: Path, ready: Any, results: Any) -> None:
+    since = time.time()
+    ready.put(1)
+    results.put(str(ingest.run_ingest_once(since, lock_path)))
+
+
+def test_run_ingest_once_single_snapshot_across_processes(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ingest, "choose_source", lambda streaming=False: ("fixture", [{"model_name": "m1"}]))
+    lock_path = tmp_path / "data" / "ingest.lock"
+    ctx = multiprocessing.get_context("fork")
+    ready, results = ctx.Queue(), ctx.Queue()
+    n_procs = 4
+
+    # Hold the lock until every refresher is waiting on it, so all of them overlap.
+    with ingest._ingest_file_lock(lock_path):
+        procs = [ctx.Process(target=_refresher, args=(lock_path, ready, results)) for _ in range(n_procs)]
+        for proc in procs:
+            proc.start()
+        for _ in range(n_procs):
+            ready.get(timeout=30)
+    paths = {results.get(timeout=60) for _ in range(n_procs)}
+    for proc in procs:
+        proc.join(timeout=30)
+
+    assert len(paths) == 1
+    con = connect()
+    try:
+        assert con.execute("SELECT COUNT(*) FROM snapshot_manifest").fetchone()[0] == 1
+    finally:
+        con.close()
+
+
+_OTHER_PROCESS_INGEST = """
+import sys, time
+from src import ingest
+ingest.choose_source = lambda streaming=False: ("fixture", [{"model_name": "m1", "quality_index": 80}])
+run_ingest = ingest.run_ingest
+
+def _slow_ingest(**kwargs):
+    print("ingesting", flush=True)
+    time.sleep(1.1)  # hold the ingest lock; snapshot_ts has second resolution
+    return run_ingest(**kwargs)
+
+ingest.run_ingest = _slow_ingest
+print(ingest.run_ingest_once(), flush=True)
+"""
+
+
+def test_ingest_by_another_process_is_shared_with_the_app(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ingest, "choose_source", lambda streaming=False: ("fixture", [{"model_name": "m1", "quality_index": 70}]))
+    repo_root = Path(__file__).resolve().parents[1]
+    open_warehouse()
+    try:
+        ingest.run_ingest_once()
+        profile = parse_task_profile("general", None, None, None)
+        before = recommend(profile, topk=1)
+        assert cached_scoring_matrix() is not None
+
+        since = time.time()
+        other = subprocess.Popen(
+            [sys.executable, "-c", _OTHER_PROCESS_INGEST],
+            env={**os.environ, "PYTHONPATH": str(repo_root)},
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        assert other.stdout.readline().strip() == "ingesting"
+        monkeypatch.setattr(ingest, "run_ingest", lambda **_: pytest.fail("the shared ingest ran twice"))
+        shared = ingest.run_ingest_once(since)
+        assert other.wait(60) == 0
+        assert str(shared) == other.stdout.read().strip()
+
+        assert cached_scoring_matrix() is None
+        after = recommend(profile, topk=1)
+        assert after["snapshot_ts"] > before["snapshot_ts"]
+        assert after["recommendations"][0]["metrics"]["quality_metric"] == 80
+    finally:
+        close_warehouse()
+
+
+@pytest.fixture
+def stub_server():
+    """
+    Local stand-in upstream: path (without query) -> (status, JSON body, delay seconds),
+    or a callable taking the request handler and returning (status, headers, raw body).
+    """
+    routes: dict[str, Any] = {}
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            route = routes.get(urlsplit(self.path).path, (404, {"error": "not found"}, 0.0))
+            if callable(route):
+                status, headers, data = route(self)
+            else:
+                status, body, delay = route
+                time.sleep(delay)
+                headers, data = {"Content-Type": "application/json"}, json.dumps(body).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *_args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield routes, f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_run_ingest_sources_fetches_concurrently_and_isolates_failures(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, stub_server
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    routes, base_url = stub_server
+    delay_s = 0.6
+    routes["/prices"] = (200, {"data": [{"model_name": "m1", "provider": "p", "price_input_per_1m": 1.0}]}, delay_s)
+    routes["/bench"] = (200, [{"model_name": "m2", "provider": "q", "quality_index": 70}], delay_s)
+    routes["/down"] = (503, {"error": "unavailable"}, 0.0)
+    for name, path in (("stub_prices", "/prices"), ("stub_bench", "/bench"), ("stub_down", "/down")):
+        register_connector(name, lambda path=path: HttpJsonConnector(base_url + path), replace=True)
+
+    start = time.perf_counter()
+    results = ingest.run_ingest_sources(["stub_prices", "stub_bench", "stub_down"])
+    elapsed = time.perf_counter() - start
+
+    assert "503" in results["stub_down"].error and results["stub_down"].snapshot_path is None
+    for name in ("stub_prices", "stub_bench"):
+        result = results[name]
+        assert result.error is None and result.rows == 1
+        assert result.snapshot_path.parent == Path("data") / "bronze" / name
+        assert {"fetch_normalize", "load_duckdb"} <= result.timings.keys()
+        assert result.timings["fetch_normalize"] >= delay_s * 1000
+    # Fetched one after another, the run would take at least the sum of the fetches.
+    sequential_s = sum(results[name].timings["fetch_normalize"] for name in ("stub_prices", "stub_bench")) / 1000
+    assert elapsed < sequential_s
+    con = connect()
+    try:
+        sources = con.execute("SELECT source, model_name FROM models_latest ORDER BY 1").fetchall()
+    finally:
+        con.close()
+    assert sources == [("stub_bench", "m2"), ("stub_prices", "m1")]
+
+
+def test_run_ingest_uses_conditional_requests_and_gzip(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, stub_server
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("AA_API_KEY", "token")
+    routes, base_url = stub_server
+    seen: list[dict[str, str]] = []
+    payload = gzip.compress(json.dumps({"data": [{"model_name": "m1", "provider": "p", "quality_index": 70}]}).encode())
+
+    def models(request) -> tuple[int, dict[str, str], bytes]:
+        headers = request.headers
+        seen.append(dict(headers))
+        if headers.get("If-None-Match") == '"v1"':
+            return 304, {"ETag": '"v1"'}, b""
+        assert "gzip" in headers.get("Accept-Encoding", "")
+        return 200, {"Content-Type": "application/json", "Content-Encoding": "gzip", "ETag": '"v1"'}, payload
+
+    routes["/models"] = models
+    monkeypatch.setattr(ingest, "ArtificialAnalysisConnector", lambda: ArtificialAnalysisConnector(base_url + "/models"))
+
+    first = ingest.run_ingest()
+    assert first is not None and "If-None-Match" not in seen[0]
+    time.sleep(1.1)  # snapshot_ts has second resolution
+    assert ingest.run_ingest() is None
+    assert seen[1]["If-None-Match"] == '"v1"'
+
+    con = connect()
+    try:
+        snapshots = con.execute("SELECT COUNT(DISTINCT snapshot_ts) FROM snapshot_manifest").fetchone()[0]
+        latest = con.execute("SELECT model_name, quality_index, snapshot_ts FROM models_latest").fetchall()
+        newest = con.execute("SELECT max(snapshot_ts) FROM snapshot_manifest").fetchone()[0]
+    finally:
+        con.close()
+    assert snapshots == 2
+    assert latest == [("m1", 70.0, newest)]
+    bronze_dir = Path("data") / "bronze" / "artificial_analysis"
+    assert list(bronze_dir.glob("models_snapshot_*.parquet")) == [first]
+    assert len(list(bronze_dir.glob("manifest_*.parquet"))) == 2  # the 304 records membership only
+
+    # Validators that outlive the warehouse rows are dropped and the payload fetched again.
+    con = connect()
+    try:
+        con.execute("DELETE FROM snapshot_manifest")
+    finally:
+        con.close()
+    assert ingest.run_ingest() is not None
+    assert "If-None-Match" in seen[2] and "If-None-Match" not in seen[3]
+
+
+def test_run_ingest_sources_fetches_pages_in_parallel(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, stub_server
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    routes, base_url = stub_server
+    catalog = [{"model_name": f"m{i}", "provider": "p", "quality_index": i} for i in range(10)]
+
+    def models(request) -> tuple[int, dict[str, str], bytes]:
+        query = parse_qs(urlsplit(request.path).query)
+        offset, limit = int(query["offset"][0]), int(query["limit"][0])
+        time.sleep(0.3)
+        body = {"data": catalog[offset : offset + limit], "meta": {"total": len(catalog)}}
+        return 200, {"Content-Type": "application/json"}, json.dumps(body).encode()
+
+    routes["/models"] = models
+    pagination = Pagination(page_size=2, max_parallel=4)
+    register_connector("stub_paged", lambda: HttpJsonConnector(base_url + "/models", pagination=pagination), replace=True)
+
+    start = time.perf_counter()
+    result = ingest.run_ingest_sources(["stub_paged"])["stub_paged"]
+    elapsed = time.perf_counter() - start
+
+    assert result.error is None and result.rows == 10
+    assert elapsed < 1.2  # five sequential 0.3 s pages would take 1.5 s
+    con = connect()
+    try:
+        names = [row[0] for row in con.execute("SELECT model_name FROM models_latest ORDER BY quality_index").fetchall()]
+    finally:
+        con.close()
+    assert names == [f"m{i}" for i in range(10)]
+
+
+def test_run_ingest_sources_pages_through_a_server_capping_the_page_size(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, stub_server
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    routes, base_url = stub_server
+    catalog = [{"model_name": f"m{i}", "provider": "p"} for i in range(10)]
+
+    def models(request) -> tuple[int, dict[str, str], bytes]:
+        query = parse_qs(urlsplit(request.path).query)
+        offset, limit = int(query["offset"][0]), min(int(query["limit"][0]), 3)  # ignores larger limits
+        return 200, {"Content-Type": "application/json"}, json.dumps(catalog[offset : offset + limit]).encode()
+
+    routes["/models"] = models
+    pagination = Pagination(page_size=5, max_parallel=2)
+    register_connector("stub_capped", lambda: HttpJsonConnector(base_url + "/models", pagination=pagination), replace=True)
+
+    result = ingest.run_ingest_sources(["stub_capped"])["stub_capped"]
+    assert result.error is None and result.rows == 10
@@ -1,10 +1,42 @@
 import json
+import shutil
+import threading
+import time
+from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import pytest
 
-from src.ingest import run_ingest
-from src.recommend import _extract_budget_from_text, _json_safe, parse_task_profile, recommend
+from src.catalog import ResponseCache, ScoringMatrix, cached_scoring_matrix, invalidate_scoring_matrix, response_cache
+from src.ingest import last_ingest_marker, run_ingest, run_ingest_once
+from src.recommend import (
+    _coalesce_columns,
+    _extract_budget_from_text,
+    _first_non_null,
+    _normalize_to_stats,
+    _normalize_values,
+    _top_k,
+    dumps_payload,
+    parse_task_profile,
+    recommend,
+    recommend_batch,
+    recommend_with_etag,
+)
+from src.refresh import background_refresher
+from src.warehouse import connect
+
+FIXTURE_PATH = Path(__file__).resolve().parents[1] / "data" / "fixtures" / "fixture.json"
+
+
+@pytest.fixture(autouse=True)
+def _workdir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    # Ingests write data/warehouse.duckdb, data/bronze/ and data/ingest.lock under the cwd.
+    (tmp_path / "data" / "fixtures").mkdir(parents=True)
+    shutil.copy(FIXTURE_PATH, tmp_path / "data" / "fixtures" / "fixture.json")
+    monkeypatch.chdir(tmp_path)
+    invalidate_scoring_matrix()
+    return tmp_path
 
 
 def test_parse_task_profile_detects_coding_and_budget() -> None:
@@ -50,14 +82,6 @@ def test_recommend_hard_constraint_filter() -> None:
     assert result["recommendations"] == []
 
 
-def test_json_safe_handles_pandas_na_and_sets() -> None:
-    payload = {"x": pd.NA, "providers": {"meta", "openai"}}
-    safe = _json_safe(payload)
-    assert safe["x"] is None
-    assert safe["providers"] == ["meta", "openai"]
-    json.dumps(safe)
-
-
 def test_extract_budget_accepts_without_dollar_sign() -> None:
     assert _extract_budget_from_text("budget 5 per 1M tokens") == 5.0
 
@@ -93,8 +117,219 @@ def test_recommend_warns_and_returns_empty_on_near_empty_metrics(monkeypatch: py
             return None
 
     monkeypatch.setattr("src.recommend.connect", lambda: _FakeConn())
-    monkeypatch.setattr("src.recommend.init_warehouse", lambda _con: None)
+    monkeypatch.setattr("src.recommend._load_snapshot_stats", lambda: {})
+    invalidate_scoring_matrix()
     profile = parse_task_profile("python debugging", None, None, None)
     result = recommend(profile, topk=5)
     assert result["recommendations"] == []
     assert "warning" in result
+
+
+def test_coalesce_columns_matches_row_wise_first_non_null() -> None:
+    df = pd.DataFrame(
+        {
+            "coding_index": [70.0, None, None, pd.NA],
+            "quality_index": [60.0, 55.0, None, pd.NA],
+            "reasoning_index": [50.0, 45.0, 40.0, pd.NA],
+        }
+    )
+    cols = ["coding_index", "quality_index", "reasoning_index"]
+    expected = df.apply(lambda row: _first_non_null(row, cols), axis=1)
+    columns = {col: df[col].to_numpy(dtype="float64", na_value=float("nan")) for col in cols}
+    assert _coalesce_columns(columns, cols, len(df)).tolist() == expected.tolist() == [70.0, 55.0, 40.0, 0.0]
+
+
+def test_recommend_serves_cached_matrix_until_ingest(monkeypatch: pytest.MonkeyPatch) -> None:
+    run_ingest_once()
+    profile = parse_task_profile("python debugging", None, None, None)
+    first = recommend(profile, topk=3)
+
+    opened, marker_reads = [], []
+    with monkeypatch.context() as patched:
+        patched.setattr("src.recommend.connect", lambda *args, **kwargs: opened.append(1) or connect(*args, **kwargs))
+        patched.setattr("src.recommend.last_ingest_marker", lambda: marker_reads.append(1) or last_ingest_marker())
+        assert recommend(profile, topk=3) == first
+        assert recommend(profile, topk=4)["recommendations"][:3] == first["recommendations"]
+    assert opened == []
+    assert marker_reads == [1, 1]
+
+    run_ingest()
+    assert cached_scoring_matrix() is None
+
+
+def test_recommend_revalidates_matrix_after_ingest_elsewhere(monkeypatch: pytest.MonkeyPatch) -> None:
+    run_ingest_once()
+    profile = parse_task_profile("python debugging", None, None, None)
+    first = recommend(profile, topk=3)
+
+    # An ingest by another process does not call this process's invalidate_scoring_matrix().
+    monkeypatch.setattr("src.ingest.invalidate_scoring_matrix", lambda: None)
+    time.sleep(1.1)  # snapshot_ts has second resolution
+    run_ingest_once()
+    second = recommend(profile, topk=3)
+
+    assert second["snapshot_ts"] > first["snapshot_ts"]
+
+
+def test_top_k_matches_full_sort_with_key_tie_break() -> None:
+    score = np.array([0.5, 0.9, 0.5, 0.1, 0.9, 0.5])
+    keys = np.array(["f", "e", "d", "c", "b", "a"], dtype=object)
+    assert _top_k(score, keys, 3).tolist() == [4, 1, 5]
+    assert _top_k(score, keys, 10).tolist() == [4, 1, 5, 2, 0, 3]
+    assert _top_k(score, keys, 0).tolist() == []
+    assert _top_k(np.zeros(6), keys, 2).tolist() == [5, 4]
+    assert _top_k(score, np.arange(6)[::-1], 4).tolist() == [4, 1, 5, 2]
+
+
+def test_recommend_batch_matches_single_recommend() -> None:
+    run_ingest()
+    profiles = [
+        parse_task_profile("python debugging, prefer quality", None, None, None),
+        parse_task_profile("python debugging, fast and cheap", None, None, None),
+        parse_task_profile("math proofs", None, 100000, None),
+        parse_task_profile("general", 0.1, None, None),
+    ]
+    batch = recommend_batch(profiles, topk=3)
+    assert batch == [recommend(profile, topk=3) for profile in profiles]
+
+
+def test_background_refresh_serves_current_snapshot(monkeypatch: pytest.MonkeyPatch) -> None:
+    run_ingest()
+    profile = parse_task_profile("python debugging", None, None, None)
+    expected = recommend(profile, topk=3)
+    release = threading.Event()
+    calls = []
+
+    def _slow_ingest() -> None:
+        calls.append(1)
+        release.wait(5)
+
+    monkeypatch.setattr("src.refresh.run_ingest_once", _slow_ingest)
+    first = recommend(profile, topk=3, max_age_hours=0, background_refresh=True)
+    second = recommend(profile, topk=3, max_age_hours=0, background_refresh=True)
+    release.set()
+    assert background_refresher().wait(5)
+
+    assert first["recommendations"] == second["recommendations"] == expected["recommendations"]
+    assert first["refresh"]["triggered"] is True and first["refresh"]["state"] == "running"
+    assert second["refresh"]["triggered"] is False
+    assert calls == [1]
+
+
+def test_empty_warehouse_waits_for_background_refresh_with_a_bound(monkeypatch: pytest.MonkeyPatch) -> None:
+    release = threading.Event()
+    monkeypatch.setattr("src.refresh.run_ingest_once", lambda: release.wait(5))
+    monkeypatch.setattr("src.recommend.EMPTY_WAREHOUSE_WAIT_S", 0.2)
+    profile = parse_task_profile("python debugging", None, None, None)
+
+    start = time.perf_counter()
+    result = recommend(profile, topk=3, background_refresh=True)
+    elapsed = time.perf_counter() - start
+    release.set()
+    assert background_refresher().wait(5)
+
+    assert elapsed < 2
+    assert result["recommendations"] == []
+    assert result["refresh"]["triggered"] is True and result["refresh"]["state"] == "running"
+
+
+def test_forced_refresh_ingests_before_answering(monkeypatch: pytest.MonkeyPatch) -> None:
+    run_ingest()
+    profile = parse_task_profile("python debugging", None, None, None)
+    calls = []
+    monkeypatch.setattr("src.ingest.run_ingest_once", lambda: calls.append(1))
+    monkeypatch.setattr("src.refresh.run_ingest_once", lambda: pytest.fail("forced refresh ran in the background"))
+
+    result = recommend(profile, topk=3, refresh=True, background_refresh=True)
+
+    assert calls == [1]
+    assert "refresh" not in result
+
+
+def test_response_cache_lru_and_ttl() -> None:
+    cache = ResponseCache(maxsize=2, ttl_s=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.stats() == {"size": 2, "hits": 1, "misses": 1}
+
+    expired = ResponseCache(ttl_s=0)
+    expired.put("a", 1)
+    assert expired.get("a") is None
+
+
+def test_recommend_response_cache_hits_until_new_snapshot() -> None:
+    run_ingest()
+    profile = parse_task_profile("python debugging, prefer quality, budget $5/1M tokens", 5.0, None, None)
+    first, etag = recommend_with_etag(profile, topk=3)
+    hits = response_cache().stats()["hits"]
+    again, same_etag = recommend_with_etag(profile, topk=3)
+    assert (again, same_etag) == (first, etag)
+    assert response_cache().stats()["hits"] == hits + 1
+    assert recommend_with_etag(profile, topk=4)[1] != etag
+
+    run_ingest()
+    assert response_cache().stats()["size"] == 0
+    misses = response_cache().stats()["misses"]
+    recommend_with_etag(profile, topk=3)
+    assert response_cache().stats()["misses"] == misses + 1
+
+
+def test_normalize_to_stats_matches_candidate_normalization_on_full_snapshot() -> None:
+    values = np.array([1.0, np.nan, 4.0, 2.0])
+    stats = {"min_value": 1.0, "max_value": 4.0, "median": 2.0}
+    for invert in (False, True):
+        for policy in ("neutral", "penalize"):
+            expected = _normalize_values(values, invert, missing_policy=policy)
+            assert np.allclose(_normalize_to_stats(values, stats, invert, missing_policy=policy), expected)
+
+
+def test_snapshot_normalization_scores_do_not_depend_on_filters() -> None:
+    run_ingest()
+    unfiltered = parse_task_profile("python debugging", None, None, None)
+    filtered = parse_task_profile("python debugging", 0.7, None, None)
+    # Quality is still scaled over the candidates, so compare on speed and cost only.
+    for profile in (unfiltered, filtered):
+        profile.weight_quality, profile.weight_speed, profile.weight_cost = 0.0, 0.5, 0.5
+    everything = recommend(unfiltered, topk=1000, normalization="snapshot")["recommendations"]
+    subset = recommend(filtered, topk=1000, normalization="snapshot")["recommendations"]
+    scores = {r["canonical_model_key"]: r["score"] for r in everything}
+    assert 0 < len(subset) < len(everything)
+    assert all(r["score"] == scores[r["canonical_model_key"]] for r in subset)
+
+
+def test_constraint_index_matches_boolean_masks() -> None:
+    rng = np.random.default_rng(0)
+    n_rows = 500
+    price = rng.choice([0.1, 0.5, 1.0, 5.0, np.nan], n_rows)
+    context = rng.choice([4096.0, 32768.0, 131072.0, np.nan], n_rows)
+    frame = pd.DataFrame(
+        {
+            "canonical_model_key": [f"k{i}" for i in range(n_rows)],
+            "provider": rng.choice(np.array(["Meta", "OpenAI", "meta", None], dtype=object), n_rows),
+            "price_input_per_1m": price,
+            "context_window": context,
+        }
+    )
+    matrix = ScoringMatrix.from_frame(frame)
+    for max_price in (None, 0.05, 0.5, 100.0):
+        for min_context in (None, 32768, 1_000_000):
+            for allowlist in (None, {"meta"}, {"openai", "unknown"}):
+                mask = np.ones(n_rows, dtype=bool)
+                if max_price is not None:
+                    mask &= (price <= max_price) | np.isnan(price)
+                if min_context is not None:
+                    mask &= (context >= min_context) | np.isnan(context)
+                if allowlist:
+                    mask &= matrix.provider_mask(allowlist)
+                rows = matrix.index.candidate_rows(max_price, min_context, allowlist)
+                assert rows.tolist() == np.flatnonzero(mask).tolist()
+
+
+def test_payload_is_json_native() -> None:
+    run_ingest()
+    profile = parse_task_profile("python debugging", None, None, "meta,mistral")
+    payload = recommend(profile, topk=3)
+    assert json.loads(dumps_payload(payload)) == payload
@@ -0,0 +1,34 @@
+import threading
+
+from src.refresh import BackgroundRefresher
+
+
+def test_background_refresher_runs_one_refresh_at_a_time() -> None:
+    release = threading.Event()
+    calls = []
+
+    def _run() -> None:
+        calls.append(1)
+        release.wait(5)
+
+    refresher = BackgroundRefresher(run=_run)
+    assert refresher.trigger() is True
+    assert refresher.trigger() is False
+    assert refresher.status()["state"] == "running"
+    release.set()
+    assert refresher.wait(5)
+    assert calls == [1]
+    assert refresher.status()["state"] == "succeeded"
+
+
+def test_background_refresher_reports_failure() -> None:
+    def _run() -> None:
+        raise RuntimeError("upstream down")
+
+    refresher = BackgroundRefresher(run=_run)
+    refresher.trigger()
+    assert refresher.wait(5)
+    status = refresher.status()
+    assert status["state"] == "failed"
+    assert status["error"] == "upstream down"
+    assert status["finished_at"] is not None
@@ -1,4 +1,15 @@
-from src.schema import canonical_model_key, normalize_records
+from datetime import datetime
+
+from src.schema import (
+    ARROW_SCHEMA,
+    CANONICAL_COLUMNS,
+    FIELD_ALIASES,
+    ExtractionPlan,
+    _pick,
+    canonical_model_key,
+    normalize_records,
+    normalize_records_arrow,
+)
 
 
 def test_normalize_records_has_canonical_columns() -> None:
@@ -37,3 +48,32 @@ def test_normalize_records_nested_and_camel_case_fields() -> None:
 
 def test_canonical_model_key() -> None:
     assert canonical_model_key("Test Model", "Acme Labs") == "acme-labs::test-model"
+
+
+def test_extraction_plan_matches_pick_across_record_shapes() -> None:
+    plan = ExtractionPlan(FIELD_ALIASES)
+    records = [
+        {"name": "A", "model_creator": {"name": "Org", "slug": "org"}, "pricing": {"price_1m_input_tokens": 3}},
+        {"name": "B", "model_creator": {"name": "Org", "slug": "org"}, "pricing": {"price_1m_input_tokens": 4}},
+        {"name": "C", "model_creator": {"name": None, "slug": "slug-only"}, "pricing": None},
+        {"model_name": None, "model": "D", "provider": "P", "pricing": {"inputPricePer1M": 1}},
+    ]
+    for record in records:
+        extracted = plan.extract(record)
+        assert extracted == {field: _pick(record, *keys) for field, keys in FIELD_ALIASES.items()}
+    assert plan.extract(records[2])["provider"] == "slug-only"
+
+
+def test_normalize_records_arrow_uses_bronze_types() -> None:
+    records = [
+        {"name": "Test Model", "vendor": "Acme", "overall_index": "66.5", "context_tokens": "4096", "open_source": "yes"},
+        {"name": "Other", "pricing": {"price_1m_input_tokens": 0}},
+    ]
+    table = normalize_records_arrow(records, source="fixture", snapshot_ts="2024-01-01T00:00:00+00:00")
+    assert table.schema == ARROW_SCHEMA
+    assert table.column_names == CANONICAL_COLUMNS
+    assert table.column("snapshot_ts")[0].as_py() == datetime(2024, 1, 1)
+    assert table.column("context_window").to_pylist() == [4096, None]
+    assert table.column("is_open_source").to_pylist() == [True, None]
+    assert table.column("price_input_per_1m").to_pylist() == [None, None]
+    assert table.column("canonical_model_key").to_pylist() == ["acme::test-model", "unknown::other"]
@@ -1,4 +1,21 @@
-from src.warehouse import connect, init_warehouse
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from src.warehouse import (
+    MIGRATIONS,
+    SCHEMA_VERSION,
+    ConnectionManager,
+    append_snapshot,
+    connect,
+    current_schema_version,
+    init_warehouse,
+    latest_snapshot_stats,
+    models_as_of,
+    rebuild_derived_tables,
+)
 
 
 def test_warehouse_views_exist(tmp_path) -> None:
@@ -13,9 +30,297 @@ def test_warehouse_views_exist(tmp_path) -> None:
             ('2025-01-02 00:00:00', 'fixture', 'M1', 'P1', 60, 50, 40, 30, 11, 1, 2, 3, 4096, true, 'apache-2.0', 'p1::m1');
             """
         )
+        rebuild_derived_tables(con)
         latest_quality = con.execute("SELECT quality_index FROM models_latest WHERE canonical_model_key='p1::m1'").fetchone()[0]
         history_count = con.execute("SELECT COUNT(*) FROM models_history").fetchone()[0]
         assert latest_quality == 60
         assert history_count == 2
     finally:
         con.close()
+
+
+def test_connection_manager_reuses_thread_cursor_and_shares_writes(tmp_path) -> None:
+    manager = ConnectionManager(tmp_path / "test.duckdb")
+    manager.open()
+    try:
+        with manager.reader() as reader:
+            with manager.reader() as again:
+                assert again is reader
+
+            other: list = []
+
+            def _read() -> None:
+                with manager.reader() as cursor:
+                    other.append(cursor)
+
+            thread = threading.Thread(target=_read)
+            thread.start()
+            thread.join()
+            assert other[0] is not reader
+
+        with manager.writer() as writer:
+            writer.execute(
+                "INSERT INTO bronze_models (snapshot_ts, canonical_model_key) VALUES ('2025-01-01 00:00:00', 'p::m')"
+            )
+            rebuild_derived_tables(writer)
+        with manager.reader() as reader:
+            assert reader.execute("SELECT COUNT(*) FROM models_latest").fetchone()[0] == 1
+    finally:
+        manager.close()
+    assert not manager.is_open
+
+
+def _in_subprocess(code: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-c", code], cwd=Path(__file__).resolve().parents[1])
+
+
+_WRITE_ELSEWHERE = """
+from pathlib import Path
+from src.ingest import _ingest_file_lock
+from src.warehouse import connect
+
+with _ingest_file_lock(Path({lock_path!r})):
+    con = connect({db_path!r})
+    con.execute("INSERT INTO bronze_models (snapshot_ts, canonical_model_key) VALUES ('2025-01-01 00:00:00', 'p::m')")
+    con.close()
+"""
+
+
+def test_connection_manager_keeps_the_database_open_until_a_writer_needs_it(tmp_path) -> None:
+    db_path = tmp_path / "test.duckdb"
+    manager = ConnectionManager(db_path)
+    manager.open()
+    try:
+        # The read-write connection used for migrations is closed; reads reopen read-only and keep it.
+        assert not manager.holds_database
+        with manager.reader() as reader:
+            reader.execute("SELECT 1").fetchone()
+        time.sleep(0.3)
+        assert manager.holds_database
+
+        # Readers in other processes can share the file with this process's readers.
+        read_elsewhere = _in_subprocess(
+            f"from src.warehouse import connect; connect({str(db_path)!r}, read_only=True, lock_timeout_s=0).close()"
+        )
+        assert read_elsewhere.wait(60) == 0
+
+        # A writer elsewhere takes the ingest lock, waits for this process to let go of the file, then runs.
+        with manager.reader() as reader:
+            write_elsewhere = _in_subprocess(
+                _WRITE_ELSEWHERE.format(lock_path=str(manager.lock_path), db_path=str(db_path))
+            )
+            time.sleep(0.5)
+            assert write_elsewhere.poll() is None
+            reader.execute("SELECT 1").fetchone()
+        assert write_elsewhere.wait(60) == 0
+
+        with manager.reader() as reader:
+            assert reader.execute("SELECT COUNT(*) FROM bronze_models").fetchone()[0] == 1
+        assert manager.holds_database
+    finally:
+        manager.close()
+
+
+def test_init_warehouse_applies_migrations_once(tmp_path) -> None:
+    con = connect(tmp_path / "test.duckdb")
+    try:
+        assert current_schema_version(con) == 0
+        assert init_warehouse(con) == [version for version, _ in MIGRATIONS]
+        assert current_schema_version(con) == SCHEMA_VERSION
+        assert init_warehouse(con) == []
+        assert con.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == len(MIGRATIONS)
+    finally:
+        con.close()
+
+
+_SHARED_KEY_ROWS = [
+    ("2025-01-01", "a", 1.0),
+    ("2025-01-01", "b", 2.0),
+    ("2025-01-02", "a", 3.0),
+    ("2025-01-03", "a", 3.5),
+    ("2025-01-03", "b", 4.0),
+]
+_DERIVED_SQL = {
+    "models_latest": "SELECT snapshot_ts, source, quality_index FROM models_latest ORDER BY ALL",
+    "models_history": "SELECT snapshot_ts, source, quality_index FROM models_history ORDER BY ALL",
+    "models_scd": "SELECT source, valid_from, valid_to, quality_index FROM models_scd ORDER BY ALL",
+}
+
+
+def _load_shared_key_rows(con) -> None:
+    con.executemany(
+        "INSERT INTO bronze_models (snapshot_ts, source, model_name, quality_index, canonical_model_key) "
+        "VALUES (?, ?, 'M1', ?, 'p::m1')",
+        _SHARED_KEY_ROWS,
+    )
+
+
+def test_upgraded_warehouse_matches_a_fresh_one(tmp_path, monkeypatch) -> None:
+    upgraded = connect(tmp_path / "upgraded.duckdb")
+    fresh = connect(tmp_path / "fresh.duckdb")
+    try:
+        # Data loaded at schema v1, then upgraded one release at a time.
+        monkeypatch.setattr("src.warehouse.MIGRATIONS", MIGRATIONS[:1])
+        init_warehouse(upgraded)
+        _load_shared_key_rows(upgraded)
+        monkeypatch.setattr("src.warehouse.MIGRATIONS", MIGRATIONS[:5])
+        assert init_warehouse(upgraded) == [2, 3, 4, 5]
+        monkeypatch.setattr("src.warehouse.MIGRATIONS", MIGRATIONS)
+        assert init_warehouse(upgraded) == [version for version, _ in MIGRATIONS[5:]]
+
+        init_warehouse(fresh)
+        _load_shared_key_rows(fresh)
+        rebuild_derived_tables(fresh)
+
+        for sql in _DERIVED_SQL.values():
+            assert upgraded.execute(sql).fetchall() == fresh.execute(sql).fetchall()
+        assert [row[1:] for row in fresh.execute(_DERIVED_SQL["models_latest"]).fetchall()] == [("b", 4.0)]
+    finally:
+        upgraded.close()
+        fresh.close()
+
+
+def test_append_snapshot_upserts_latest_without_regressing(tmp_path) -> None:
+    con = connect(tmp_path / "test.duckdb")
+    try:
+        init_warehouse(con)
+        for snapshot_ts, quality in [("2025-01-02 00:00:00", 60), ("2025-01-01 00:00:00", 50)]:
+            con.execute("CREATE OR REPLACE TEMP TABLE incoming AS SELECT * FROM bronze_models LIMIT 0")
+            con.execute(
+                "INSERT INTO incoming (snapshot_ts, model_name, quality_index, canonical_model_key) VALUES (?, 'M1', ?, 'p1::m1')",
+                [snapshot_ts, quality],
+            )
+            append_snapshot(con, "incoming")
+        assert con.execute("SELECT COUNT(*) FROM bronze_models").fetchone()[0] == 2
+        assert con.execute("SELECT quality_index FROM models_latest").fetchall() == [(60.0,)]
+    finally:
+        con.close()
+
+
+def test_sources_sharing_a_key_are_deduplicated_independently(tmp_path) -> None:
+    con = connect(tmp_path / "test.duckdb")
+    try:
+        init_warehouse(con)
+        for snapshot_ts in ("2025-01-01", "2025-01-02"):
+            for source, quality in (("fixture", 2.0), ("other", 5.0)):
+                con.execute("CREATE OR REPLACE TEMP TABLE incoming AS SELECT * FROM bronze_models LIMIT 0")
+                con.execute(
+                    "INSERT INTO incoming (snapshot_ts, source, model_name, quality_index, canonical_model_key) "
+                    "VALUES (?, ?, 'M1', ?, 'p::m1')",
+                    [snapshot_ts, source, quality],
+                )
+                append_snapshot(con, "incoming")
+
+        assert con.execute("SELECT source FROM bronze_models ORDER BY 1").fetchall() == [("fixture",), ("other",)]
+        history = con.execute(
+            "SELECT strftime(snapshot_ts, '%d'), source, quality_index FROM models_history ORDER BY 1, 2"
+        ).fetchall()
+        assert history == [("01", "fixture", 2.0), ("01", "other", 5.0), ("02", "fixture", 2.0), ("02", "other", 5.0)]
+        assert con.execute("SELECT source FROM models_latest").fetchall() == [("other",)]
+
+        rebuild_derived_tables(con)
+        assert con.execute("SELECT source FROM models_latest").fetchall() == [("other",)]
+        assert con.execute("SELECT COUNT(*) FROM snapshot_manifest").fetchone()[0] == 4
+    finally:
+        con.close()
+
+
+def test_models_scd_keeps_versions_per_source(tmp_path) -> None:
+    con = connect(tmp_path / "test.duckdb")
+    try:
+        init_warehouse(con)
+        snapshots = [
+            ("2025-01-01", "fixture", 2.0),
+            ("2025-01-01", "other", 5.0),
+            ("2025-01-02", "other", 6.0),
+            ("2025-01-03", "fixture", 2.0),
+        ]
+        for snapshot_ts, source, quality in snapshots:
+            con.execute("CREATE OR REPLACE TEMP TABLE incoming AS SELECT * FROM bronze_models LIMIT 0")
+            con.execute(
+                "INSERT INTO incoming (snapshot_ts, source, model_name, quality_index, canonical_model_key) "
+                "VALUES (?, ?, 'M1', ?, 'p::m1')",
+                [snapshot_ts, source, quality],
+            )
+            append_snapshot(con, "incoming")
+
+        versions_sql = (
+            "SELECT source, strftime(valid_from, '%d'), strftime(valid_to, '%d'), quality_index "
+            "FROM models_scd ORDER BY 1, 2"
+        )
+        versions = con.execute(versions_sql).fetchall()
+        assert versions == [
+            ("fixture", "01", None, 2.0),
+            ("other", "01", "02", 5.0),
+            ("other", "02", None, 6.0),
+        ]
+        as_of = models_as_of(con, "2025-01-03 12:00:00")
+        assert list(zip(as_of.column("source").to_pylist(), as_of.column("quality_index").to_pylist())) == [
+            ("fixture", 2.0),
+            ("other", 6.0),
+        ]
+
+        rebuild_derived_tables(con)
+        assert con.execute(versions_sql).fetchall() == versions
+    finally:
+        con.close()
+
+
+def test_append_snapshot_records_snapshot_stats(tmp_path) -> None:
+    con = connect(tmp_path / "test.duckdb")
+    try:
+        init_warehouse(con)
+        con.execute("CREATE OR REPLACE TEMP TABLE incoming AS SELECT * FROM bronze_models LIMIT 0")
+        con.execute(
+            "INSERT INTO incoming (snapshot_ts, model_name, price_input_per_1m, canonical_model_key) VALUES "
+            "('2025-01-01', 'M1', 1.0, 'p::m1'), ('2025-01-01', 'M2', 3.0, 'p::m2'), ('2025-01-01', 'M3', NULL, 'p::m3')"
+        )
+        append_snapshot(con, "incoming")
+        stats = latest_snapshot_stats(con)
+    finally:
+        con.close()
+    price = stats["price_input_per_1m"]
+    assert (price["row_count"], price["null_count"]) == (3, 1)
+    assert (price["min_value"], price["median"], price["max_value"]) == (1.0, 2.0, 3.0)
+    assert stats["ttft_s"]["null_count"] == 3 and stats["ttft_s"]["median"] is None
+
+
+def test_models_scd_tracks_validity_intervals(tmp_path) -> None:
+    con = connect(tmp_path / "test.duckdb")
+    try:
+        init_warehouse(con)
+        snapshots = [
+            ("2025-01-01", [("a", 1), ("b", 1)]),
+            ("2025-01-02", [("a", 1), ("b", 2)]),
+            ("2025-01-03", [("a", 1)]),
+            ("2025-01-04", [("a", 3), ("b", 2)]),
+        ]
+        for snapshot_ts, rows in snapshots:
+            con.execute("CREATE OR REPLACE TEMP TABLE incoming AS SELECT * FROM bronze_models LIMIT 0")
+            con.executemany(
+                "INSERT INTO incoming (snapshot_ts, source, model_name, quality_index, canonical_model_key) "
+                "VALUES (?, 'fixture', ?, ?, ?)",
+                [(snapshot_ts, key, quality, key) for key, quality in rows],
+            )
+            append_snapshot(con, "incoming")
+
+        versions_sql = (
+            "SELECT canonical_model_key, strftime(valid_from, '%d'), strftime(valid_to, '%d'), quality_index "
+            "FROM models_scd ORDER BY 1, 2"
+        )
+        versions = con.execute(versions_sql).fetchall()
+        assert versions == [
+            ("a", "01", "04", 1.0),
+            ("a", "04", None, 3.0),
+            ("b", "01", "02", 1.0),
+            ("b", "02", "03", 2.0),  # b is missing from the 01-03 snapshot
+            ("b", "04", None, 2.0),
+        ]
+        as_of = models_as_of(con, "2025-01-03 12:00:00")
+        assert as_of.column("canonical_model_key").to_pylist() == ["a"]
+        assert models_as_of(con, "2025-01-02").column("quality_index").to_pylist() == [1.0, 2.0]
+
+        rebuild_derived_tables(con)
+        assert con.execute(versions_sql).fetchall() == versions
+    finally:
+        con.close()